@@ -0,0 +1,34 @@
+"""
+Recall and latency of the approximate nearest neighbour index against the
+exact similarity matrix.
+
+    python benchmarks/ann_recall.py ./data/ann_index.npz --matrix ./data/A.json
+"""
+import time
+import argparse
+from fairmofapp.analyzer.ann_index import IVFIndex, benchmark_recall
+from fairmofapp.analyzer.adj_matrix_loader import get_adjacency_matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("ann_path", help="Path to an index saved with IVFIndex.save.")
+    parser.add_argument("--matrix", default=None, help="Path to the exact similarity matrix.")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    ann_index = IVFIndex.load(args.ann_path)
+    adj_matrix = get_adjacency_matrix(args.matrix) if args.matrix else None
+    print(f"{len(ann_index)} MOFs, {len(ann_index.centroids)} lists, k={args.k}")
+    print(f"{'nprobe':>6} {'recall':>8} {'vs matrix':>10} {'ms/query':>9}")
+    for nprobe in args.nprobe:
+        start = time.perf_counter()
+        result = benchmark_recall(ann_index, adj_matrix, args.k, nprobe)
+        elapsed = (time.perf_counter() - start) * 1000 / max(1, result["queries"])
+        matrix = "-" if result["recall_matrix"] is None else f"{result['recall_matrix']:.3f}"
+        print(f"{nprobe:>6} {result['recall_exact_features']:>8.3f} {matrix:>10} {elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Time and peak Python memory of finding the bonds of a structure, for the
+dense all-distances search the visualizer used before and the cell list
+neighbour search, on diamond supercells of growing size. The dense search
+is quadratic in time and memory and is only run up to --dense-limit atoms.
+
+    python benchmarks/bond_detection.py --sizes 2 4 16 30 --dense-limit 600
+"""
+import time
+import argparse
+import tracemalloc
+from ase.build import bulk
+from ase.data import chemical_symbols, covalent_radii
+from fairmofapp.analyzer.neighbour_list import find_bonds
+
+
+def dense_bonds(structure, tolerance=0.3):
+    # The previous visualizer loop, kept for comparison
+    symbols = structure.get_chemical_symbols()
+    distance = structure.get_all_distances()
+    bonds = []
+    for i in range(len(symbols)):
+        for j in range(i + 1, len(symbols)):
+            bond_threshold = covalent_radii[chemical_symbols.index(symbols[i])] + \
+                covalent_radii[chemical_symbols.index(symbols[j])] + tolerance
+            if distance[[i], [j]] < bond_threshold:
+                bonds.append((i, j))
+    return bonds
+
+
+def measure(function, structure):
+    tracemalloc.start()
+    start = time.perf_counter()
+    bonds = function(structure)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return len(bonds), elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2, 4, 6, 10, 16],
+                        help="Supercell repetitions along each axis.")
+    parser.add_argument("--dense-limit", type=int, default=600, help="Largest structure searched densely.")
+    args = parser.parse_args()
+
+    print(f"{'atoms':>8} {'bonds':>8} {'dense s':>9} {'dense MiB':>10} {'cell list s':>12} {'cell list MiB':>14}")
+    for size in args.sizes:
+        structure = bulk('C', 'diamond', a=3.57, cubic=True).repeat(size)
+        n_bonds, elapsed, peak = measure(find_bonds, structure)
+        dense = "", ""
+        if len(structure) <= args.dense_limit:
+            n_dense, dense_elapsed, dense_peak = measure(dense_bonds, structure)
+            assert n_dense == n_bonds
+            dense = f"{dense_elapsed:.2f}", f"{dense_peak / 2 ** 20:.1f}"
+        print(f"{len(structure):>8} {n_bonds:>8} {dense[0]:>9} {dense[1]:>10} {elapsed:>12.3f} {peak / 2 ** 20:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Figure JSON size and build time of visualize_interactive_graph versus the
+number of nodes, compared with the former one-trace-per-edge rendering.
+
+    python benchmarks/graph_rendering.py --nodes 100 1000 5000 --degree 20
+"""
+import time
+import argparse
+import numpy as np
+import networkx as nx
+import plotly.graph_objects as go
+from fairmofapp.analyzer.similarity_graph import visualize_interactive_graph
+
+
+def random_similarity_graph(n_nodes, degree, seed=0):
+    rng = np.random.default_rng(seed)
+    nx_graph = nx.Graph()
+    nx_graph.add_nodes_from(range(n_nodes))
+    heads = np.repeat(np.arange(n_nodes), degree)
+    tails = rng.integers(n_nodes, size=len(heads))
+    nx_graph.add_weighted_edges_from(zip(heads.tolist(), tails.tolist(), rng.random(len(heads)).tolist()))
+    pos = dict(enumerate(rng.random((n_nodes, 2))))
+    return nx_graph, pos
+
+
+def per_edge_figure(nx_graph, pos):
+    traces = [go.Scatter(x=[pos[u][0], pos[v][0], None], y=[pos[u][1], pos[v][1], None],
+                         line=dict(width=w * 2, color='gray'), hoverinfo='none', mode='lines')
+              for u, v, w in nx_graph.edges(data='weight')]
+    traces.append(go.Scatter(x=[pos[n][0] for n in nx_graph], y=[pos[n][1] for n in nx_graph],
+                             text=list(nx_graph), mode='markers'))
+    return go.Figure(data=traces)
+
+
+def measure(build):
+    start = time.perf_counter()
+    fig = build()
+    size = len(fig.to_json())
+    return time.perf_counter() - start, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, nargs="+", default=[100, 500, 2000, 10000])
+    parser.add_argument("--degree", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--legacy-max-nodes", type=int, default=500,
+                        help="Largest graph also rendered with one trace per edge.")
+    args = parser.parse_args()
+
+    print(f"{'nodes':>6} {'edges':>8} {'batched s':>10} {'batched KB':>11} "
+          f"{'top-k s':>8} {'top-k KB':>9} {'per-edge s':>11} {'per-edge KB':>12}")
+    for n_nodes in args.nodes:
+        nx_graph, pos = random_similarity_graph(n_nodes, args.degree)
+        batched = measure(lambda: visualize_interactive_graph(nx_graph, "", pos=pos))
+        top_k = measure(lambda: visualize_interactive_graph(nx_graph, "", pos=pos, top_k_per_node=args.top_k))
+        legacy = measure(lambda: per_edge_figure(nx_graph, pos)) \
+            if n_nodes <= args.legacy_max_nodes else (float('nan'), float('nan'))
+        print(f"{n_nodes:>6} {nx_graph.number_of_edges():>8} {batched[0]:>10.3f} {batched[1] / 1024:>11.0f} "
+              f"{top_k[0]:>8.3f} {top_k[1] / 1024:>9.0f} {legacy[0]:>11.3f} {legacy[1] / 1024:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
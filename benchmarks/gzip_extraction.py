@@ -0,0 +1,64 @@
+"""
+Time and peak Python memory of extracting CIFs from a tar.gz archive, for a
+plain single stream archive and a block compressed indexed one. Peak memory
+should stay near the size of the largest extracted CIF, independent of the
+archive size.
+
+    python benchmarks/gzip_extraction.py --n-cifs 20000 --extract 100
+"""
+import io
+import os
+import time
+import random
+import tarfile
+import argparse
+import tempfile
+import tracemalloc
+from fairmofapp.loader.gzip_reader import extract_cifs, write_indexed_tar_gz
+
+
+def synthetic_cifs(n_cifs, cif_size):
+    for i in range(n_cifs):
+        line = f"ATOM{i} 0.{i:06d} 0.5 0.5\n".encode()
+        yield f"cifs/M{i:06d}_fair_op.cif", line * (cif_size // len(line))
+
+
+def measure(mof_names, gzip_path, output_dir):
+    tracemalloc.start()
+    start = time.perf_counter()
+    extract_cifs(mof_names, gzip_path, output_dir)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n-cifs", type=int, default=5000)
+    parser.add_argument("--cif-size", type=int, default=20000, help="Bytes per synthetic CIF.")
+    parser.add_argument("--extract", type=int, default=100, help="Number of CIFs extracted.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        plain_path = os.path.join(temp_dir, "plain.tar.gz")
+        with tarfile.open(plain_path, 'w:gz') as tar:
+            for name, content in synthetic_cifs(args.n_cifs, args.cif_size):
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+        blocked_path = os.path.join(temp_dir, "blocked.tar.gz")
+        write_indexed_tar_gz(synthetic_cifs(args.n_cifs, args.cif_size), blocked_path)
+
+        mof_names = [f"M{i:06d}" for i in random.Random(0).sample(range(args.n_cifs), args.extract)]
+        print(f"{args.n_cifs} CIFs of {args.cif_size / 1024:.0f} KiB, extracting {args.extract}")
+        print(f"{'archive':>8} {'size MiB':>9} {'first s':>8} {'first peak KiB':>15} {'again s':>8} {'again peak KiB':>15}")
+        for label, path in (("plain", plain_path), ("blocked", blocked_path)):
+            first = measure(mof_names, path, os.path.join(temp_dir, f"{label}_1"))
+            again = measure(mof_names, path, os.path.join(temp_dir, f"{label}_2"))
+            print(f"{label:>8} {os.path.getsize(path) / 2 ** 20:>9.1f} {first[0]:>8.2f} {first[1] / 1024:>15.0f} "
+                  f"{again[0]:>8.2f} {again[1] / 1024:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
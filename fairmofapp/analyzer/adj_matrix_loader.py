@@ -1,4 +1,5 @@
 from mofstructure import filetyper
+from fairmofapp.analyzer.similarity_store import SimilarityStore, is_binary_similarity_matrix
 
 
 class AdjacencyMatrixLoader:
@@ -10,18 +11,28 @@ class AdjacencyMatrixLoader:
         """
         Loads the adjacency matrix from a file only once.
         Returns the loaded adjacency matrix on subsequent calls.
+        JSON matrices are compiled into a SimilarityStore on load,
+        .npz files written by SimilarityStore.save are loaded directly and
+        binary matrices written by SimilarityStore.save_binary are memory
+        mapped, so only the rows of queried MOFs are ever read.
 
         **parameters:**
             file_path (str): Path to the file containing the adjacency matrix.
                              If provided, it will load the matrix only the first time.
 
         **returns:**
-            dict: The loaded adjacency matrix.
+            SimilarityStore: The loaded adjacency matrix.
         """
         if cls._adj_matrix is None and file_path:
-            cls._adj_matrix = filetyper.load_data(file_path)
+            if is_binary_similarity_matrix(file_path):
+                cls._adj_matrix = SimilarityStore.open_binary(file_path)
+            elif file_path.endswith(".npz"):
+                cls._adj_matrix = SimilarityStore.load(file_path)
+            else:
+                cls._adj_matrix = SimilarityStore.from_adjacency_matrix(
+                    filetyper.load_data(file_path))
         return cls._adj_matrix
 
 
 def get_adjacency_matrix(file_path=None):
-    return AdjacencyMatrixLoader.load_adjacency_matrix(file_path)
\ No newline at end of file
+    return AdjacencyMatrixLoader.load_adjacency_matrix(file_path)
@@ -0,0 +1,449 @@
+#!/usr/bin/python
+from __future__ import print_function
+__author__ = "Dr. Dinga Wonanke"
+__status__ = "production"
+
+import os
+import zlib
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+NUMERIC_FEATURES = ["PLD", "LCD", "ASA", "AV", "void_fraction"]
+# Surface areas and volumes span orders of magnitude, so they are log scaled.
+LOG_FEATURES = {"ASA", "AV"}
+CATEGORICAL_FEATURES = ["metal_symbols", "topology"]
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _tokens(value):
+    if isinstance(value, (list, tuple)):
+        value = ','.join(str(item) for item in value)
+    return [token.strip() for token in str(value or '').split(',') if token.strip()]
+
+
+class FeatureEncoder:
+    """
+    Turns the indexed properties of a MOF into a fixed length feature
+    vector. Numeric properties are standardised and the metals and
+    topology are hashed into a small number of bins each, so new metals
+    or topologies never change the vector length.
+
+    **parameters:**
+        means (np.ndarray): Mean of every numeric feature.
+        stds (np.ndarray): Standard deviation of every numeric feature.
+        hash_bins (int): Number of bins per categorical feature.
+        categorical_weight (float): Weight of the categorical blocks.
+    """
+
+    def __init__(self, means=None, stds=None, hash_bins=16, categorical_weight=1.0):
+        self.means = np.zeros(len(NUMERIC_FEATURES)) if means is None else np.asarray(means)
+        self.stds = np.ones(len(NUMERIC_FEATURES)) if stds is None else np.asarray(stds)
+        self.hash_bins = int(hash_bins)
+        self.categorical_weight = float(categorical_weight)
+
+    @property
+    def dimension(self):
+        return len(NUMERIC_FEATURES) + self.hash_bins * len(CATEGORICAL_FEATURES)
+
+    def _numeric(self, records):
+        values = np.array([[_as_float(record.get(name, 0)) for name in NUMERIC_FEATURES]
+                           for record in records], dtype=np.float64).reshape(-1, len(NUMERIC_FEATURES))
+        for column, name in enumerate(NUMERIC_FEATURES):
+            if name in LOG_FEATURES:
+                values[:, column] = np.log1p(np.clip(values[:, column], 0, None))
+        return values
+
+    def fit(self, records):
+        """
+        Fits the standardisation of the numeric features.
+
+        **parameters:**
+            records (list): List of property dictionaries.
+
+        **returns:**
+            FeatureEncoder: The fitted encoder.
+        """
+        values = self._numeric(records)
+        if len(values):
+            self.means = values.mean(axis=0)
+            self.stds = values.std(axis=0)
+        self.stds = np.where(self.stds > 0, self.stds, 1.0)
+        return self
+
+    def transform(self, records):
+        """
+        Encodes property dictionaries into feature vectors.
+
+        **parameters:**
+            records (list): List of property dictionaries.
+
+        **returns:**
+            np.ndarray: A float32 array of shape (len(records), dimension).
+        """
+        numeric = (self._numeric(records) - self.means) / self.stds
+        categorical = np.zeros((len(records), self.hash_bins * len(CATEGORICAL_FEATURES)))
+        for row, record in enumerate(records):
+            for block, name in enumerate(CATEGORICAL_FEATURES):
+                tokens = _tokens(record.get(name, ''))
+                for token in tokens:
+                    column = block * self.hash_bins + zlib.crc32(token.lower().encode()) % self.hash_bins
+                    categorical[row, column] += self.categorical_weight / len(tokens)
+        return np.hstack([numeric, categorical]).astype(np.float32)
+
+
+def _squared_distances(vectors, centres):
+    return (np.einsum('ij,ij->i', vectors, vectors)[:, None]
+            - 2 * vectors @ centres.T
+            + np.einsum('ij,ij->i', centres, centres)[None, :])
+
+
+def kmeans(vectors, n_clusters, n_iter=20, seed=0):
+    """
+    Lloyd's k-means with k-means++ seeding.
+
+    **parameters:**
+        vectors (np.ndarray): Array of shape (n, d).
+        n_clusters (int): Number of clusters.
+        n_iter (int): Number of Lloyd iterations.
+        seed (int): Seed of the random generator.
+
+    **returns:**
+        np.ndarray: The cluster centres.
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = max(1, min(n_clusters, len(vectors)))
+    centres = [vectors[rng.integers(len(vectors))]]
+    closest = _squared_distances(vectors, np.array(centres))[:, 0]
+    for _ in range(1, n_clusters):
+        weights = np.clip(closest, 0, None)
+        total = weights.sum()
+        pick = rng.choice(len(vectors), p=weights / total) if total > 0 else rng.integers(len(vectors))
+        centres.append(vectors[pick])
+        closest = np.minimum(closest, _squared_distances(vectors, vectors[pick][None, :])[:, 0])
+    centres = np.array(centres, dtype=np.float32)
+
+    for _ in range(n_iter):
+        labels = _squared_distances(vectors, centres).argmin(axis=1)
+        counts = np.bincount(labels, minlength=len(centres))
+        sums = np.zeros_like(centres)
+        np.add.at(sums, labels, vectors)
+        filled = counts > 0
+        centres[filled] = sums[filled] / counts[filled, None]
+    return centres
+
+
+class IVFIndex:
+    """
+    An inverted file index for approximate nearest neighbour search over
+    MOF feature vectors. Vectors are assigned to the nearest of n_lists
+    k-means centroids and a query only scans the lists of its nprobe
+    nearest centroids.
+
+    **parameters:**
+        encoder (FeatureEncoder): Encoder used to turn properties into vectors.
+        centroids (np.ndarray): Coarse quantiser centroids.
+        generation (int): Generation of the Whoosh index the vectors were read from.
+    """
+
+    def __init__(self, encoder, centroids, generation=-1):
+        self.encoder = encoder
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.generation = generation
+        self.refcodes = []
+        self.vectors = np.empty((0, encoder.dimension), dtype=np.float32)
+        self.assignments = np.empty(0, dtype=np.int32)
+        self._rows = {}
+        self._lists = [np.empty(0, dtype=np.int64) for _ in range(len(self.centroids))]
+
+    @classmethod
+    def build(cls, refcodes, records, n_lists=None, hash_bins=16, seed=0):
+        """
+        Builds an index from the properties of many MOFs.
+
+        **parameters:**
+            refcodes (list): Refcodes of the MOFs.
+            records (list): Property dictionaries aligned with refcodes.
+            n_lists (int): Number of inverted lists, defaults to sqrt(n).
+            hash_bins (int): Number of bins per categorical feature.
+            seed (int): Seed of the k-means initialisation.
+
+        **returns:**
+            IVFIndex: The built index.
+        """
+        encoder = FeatureEncoder(hash_bins=hash_bins).fit(records)
+        vectors = encoder.transform(records)
+        if n_lists is None:
+            n_lists = int(np.sqrt(len(vectors))) or 1
+        ann_index = cls(encoder, kmeans(vectors, n_lists, seed=seed) if len(vectors)
+                        else np.zeros((1, encoder.dimension), dtype=np.float32))
+        ann_index._add_vectors(list(refcodes), vectors)
+        return ann_index
+
+    def add(self, refcodes, records):
+        """
+        Incrementally inserts MOFs into the index. A refcode that is
+        already indexed is replaced. The centroids are not retrained.
+
+        **parameters:**
+            refcodes (list): Refcodes of the MOFs.
+            records (list): Property dictionaries aligned with refcodes.
+        """
+        self._add_vectors(list(refcodes), self.encoder.transform(records))
+
+    def _add_vectors(self, refcodes, vectors):
+        labels = _squared_distances(vectors, self.centroids).argmin(axis=1).astype(np.int32)
+        new_refcodes, new_rows = [], []
+        for refcode, vector, label in zip(refcodes, vectors, labels):
+            row = self._rows.get(refcode)
+            if row is None:
+                new_refcodes.append(refcode)
+                new_rows.append((vector, label))
+                continue
+            old_label = self.assignments[row]
+            self.vectors[row] = vector
+            if old_label != label:
+                self._lists[old_label] = self._lists[old_label][self._lists[old_label] != row]
+                self._lists[label] = np.append(self._lists[label], row)
+                self.assignments[row] = label
+
+        if new_refcodes:
+            start = len(self.refcodes)
+            self.refcodes.extend(new_refcodes)
+            self._rows.update({refcode: start + i for i, refcode in enumerate(new_refcodes)})
+            self.vectors = np.vstack([self.vectors, np.array([v for v, _ in new_rows])])
+            new_labels = np.array([label for _, label in new_rows], dtype=np.int32)
+            self.assignments = np.concatenate([self.assignments, new_labels])
+            rows = np.arange(start, start + len(new_refcodes))
+            for label in np.unique(new_labels):
+                self._lists[label] = np.concatenate([self._lists[label], rows[new_labels == label]])
+
+    def __len__(self):
+        return len(self.refcodes)
+
+    def __contains__(self, refcode):
+        return refcode in self._rows
+
+    def search_vector(self, vector, top_n=5, nprobe=4, exclude=None):
+        """
+        Searches the index with a feature vector.
+
+        **parameters:**
+            vector (np.ndarray): Query feature vector.
+            top_n (int): Number of neighbours to return.
+            nprobe (int): Number of inverted lists to scan.
+            exclude (int): Row to leave out of the results, e.g. the query itself.
+
+        **returns:**
+            tuple: Array of rows and array of squared distances, nearest first.
+        """
+        vector = np.asarray(vector, dtype=np.float32)[None, :]
+        probes = np.argsort(_squared_distances(vector, self.centroids)[0])[:nprobe]
+        candidates = np.concatenate([self._lists[probe] for probe in probes])
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+        if len(candidates) == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+        distances = _squared_distances(vector, self.vectors[candidates])[0]
+        top_n = min(top_n, len(candidates))
+        nearest = np.argpartition(distances, top_n - 1)[:top_n]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return candidates[nearest], np.clip(distances[nearest], 0, None)
+
+    def get_similar_mofs(self, mof_name, top_n=5, nprobe=4, record=None):
+        """
+        Returns the approximate top n similar MOFs to a given MOF. The
+        similarity is 1 / (1 + d), where d is the feature distance.
+
+        **parameters:**
+            mof_name (str): The name of the MOF for which similarities are to be found.
+            top_n (int): The number of similar MOFs to return (default is 5).
+            nprobe (int): Number of inverted lists to scan.
+            record (dict): Properties of a MOF that is not in the index.
+
+        **returns:**
+            pd.DataFrame: A dataframe with the columns MOF and Similarity.
+        """
+        row = self._rows.get(mof_name)
+        if row is not None:
+            vector = self.vectors[row]
+        elif record is not None:
+            vector = self.encoder.transform([record])[0]
+        else:
+            return pd.DataFrame(columns=["MOF", "Similarity"])
+        rows, distances = self.search_vector(vector, top_n, nprobe, exclude=row)
+        return pd.DataFrame({"MOF": [self.refcodes[i] for i in rows],
+                             "Similarity": (1 / (1 + np.sqrt(distances))).tolist()},
+                            columns=["MOF", "Similarity"])
+
+    def save(self, file_path):
+        """
+        Saves the index as a .npz file. The file is written next to the
+        target and renamed, so a reader never loads a partial index.
+
+        **parameters:**
+            file_path (str): Path to the output file.
+        """
+        directory = os.path.dirname(os.path.abspath(file_path))
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False, suffix=".npz") as npz_file:
+            np.savez(npz_file, centroids=self.centroids, vectors=self.vectors,
+                     refcodes=np.array(self.refcodes, dtype=str), assignments=self.assignments,
+                     means=self.encoder.means, stds=self.encoder.stds,
+                     hash_bins=self.encoder.hash_bins,
+                     categorical_weight=self.encoder.categorical_weight,
+                     generation=self.generation)
+        os.replace(npz_file.name, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Loads an index saved with IVFIndex.save.
+
+        **parameters:**
+            file_path (str): Path to the .npz file.
+
+        **returns:**
+            IVFIndex: The loaded index.
+        """
+        with np.load(file_path) as data:
+            encoder = FeatureEncoder(data['means'], data['stds'], int(data['hash_bins']),
+                                     float(data['categorical_weight']))
+            # Indexes saved before the generation was recorded are always stale
+            generation = int(data['generation']) if 'generation' in data.files else -1
+            ann_index = cls(encoder, data['centroids'], generation)
+            ann_index.refcodes = data['refcodes'].tolist()
+            ann_index.vectors = data['vectors']
+            ann_index.assignments = data['assignments']
+        ann_index._rows = {refcode: i for i, refcode in enumerate(ann_index.refcodes)}
+        order = np.argsort(ann_index.assignments, kind='stable')
+        bounds = np.searchsorted(ann_index.assignments[order], np.arange(len(ann_index.centroids) + 1))
+        ann_index._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(ann_index.centroids))]
+        return ann_index
+
+
+def records_from_index(index_dir):
+    """
+    Reads the stored properties of every MOF in a Whoosh index.
+
+    **parameters:**
+        index_dir (str): Path to the Whoosh index directory.
+
+    **returns:**
+        tuple: List of refcodes and list of property dictionaries.
+    """
+    from whoosh_update import index
+
+    refcodes, records = [], []
+    with index.open_dir(index_dir).searcher() as searcher:
+        for fields in searcher.all_stored_fields():
+            refcodes.append(fields["refcode"])
+            records.append(fields)
+    return refcodes, records
+
+
+def index_generation(index_dir):
+    """
+    Returns the latest generation of a Whoosh index, -1 if there is none.
+    """
+    from whoosh_update import index
+
+    return index.open_dir(index_dir).latest_generation() if index.exists_in(index_dir) else -1
+
+
+def load_or_build_ann_index(ann_path, index_dir, max_growth=0.5):
+    """
+    Loads the ANN index from disk and brings it up to date with the
+    Whoosh index. An index saved from an older generation is updated
+    with IVFIndex.add, which inserts new MOFs and replaces changed ones.
+    It is rebuilt when MOFs were deleted, or when more than max_growth
+    of its size was added since its centroids were trained.
+
+    **parameters:**
+        ann_path (str): Path to the saved ANN index.
+        index_dir (str): Path to the Whoosh index directory.
+        max_growth (float): Fraction of new MOFs above which the centroids are retrained.
+
+    **returns:**
+        IVFIndex: The ANN index.
+    """
+    generation = index_generation(index_dir)
+    ann_index = IVFIndex.load(ann_path) if os.path.exists(ann_path) else None
+    if ann_index is not None and ann_index.generation == generation:
+        return ann_index
+
+    refcodes, records = records_from_index(index_dir)
+    if ann_index is not None and set(ann_index.refcodes) <= set(refcodes) \
+            and len(refcodes) - len(ann_index) <= max_growth * len(ann_index):
+        ann_index.add(refcodes, records)
+    else:
+        ann_index = IVFIndex.build(refcodes, records)
+    ann_index.generation = generation
+    try:
+        ann_index.save(ann_path)
+    except OSError:
+        # A read-only data directory still gets an up to date index
+        pass
+    return ann_index
+
+
+def benchmark_recall(ann_index, adj_matrix=None, k=10, nprobe=4):
+    """
+    Measures the recall at k of the ANN index. Recall is reported against
+    an exact brute force search over the same feature vectors and, if an
+    adjacency matrix is given, against the top k of the exact similarity matrix.
+
+    **parameters:**
+        ann_index (IVFIndex): The index to evaluate.
+        adj_matrix (dict or SimilarityStore): The exact similarity matrix.
+        k (int): Number of neighbours compared per query.
+        nprobe (int): Number of inverted lists scanned per query.
+
+    **returns:**
+        dict: recall_exact_features, recall_matrix and the number of queries.
+    """
+    from fairmofapp.analyzer.similarity_graph import get_similar_mofs
+
+    exact_hits = matrix_hits = matrix_total = 0
+    for row, refcode in enumerate(ann_index.refcodes):
+        approximate = set(ann_index.get_similar_mofs(refcode, k, nprobe)["MOF"])
+        distances = _squared_distances(ann_index.vectors[row][None, :], ann_index.vectors)[0]
+        distances[row] = np.inf
+        exact = {ann_index.refcodes[i] for i in np.argsort(distances)[:k]}
+        exact_hits += len(approximate & exact)
+        if adj_matrix is not None and refcode in adj_matrix:
+            reference = set(get_similar_mofs(refcode, adj_matrix, k)["MOF"])
+            matrix_hits += len(approximate & reference)
+            matrix_total += len(reference)
+
+    n_queries = len(ann_index.refcodes)
+    return {
+        "queries": n_queries,
+        "recall_exact_features": exact_hits / max(1, n_queries * min(k, n_queries - 1)),
+        "recall_matrix": matrix_hits / matrix_total if matrix_total else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build an approximate nearest neighbour index from the Whoosh MOF index.")
+    parser.add_argument("index_dir", help="Path to the Whoosh index directory.")
+    parser.add_argument("output_path", help="Path to the output .npz file.")
+    parser.add_argument("--n-lists", type=int, default=None, help="Number of inverted lists.")
+    args = parser.parse_args()
+    generation = index_generation(args.index_dir)
+    refcodes, records = records_from_index(args.index_dir)
+    ann_index = IVFIndex.build(refcodes, records, n_lists=args.n_lists)
+    ann_index.generation = generation
+    ann_index.save(args.output_path)
+    print(f"Indexed {len(ann_index)} MOFs in {len(ann_index.centroids)} lists.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+#!/usr/bin/python
+from __future__ import print_function
+__author__ = "Dr. Dinga Wonanke"
+__status__ = "production"
+
+import os
+import io
+import json
+import time
+import argparse
+import tempfile
+import multiprocessing
+from multiprocessing.connection import wait
+import numpy as np
+from ase.io import read
+from mofstructure.mofdeconstructor import transition_metals
+from fairmofapp.loader.cif_manifest import load_manifest, group_by_archive, read_member
+from fairmofapp.analyzer.mof_analysis import remove_guest, compute_porosity, porosity_properties, sbu_data, organic_ligand_data
+
+PARTS_DIR = "parts"
+FAILURES_NAME = "failures.jsonl"
+SUMMARY_NAME = "summary.npz"
+ANALYSIS_NAMES = ["porosity", "sbu", "ligands"]
+# Summary columns, named as in the property store, and their compiled JSON keys
+SUMMARY_COLUMNS = {
+    "PLD": "PLD",
+    "LCD": "LCD",
+    "ASA": "ASA",
+    "AV": "AV",
+    "n_channel": "Number of channels",
+    "void_fraction": "Void fraction",
+    "n_atoms": "number of atoms",
+    "elapsed": "processing time",
+}
+SUMMARY_TEXT_COLUMNS = {
+    "metal_symbols": "metals symbols",
+    "sbu_type": "sbu type",
+    "ligand_smile": "ligand smiles",
+}
+
+
+def analyse_structure(cif, analyses=ANALYSIS_NAMES, remove_guests=True, probe_radius=1.86, number_of_steps=10000):
+    """
+    Runs the structure page analyses on one CIF and collects the results
+    under the keys of the compiled JSON files, so the output can be
+    indexed by json_finder.
+
+    **parameters:**
+        cif (bytes): Content of the CIF file.
+        analyses (list): Analyses to run, among ANALYSIS_NAMES.
+        remove_guests (bool): Remove unbound guest molecules first.
+        probe_radius (float): Radius of the Zeo++ probe, in Å.
+        number_of_steps (int): Number of Zeo++ Monte Carlo samples.
+
+    **returns:**
+        dict: The properties of the structure.
+    """
+    ase_atom = read(io.BytesIO(cif), format='cif')
+    if remove_guests:
+        ase_atom = remove_guest(ase_atom)
+    metals = set(transition_metals()) - {'X'}
+    properties = {
+        "number of atoms": len(ase_atom),
+        "metals symbols": sorted(metals.intersection(ase_atom.get_chemical_symbols())),
+    }
+    if "porosity" in analyses:
+        properties.update(porosity_properties(compute_porosity(ase_atom, probe_radius, number_of_steps)))
+    if "sbu" in analyses:
+        metal_sbus, _ = sbu_data(ase_atom)
+        properties["sbu type"] = sorted({sbu.info['sbu_type'] for sbu in metal_sbus if 'sbu_type' in sbu.info})
+    if "ligands" in analyses:
+        _, organic_ligands = organic_ligand_data(ase_atom)
+        properties["ligand smiles"] = [ligand.info.get('smi', '') for ligand in organic_ligands]
+        properties["ligand inchikey"] = [ligand.info.get('inchikey', '') for ligand in organic_ligands]
+    return properties
+
+
+def _worker_loop(connection, options):
+    # Runs in the worker processes: announces that the imports are done,
+    # then analyses one structure per message until the pipeline sends
+    # None or closes the connection
+    connection.send(None)
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        refcode, cif = task
+        start = time.perf_counter()
+        try:
+            properties = analyse_structure(cif, **options)
+        except Exception as error:
+            connection.send((refcode, f"{type(error).__name__}: {error}", None))
+        else:
+            properties["processing time"] = time.perf_counter() - start
+            connection.send((refcode, None, properties))
+
+
+class _Worker:
+    def __init__(self, context, options):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_worker_loop, args=(child_connection, options), daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.ready = False
+        self.refcode = None
+        self.started = None
+
+    def submit(self, refcode, cif):
+        self.refcode, self.started = refcode, time.monotonic()
+        self.connection.send((refcode, cif))
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.terminate()
+        else:
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+def iter_structures(refcodes, zip_directory):
+    """
+    Streams CIFs straight out of the archives in archive order, without
+    extracting them. A member that cannot be read is yielded without
+    content instead of ending the stream.
+
+    **parameters:**
+        refcodes (list): Refcodes to read.
+        zip_directory (str): Path to the directory containing .zip files.
+
+    **yields:**
+        tuple: The refcode, the CIF content or None, and the read error or None.
+    """
+    for zip_path, members in group_by_archive(refcodes, zip_directory).items():
+        with open(zip_path, 'rb') as archive_file:
+            for refcode, entry in members:
+                try:
+                    yield refcode, read_member(archive_file, entry), None
+                except Exception as error:
+                    yield refcode, None, f"{type(error).__name__}: {error}"
+
+
+def part_paths(output_dir):
+    parts_dir = os.path.join(output_dir, PARTS_DIR)
+    if not os.path.isdir(parts_dir):
+        return []
+    return [os.path.join(parts_dir, filename) for filename in sorted(os.listdir(parts_dir))
+            if filename.startswith("part_") and filename.endswith(".json")]
+
+
+def load_checkpoint(output_dir):
+    """
+    Reads which structures earlier runs have already processed, from the
+    result parts and the failure log.
+
+    **parameters:**
+        output_dir (str): Output directory of the pipeline.
+
+    **returns:**
+        tuple: Set of processed refcodes, set of failed refcodes and the
+        number of the next part.
+    """
+    done, failed = set(), set()
+    paths = part_paths(output_dir)
+    for path in paths:
+        with open(path, 'r') as part_file:
+            done.update(json.load(part_file))
+    failures_path = os.path.join(output_dir, FAILURES_NAME)
+    if os.path.exists(failures_path):
+        with open(failures_path, 'r') as failures_file:
+            for line in failures_file:
+                try:
+                    failed.add(json.loads(line)["refcode"])
+                except (ValueError, KeyError):
+                    # A line cut short by a crash
+                    continue
+    next_part = int(os.path.basename(paths[-1])[5:-5]) + 1 if paths else 1
+    return done, failed, next_part
+
+
+def write_part(output_dir, number, results):
+    """
+    Writes a chunk of results as a compiled JSON file. The file is
+    renamed into place, so a crash never leaves a partial part behind.
+
+    **parameters:**
+        output_dir (str): Output directory of the pipeline.
+        number (int): Number of the part.
+        results (dict): Properties of every refcode.
+
+    **returns:**
+        str: Path to the part.
+    """
+    parts_dir = os.path.join(output_dir, PARTS_DIR)
+    os.makedirs(parts_dir, exist_ok=True)
+    path = os.path.join(parts_dir, f"part_{number:06d}.json")
+    with tempfile.NamedTemporaryFile('w', dir=parts_dir, delete=False, suffix=".tmp") as part_file:
+        json.dump(results, part_file)
+    os.replace(part_file.name, path)
+    return path
+
+
+def write_summary(output_dir):
+    """
+    Gathers every part into one columnar file: a refcode array and one
+    array per property, NaN or empty where a property is missing, named
+    as the columns of the property store.
+
+    **parameters:**
+        output_dir (str): Output directory of the pipeline.
+
+    **returns:**
+        str: Path to the summary.
+    """
+    results = {}
+    for path in part_paths(output_dir):
+        with open(path, 'r') as part_file:
+            results.update(json.load(part_file))
+    refcodes = sorted(results)
+    columns = {"refcode": np.array(refcodes, dtype=str)}
+    for column, key in SUMMARY_COLUMNS.items():
+        columns[column] = np.array([results[refcode].get(key, np.nan) for refcode in refcodes], dtype=float)
+    for column, key in SUMMARY_TEXT_COLUMNS.items():
+        columns[column] = np.array([",".join(results[refcode].get(key, [])) for refcode in refcodes], dtype=str)
+    path = os.path.join(output_dir, SUMMARY_NAME)
+    with tempfile.NamedTemporaryFile(dir=output_dir, delete=False, suffix=".npz") as summary_file:
+        np.savez_compressed(summary_file, **columns)
+    os.replace(summary_file.name, path)
+    return path
+
+
+def run_pipeline(zip_directory, output_dir, refcodes=None, workers=None, chunk_size=100, timeout=600,
+                 analyses=ANALYSIS_NAMES, remove_guests=True, probe_radius=1.86, number_of_steps=10000,
+                 retry_failed=False, index_dir=None):
+    """
+    Analyses many structures from the CIF archives. CIFs are streamed from
+    the archives and handed one at a time to a pool of worker processes,
+    which import the analysis code once. A structure running longer than
+    timeout has its worker killed and replaced, so one bad structure
+    costs at most timeout seconds and never stalls the batch. Results are
+    written every chunk_size structures as a compiled JSON part and
+    failures are logged as they happen; a new run skips everything
+    already recorded, so an interrupted batch resumes where it stopped.
+
+    **parameters:**
+        zip_directory (str): Path to the directory containing .zip files.
+        output_dir (str): Directory receiving the parts, the failure log and the summary.
+        refcodes (list): Refcodes to analyse, every CIF in the archives if None.
+        workers (int): Number of worker processes, the CPU count if None.
+        chunk_size (int): Number of results per part.
+        timeout (float): Time limit per structure in seconds, none if None.
+        analyses (list): Analyses to run, among ANALYSIS_NAMES.
+        remove_guests (bool): Remove unbound guest molecules first.
+        probe_radius (float): Radius of the Zeo++ probe, in Å.
+        number_of_steps (int): Number of Zeo++ Monte Carlo samples.
+        retry_failed (bool): Analyse structures that failed in earlier runs again.
+        index_dir (str): If given, the parts are added to this search index.
+
+    **returns:**
+        dict: Numbers of structures analysed, failed and skipped in this run.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    done, failed, part_number = load_checkpoint(output_dir)
+    skip = done if retry_failed else done | failed
+    if refcodes is None:
+        refcodes = sorted(load_manifest(zip_directory))
+    todo = [refcode for refcode in dict.fromkeys(refcodes) if refcode not in skip]
+    print(f"{len(todo)} structures to analyse, {len(refcodes) - len(todo)} already processed.")
+
+    options = dict(analyses=list(analyses), remove_guests=remove_guests,
+                   probe_radius=probe_radius, number_of_steps=number_of_steps)
+    context = multiprocessing.get_context("spawn")
+    pool = [_Worker(context, options) for _ in range(min(workers or os.cpu_count() or 1, len(todo)))]
+    structures = iter_structures(todo, zip_directory)
+    results, n_done, n_failed = {}, 0, 0
+    start = time.perf_counter()
+
+    with open(os.path.join(output_dir, FAILURES_NAME), 'a') as failures_file:
+        def record_failure(refcode, error):
+            failures_file.write(json.dumps({"refcode": refcode, "error": error}) + "\n")
+            failures_file.flush()
+
+        try:
+            exhausted = False
+            while True:
+                for worker in pool:
+                    while worker.refcode is None and not exhausted:
+                        refcode, cif, error = next(structures, (None, None, None))
+                        if refcode is None:
+                            exhausted = True
+                        elif cif is None:
+                            record_failure(refcode, error)
+                            n_failed += 1
+                        else:
+                            worker.submit(refcode, cif)
+                busy = [worker for worker in pool if worker.refcode is not None]
+                if not busy:
+                    break
+
+                wait_time = None
+                running = [worker.started for worker in busy if worker.ready]
+                if timeout is not None and running:
+                    wait_time = max(0.0, min(running) + timeout - time.monotonic())
+                ready = wait([worker.connection for worker in busy], wait_time)
+                for index, worker in enumerate(pool):
+                    if worker not in busy:
+                        continue
+                    healthy = worker.connection in ready
+                    if healthy:
+                        try:
+                            message = worker.connection.recv()
+                        except (EOFError, OSError):
+                            healthy = False
+                            message = worker.refcode, "The worker process crashed.", None
+                        if message is None:
+                            # The time limit starts once the worker has imported the analysis code
+                            worker.ready, worker.started = True, time.monotonic()
+                            continue
+                        refcode, error, properties = message
+                    elif worker.ready and timeout is not None and time.monotonic() - worker.started > timeout:
+                        refcode, error, properties = worker.refcode, f"Timed out after {timeout:g} s.", None
+                    else:
+                        continue
+                    if properties is None:
+                        record_failure(refcode, error)
+                        n_failed += 1
+                    else:
+                        results[refcode] = properties
+                        n_done += 1
+                    worker.refcode = None
+                    if not healthy:
+                        # Killing the worker is the only way to stop a
+                        # structure stuck in compiled code
+                        worker.stop(kill=True)
+                        pool[index] = _Worker(context, options)
+
+                if len(results) >= chunk_size:
+                    write_part(output_dir, part_number, results)
+                    part_number, results = part_number + 1, {}
+                    elapsed = time.perf_counter() - start
+                    print(f"{n_done} analysed, {n_failed} failed, {(n_done + n_failed) / elapsed:.2f} structures/s.")
+        finally:
+            if results:
+                write_part(output_dir, part_number, results)
+            for worker in pool:
+                worker.stop(kill=worker.refcode is not None)
+
+    write_summary(output_dir)
+    if index_dir is not None:
+        from fairmofapp.loader.json_finder import update_index
+        update_index(os.path.join(output_dir, PARTS_DIR), index_dir)
+    elapsed = time.perf_counter() - start
+    print(f"Done: {n_done} analysed and {n_failed} failed in {elapsed:.1f} s.")
+    return {"analysed": n_done, "failed": n_failed, "skipped": len(refcodes) - len(todo)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse many MOF structures from the CIF archives.")
+    parser.add_argument("zip_directory", help="Path to the directory containing .zip files of CIFs.")
+    parser.add_argument("output_dir", help="Directory receiving the results, also used to resume a run.")
+    parser.add_argument("--refcodes", help="File listing the refcodes to analyse, one per line. Defaults to all.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes, defaults to the CPU count.")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Number of results written per part.")
+    parser.add_argument("--timeout", type=float, default=600, help="Time limit per structure in seconds.")
+    parser.add_argument("--analyses", nargs="+", choices=ANALYSIS_NAMES, default=ANALYSIS_NAMES,
+                        help="Analyses to run.")
+    parser.add_argument("--keep-guests", action="store_true", help="Do not remove unbound guest molecules.")
+    parser.add_argument("--probe-radius", type=float, default=1.86, help="Radius of the Zeo++ probe in Å.")
+    parser.add_argument("--steps", type=int, default=10000, help="Number of Zeo++ Monte Carlo samples.")
+    parser.add_argument("--retry-failed", action="store_true", help="Analyse structures that failed before again.")
+    parser.add_argument("--index-dir", default=None, help="Search index to update with the results.")
+    args = parser.parse_args()
+
+    refcodes = None
+    if args.refcodes:
+        with open(args.refcodes, 'r') as refcode_file:
+            refcodes = [line.strip() for line in refcode_file if line.strip()]
+    run_pipeline(args.zip_directory, args.output_dir, refcodes=refcodes, workers=args.workers,
+                 chunk_size=args.chunk_size, timeout=args.timeout, analyses=args.analyses,
+                 remove_guests=not args.keep_guests, probe_radius=args.probe_radius,
+                 number_of_steps=args.steps, retry_failed=args.retry_failed, index_dir=args.index_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/python
+from __future__ import print_function
+__author__ = "Dr. Dinga Wonanke"
+__status__ = "production"
+
+import os
+import argparse
+import numpy as np
+import networkx as nx
+from fairmofapp.analyzer.similarity_store import SimilarityStore
+from fairmofapp.analyzer.similarity_graph import create_graph_from_adjacency_matrix, get_similar_mofs
+from fairmofapp.analyzer.graph_layout import load_matrix_data, save_matrix_data, sparsified_edges
+
+# Offline command detecting the communities of a similarity matrix
+COMMUNITIES_COMMAND = "python -m fairmofapp.analyzer.graph_explorer {matrix_path}"
+
+
+def ego_network(adj_matrix, centres, hops=1, threshold=0.0, top_n=10, max_nodes=200):
+    """
+    Builds the k-hop neighbourhood of one or more MOFs. Only the top n
+    neighbours of every visited MOF above the similarity threshold are
+    followed, and the walk stops once max_nodes MOFs have been reached,
+    so the size of the graph does not depend on the size of the database.
+
+    **parameters:**
+        adj_matrix (dict or SimilarityStore): The similarity matrix.
+        centres (list): Refcodes from which the neighbourhood is expanded.
+        hops (int): Number of hops away from the centres.
+        threshold (float): Minimum similarity of a followed edge.
+        top_n (int): Number of neighbours followed per MOF.
+        max_nodes (int): Maximum number of MOFs in the neighbourhood.
+
+    **returns:**
+        nx.Graph: The neighbourhood graph.
+    """
+    centres = [centre for centre in centres if centre in adj_matrix]
+    visited = set(centres)
+    frontier = list(centres)
+    sub_matrix = {}
+    for _ in range(hops):
+        next_frontier = []
+        for node in frontier:
+            similar = get_similar_mofs(node, adj_matrix, top_n)
+            similar = similar[similar["Similarity"] >= threshold]
+            sub_matrix[node] = {}
+            for neighbour, score in zip(similar["MOF"], similar["Similarity"]):
+                if neighbour not in visited:
+                    if len(visited) >= max_nodes:
+                        continue
+                    visited.add(neighbour)
+                    next_frontier.append(neighbour)
+                sub_matrix[node][neighbour] = score
+        frontier = next_frontier
+
+    nx_graph = create_graph_from_adjacency_matrix(sub_matrix)
+    nx_graph.add_nodes_from(visited)
+    return nx_graph
+
+
+def communities_path(matrix_path):
+    """
+    Returns the path at which the communities of a similarity matrix are
+    stored, e.g. data/A.json -> data/A.communities.npz.
+    """
+    return f"{os.path.splitext(matrix_path)[0]}.communities.npz"
+
+
+def detect_communities(store, top_k=10, seed=0):
+    """
+    Detects communities of similar MOFs with the Louvain method on the
+    top k sparsified similarity graph. This is meant to run offline.
+
+    **parameters:**
+        store (SimilarityStore): The compiled similarity matrix.
+        top_k (int): Number of neighbours kept per MOF.
+        seed (int): Seed of the Louvain method.
+
+    **returns:**
+        np.ndarray: Community label of every refcode in the store.
+    """
+    heads, tails, weights = sparsified_edges(store, top_k)
+    nx_graph = nx.Graph()
+    nx_graph.add_nodes_from(range(len(store.refcodes)))
+    nx_graph.add_weighted_edges_from(zip(heads.tolist(), tails.tolist(), weights.tolist()))
+    labels = np.zeros(len(store.refcodes), dtype=np.int32)
+    communities = nx.community.louvain_communities(nx_graph, weight='weight', seed=seed)
+    for label, members in enumerate(sorted(communities, key=len, reverse=True)):
+        labels[list(members)] = label
+    return labels
+
+
+def load_communities(matrix_path):
+    """
+    Loads the communities stored next to a similarity matrix if they were
+    detected from its current version, see graph_layout.load_matrix_data.
+
+    **parameters:**
+        matrix_path (str): Path to the similarity matrix.
+
+    **returns:**
+        dict: Mapping of refcode to community label, or None if they are missing or stale.
+    """
+    data = load_matrix_data(communities_path(matrix_path), matrix_path)
+    if data is None:
+        return None
+    return dict(zip(data['refcodes'].tolist(), data['labels'].tolist()))
+
+
+def require_communities(matrix_path):
+    """
+    Returns the precomputed communities of a similarity matrix. They are
+    only detected offline with COMMUNITIES_COMMAND, never while serving a page.
+
+    **parameters:**
+        matrix_path (str): Path to the similarity matrix.
+
+    **returns:**
+        dict: Mapping of refcode to community label.
+
+    **raises:**
+        FileNotFoundError: If no communities exist for this matrix version.
+    """
+    communities = load_communities(matrix_path)
+    if communities is None:
+        raise FileNotFoundError(
+            f"No communities were detected for the current version of {matrix_path}. "
+            f"Run `{COMMUNITIES_COMMAND.format(matrix_path=matrix_path)}` to detect them.")
+    return communities
+
+
+def save_communities(matrix_path, adj_matrix, **community_kwargs):
+    """
+    Detects the communities of a similarity matrix and stores them next to it.
+
+    **parameters:**
+        matrix_path (str): Path to the similarity matrix.
+        adj_matrix (dict or SimilarityStore): The loaded similarity matrix.
+        community_kwargs: Keyword arguments passed to detect_communities.
+
+    **returns:**
+        dict: Mapping of refcode to community label.
+    """
+    store = adj_matrix if isinstance(adj_matrix, SimilarityStore) \
+        else SimilarityStore.from_adjacency_matrix(adj_matrix)
+    labels = detect_communities(store, **community_kwargs)
+    refcodes = list(store)
+    save_matrix_data(communities_path(matrix_path), matrix_path, refcodes=np.array(refcodes, dtype=str), labels=labels)
+    return dict(zip(refcodes, labels.tolist()))
+
+
+def cluster_overview(adj_matrix, communities, pos=None, top_k=10):
+    """
+    Builds a graph with one node per community for the zoomed-out view.
+    Two communities are linked by the mean similarity of the top k
+    edges running between them.
+
+    **parameters:**
+        adj_matrix (dict or SimilarityStore): The similarity matrix.
+        communities (dict): Mapping of refcode to community label.
+        pos (dict): Node coordinates of the full graph, averaged per community.
+        top_k (int): Number of neighbours per MOF considered for the links.
+
+    **returns:**
+        tuple: The community graph, the coordinates of its nodes and the
+        number of MOFs in every community.
+    """
+    store = adj_matrix if isinstance(adj_matrix, SimilarityStore) \
+        else SimilarityStore.from_adjacency_matrix(adj_matrix)
+    refcodes = list(store)
+    labels = np.array([communities.get(refcode, -1) for refcode in refcodes], dtype=np.int64)
+    # Community labels are mapped once to consecutive indices, so every
+    # per community sum below is a single bincount over the MOFs or edges
+    known = labels >= 0
+    community_labels, members = np.unique(labels[known], return_inverse=True)
+    index = np.full(len(labels), -1, dtype=np.int64)
+    index[known] = members.ravel()
+    n_communities = len(community_labels)
+    names = [f"Cluster {label + 1}" for label in community_labels.tolist()]
+    sizes = dict(zip(names, np.bincount(index[known], minlength=n_communities).tolist()))
+
+    heads, tails, weights = sparsified_edges(store, top_k)
+    head_index, tail_index = index[heads], index[tails]
+    between = (head_index != tail_index) & (head_index >= 0) & (tail_index >= 0)
+    low = np.minimum(head_index[between], tail_index[between])
+    high = np.maximum(head_index[between], tail_index[between])
+    pairs, pair_index = np.unique(low * n_communities + high, return_inverse=True)
+    pair_index = pair_index.ravel()
+    totals = np.bincount(pair_index, weights=weights[between], minlength=len(pairs))
+    counts = np.bincount(pair_index, minlength=len(pairs))
+
+    nx_graph = nx.Graph()
+    nx_graph.add_nodes_from(names)
+    for pair, total, count in zip(pairs.tolist(), totals.tolist(), counts.tolist()):
+        nx_graph.add_edge(names[pair // n_communities], names[pair % n_communities], weight=total / count)
+
+    cluster_pos = None
+    if pos is not None:
+        placed = np.array([refcode in pos for refcode in refcodes], dtype=bool) & known
+        coordinates = np.array([pos[refcode] for refcode, is_placed in zip(refcodes, placed) if is_placed],
+                               dtype=float).reshape(-1, 2)
+        placed_index = index[placed]
+        n_placed = np.bincount(placed_index, minlength=n_communities)
+        sums = np.stack([np.bincount(placed_index, weights=coordinates[:, axis], minlength=n_communities)
+                         for axis in range(2)], axis=1)
+        means = np.divide(sums, n_placed[:, None], out=np.zeros(sums.shape), where=n_placed[:, None] > 0)
+        cluster_pos = dict(zip(names, means))
+    return nx_graph, cluster_pos, sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Precompute the communities of a similarity matrix for the cluster overview.")
+    parser.add_argument("matrix_path", help="Path to the similarity matrix (.json, .npz or binary).")
+    parser.add_argument("--top-k", type=int, default=10, help="Neighbours kept per MOF.")
+    args = parser.parse_args()
+
+    from fairmofapp.analyzer.adj_matrix_loader import get_adjacency_matrix
+    communities = save_communities(args.matrix_path, get_adjacency_matrix(args.matrix_path), top_k=args.top_k)
+    print(f"Found {len(set(communities.values()))} communities among {len(communities)} MOFs.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/python
+from __future__ import print_function
+__author__ = "Dr. Dinga Wonanke"
+__status__ = "production"
+
+import os
+import hashlib
+import argparse
+import tempfile
+import numpy as np
+
+# Offline command computing the layout of a similarity matrix
+LAYOUT_COMMAND = "python -m fairmofapp.analyzer.graph_layout {matrix_path}"
+
+
+def file_content_hash(file_path, chunk_size=1 << 20):
+    """
+    Computes the sha256 hash of a file, reading it in chunks.
+
+    **parameters:**
+        file_path (str): Path to the file.
+        chunk_size (int): Number of bytes read at a time.
+
+    **returns:**
+        str: The hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as content:
+        for chunk in iter(lambda: content.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_npz(file_path, arrays):
+    # Written next to the target and renamed, so readers never see a partial file
+    directory = os.path.dirname(os.path.abspath(file_path))
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False, suffix=".npz") as npz_file:
+        np.savez(npz_file, **arrays)
+    os.replace(npz_file.name, file_path)
+
+
+def save_matrix_data(file_path, matrix_path, **arrays):
+    """
+    Saves arrays computed from a similarity matrix together with the
+    content hash, size and modification time of the matrix.
+
+    **parameters:**
+        file_path (str): Path to the output .npz file.
+        matrix_path (str): Path to the similarity matrix.
+        arrays: The arrays to save.
+    """
+    stat = os.stat(matrix_path)
+    _write_npz(file_path, dict(arrays, matrix_hash=file_content_hash(matrix_path),
+                               matrix_size=stat.st_size, matrix_mtime=stat.st_mtime_ns))
+
+
+def load_matrix_data(file_path, matrix_path):
+    """
+    Loads arrays saved with save_matrix_data if they were computed from
+    the current version of the matrix. The content hash is only
+    recomputed when the size or modification time of the matrix changed;
+    if the content is the same, the new size and modification time are
+    saved, so the next load does not hash the matrix again.
+
+    **parameters:**
+        file_path (str): Path to the .npz file.
+        matrix_path (str): Path to the similarity matrix.
+
+    **returns:**
+        dict: The saved arrays, or None if the file is missing or stale.
+    """
+    if not os.path.exists(file_path):
+        return None
+    stat = os.stat(matrix_path)
+    with np.load(file_path) as data:
+        arrays = {name: data[name] for name in data.files}
+    if int(arrays['matrix_size']) == stat.st_size and int(arrays['matrix_mtime']) == stat.st_mtime_ns:
+        return arrays
+    if str(arrays['matrix_hash']) != file_content_hash(matrix_path):
+        return None
+    arrays.update(matrix_size=stat.st_size, matrix_mtime=stat.st_mtime_ns)
+    try:
+        _write_npz(file_path, arrays)
+    except OSError:
+        pass
+    return arrays
+
+
+def layout_path(matrix_path):
+    """
+    Returns the path at which the layout of a similarity matrix is stored,
+    next to the matrix itself, e.g. data/A.json -> data/A.layout.npz.
+    """
+    return f"{os.path.splitext(matrix_path)[0]}.layout.npz"
+
+
+def sparsified_edges(store, top_k=10):
+    """
+    Keeps the top k neighbours of every MOF, which is enough to preserve
+    the local structure of the similarity graph for layout purposes.
+
+    **parameters:**
+        store (SimilarityStore): The compiled similarity matrix.
+        top_k (int): Number of neighbours kept per MOF.
+
+    **returns:**
+        tuple: Arrays of head ids, tail ids and edge weights.
+    """
+    counts = np.minimum(np.diff(store.indptr), top_k)
+    heads = np.repeat(np.arange(len(store.refcodes)), counts)
+    positions = np.repeat(store.indptr[:-1], counts) + (
+        np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+    return heads, np.asarray(store.indices[positions], dtype=np.int64), \
+        np.asarray(store.scores[positions], dtype=np.float64)
+
+
+def _scatter_add(delta, rows, values):
+    for axis in range(delta.shape[1]):
+        delta[:, axis] += np.bincount(rows, weights=values[:, axis], minlength=len(delta))
+
+
+def compute_layout(store, top_k=10, n_epochs=200, negative_samples=5, seed=0):
+    """
+    Computes 2D node coordinates with a UMAP-like force directed embedding
+    of the sparsified similarity graph. Every epoch is O(edges) in NumPy:
+    neighbours attract along the kept edges and repulsion is approximated
+    by a few random negative samples per edge instead of all node pairs.
+
+    **parameters:**
+        store (SimilarityStore): The compiled similarity matrix.
+        top_k (int): Number of neighbours kept per MOF.
+        n_epochs (int): Number of optimisation epochs.
+        negative_samples (int): Number of repulsive samples per edge.
+        seed (int): Seed of the random generator.
+
+    **returns:**
+        np.ndarray: Coordinates of shape (len(store), 2) scaled to [-1, 1].
+    """
+    rng = np.random.default_rng(seed)
+    n_nodes = len(store.refcodes)
+    pos = rng.normal(scale=10.0, size=(n_nodes, 2))
+    heads, tails, weights = sparsified_edges(store, top_k)
+    if n_nodes == 0 or len(heads) == 0:
+        return pos.astype(np.float32)
+    weights = weights / weights.max() if weights.max() > 0 else np.ones_like(weights)
+    degree = np.bincount(heads, minlength=n_nodes) + np.bincount(tails, minlength=n_nodes) + 1.0
+    negative_heads = np.repeat(heads, negative_samples)
+
+    for epoch in range(n_epochs):
+        learning_rate = 1.0 - epoch / n_epochs
+        delta = np.zeros_like(pos)
+
+        diff = pos[heads] - pos[tails]
+        dist2 = np.einsum('ij,ij->i', diff, diff)
+        attraction = np.clip((-2.0 * weights / (1.0 + dist2))[:, None] * diff, -4, 4)
+        _scatter_add(delta, heads, attraction)
+        _scatter_add(delta, tails, -attraction)
+
+        negative_tails = rng.integers(n_nodes, size=len(negative_heads))
+        diff = pos[negative_heads] - pos[negative_tails]
+        dist2 = np.einsum('ij,ij->i', diff, diff)
+        repulsion = np.clip((2.0 / ((0.001 + dist2) * (1.0 + dist2)))[:, None] * diff, -4, 4)
+        _scatter_add(delta, negative_heads, repulsion)
+
+        pos += learning_rate * delta / degree[:, None] * 4
+
+    pos -= pos.mean(axis=0)
+    scale = np.abs(pos).max()
+    return (pos / scale if scale > 0 else pos).astype(np.float32)
+
+
+def save_layout(file_path, matrix_path, refcodes, coordinates):
+    """
+    Saves layout coordinates together with the content hash, size and
+    modification time of the similarity matrix they were computed from.
+
+    **parameters:**
+        file_path (str): Path to the output .npz file.
+        matrix_path (str): Path to the similarity matrix.
+        refcodes (np.ndarray): Refcodes aligned with coordinates.
+        coordinates (np.ndarray): Array of shape (n, 2).
+    """
+    save_matrix_data(file_path, matrix_path, refcodes=np.asarray(refcodes, dtype=str), coordinates=coordinates)
+
+
+def load_layout(matrix_path):
+    """
+    Loads the stored layout of a similarity matrix if it was computed
+    from the current version of the matrix, see load_matrix_data.
+
+    **parameters:**
+        matrix_path (str): Path to the similarity matrix.
+
+    **returns:**
+        dict: Mapping of refcode to (x, y), or None if the layout is missing or stale.
+    """
+    data = load_matrix_data(layout_path(matrix_path), matrix_path)
+    if data is None:
+        return None
+    return dict(zip(data['refcodes'].tolist(), data['coordinates']))
+
+
+def require_layout(matrix_path):
+    """
+    Returns the precomputed layout of a similarity matrix. Layouts are
+    only computed offline with LAYOUT_COMMAND, never while serving a page.
+
+    **parameters:**
+        matrix_path (str): Path to the similarity matrix.
+
+    **returns:**
+        dict: Mapping of refcode to (x, y).
+
+    **raises:**
+        FileNotFoundError: If no layout exists for this matrix version.
+    """
+    pos = load_layout(matrix_path)
+    if pos is None:
+        raise FileNotFoundError(
+            f"No layout was computed for the current version of {matrix_path}. "
+            f"Run `{LAYOUT_COMMAND.format(matrix_path=matrix_path)}` to compute it.")
+    return pos
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Precompute the MOF SPACE layout of a similarity matrix.")
+    parser.add_argument("matrix_path", help="Path to the similarity matrix (.json, .npz or binary).")
+    parser.add_argument("--top-k", type=int, default=10, help="Neighbours kept per MOF.")
+    parser.add_argument("--epochs", type=int, default=200, help="Number of optimisation epochs.")
+    args = parser.parse_args()
+
+    from fairmofapp.analyzer.adj_matrix_loader import get_adjacency_matrix
+    store = get_adjacency_matrix(args.matrix_path)
+    coordinates = compute_layout(store, top_k=args.top_k, n_epochs=args.epochs)
+    save_layout(layout_path(args.matrix_path), args.matrix_path, list(store), coordinates)
+    print(f"Stored layout of {len(store)} MOFs in {layout_path(args.matrix_path)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/python
+from __future__ import print_function
+__author__ = "Dr. Dinga Wonanke"
+__status__ = "production"
+
+import re
+from importlib.metadata import version
+import numpy as np
+from mofstructure import mofdeconstructor
+from mofstructure.porosity import zeo_calculation
+from fairmofapp.loader.job_queue import report_progress
+from fairmofapp.loader.result_cache import ResultCache
+
+# Zeo++ keys, lower cased without separators since mofstructure releases
+# differ in their spelling, and the compiled JSON keys they map to
+POROSITY_KEYS = {
+    "plda": "PLD",
+    "lcda": "LCD",
+    "asaa2": "ASA",
+    "ava3": "AV",
+    "avvolumefraction": "Void fraction",
+    "numberofchannels": "Number of channels",
+}
+
+
+def remove_guest(ase_atom):
+    """
+    Removes unbound guest molecules from a framework.
+
+    **parameters:**
+        ase_atom (ase.Atoms): The structure.
+
+    **returns:**
+        ase.Atoms: The structure without guests.
+    """
+    index_non_guest = mofdeconstructor.remove_unbound_guest(ase_atom)
+    return ase_atom[index_non_guest]
+
+
+def compute_porosity(ase_atom, probe_radius=1.86, number_of_steps=10000):
+    """
+    Computes pore sizes, accessible volume and surface area with Zeo++.
+
+    **parameters:**
+        ase_atom (ase.Atoms): The structure.
+        probe_radius (float): Radius of the probe, in Å.
+        number_of_steps (int): Number of Monte Carlo samples.
+
+    **returns:**
+        dict: The porosity data.
+    """
+    return zeo_calculation(ase_atom, probe_radius, number_of_steps)
+
+
+def porosity_properties(porosity):
+    """
+    Renames the results of compute_porosity to the keys of the compiled
+    JSON files, e.g. PLD_A or pld_a to PLD.
+
+    **parameters:**
+        porosity (dict): Result of compute_porosity.
+
+    **returns:**
+        dict: The known porosity values as Python numbers.
+    """
+    properties = {}
+    for key, value in porosity.items():
+        name = POROSITY_KEYS.get(re.sub(r"[^a-z0-9]", "", key.lower()))
+        if name is not None:
+            properties[name] = value.item() if isinstance(value, np.generic) else value
+    return properties
+
+
+def sbu_data(ase_atom):
+    """
+    Deconstructs a framework into its unique metal and organic
+    secondary building units.
+
+    **parameters:**
+        ase_atom (ase.Atoms): The structure.
+
+    **returns:**
+        tuple: Lists of metal and organic SBUs with their cheminformatic data.
+    """
+    report_progress(0.1, "Finding building units")
+    connected_components, atoms_indices_at_breaking_point, porpyrin_checker, all_regions = mofdeconstructor.secondary_building_units(
+        ase_atom)
+    report_progress(0.5, "Computing cheminformatic identifiers")
+    metal_sbus, organic_sbus, _ = mofdeconstructor.find_unique_building_units(
+        connected_components, atoms_indices_at_breaking_point, ase_atom, porpyrin_checker, all_regions, cheminfo=True, add_dummy=True)
+    return metal_sbus, organic_sbus
+
+
+def organic_ligand_data(ase_atom):
+    """
+    Deconstructs a framework into its unique metal clusters and organic ligands.
+
+    **parameters:**
+        ase_atom (ase.Atoms): The structure.
+
+    **returns:**
+        tuple: Lists of metal clusters and organic ligands with their cheminformatic data.
+    """
+    report_progress(0.1, "Finding ligands")
+    connected_components, atoms_indices_at_breaking_point, porpyrin_checker, all_regions = mofdeconstructor.ligands_and_metal_clusters(
+        ase_atom)
+    report_progress(0.5, "Computing cheminformatic identifiers")
+    metal_cluster, organic_ligands, _ = mofdeconstructor.find_unique_building_units(
+        connected_components, atoms_indices_at_breaking_point, ase_atom, porpyrin_checker, all_regions, cheminfo=True)
+    return metal_cluster, organic_ligands
+
+
+ANALYSES = {
+    'guest_removal': remove_guest,
+    'porosity': compute_porosity,
+    'sbu': sbu_data,
+    'ligands': organic_ligand_data,
+}
+
+
+def analysis_key(cache, name, ase_atom, **parameters):
+    """
+    Builds the result cache key of an analysis on a structure. The
+    installed mofstructure version is part of it, so upgrading it
+    invalidates earlier results.
+
+    **parameters:**
+        cache (ResultCache): The result cache.
+        name (str): Key of the analysis in ANALYSES.
+        ase_atom (ase.Atoms): The structure.
+        parameters: Keyword arguments of the analysis.
+
+    **returns:**
+        str: The cache key.
+    """
+    return cache.key(name, ase_atom, dict(parameters, mofstructure=version('mofstructure')))
+
+
+def run_analysis(name, ase_atom, cache_dir=None, **parameters):
+    """
+    Runs one of the ANALYSES on a structure, through the result cache in
+    cache_dir when given. The function is importable, so it can be
+    submitted to a JobQueue.
+
+    **parameters:**
+        name (str): Key of the analysis in ANALYSES.
+        ase_atom (ase.Atoms): The structure.
+        cache_dir (str): Directory of the result cache, no caching if None.
+        parameters: Keyword arguments of the analysis.
+
+    **returns:**
+        The result of the analysis.
+    """
+    function = ANALYSES[name]
+    if cache_dir is None:
+        return function(ase_atom, **parameters)
+    cache = ResultCache(cache_dir)
+    key = analysis_key(cache, name, ase_atom, **parameters)
+    result = cache.get(key)
+    if result is None:
+        result = function(ase_atom, **parameters)
+        cache.put(key, result)
+    return result
@@ -0,0 +1,171 @@
+#!/usr/bin/python
+from __future__ import print_function
+__author__ = "Dr. Dinga Wonanke"
+__status__ = "production"
+
+import itertools
+import numpy as np
+from ase.data import covalent_radii
+
+# Offsets to the cell itself and to 13 of its 26 neighbours, so that every
+# pair of neighbouring cells is visited exactly once.
+HALF_OFFSETS = [offset for offset in itertools.product((-1, 0, 1), repeat=3) if offset >= (0, 0, 0)]
+
+
+def _expand(starts, counts):
+    # Concatenates the ranges [start, start + count) without a Python loop
+    return np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+
+
+def cell_list_candidates(positions, cell_size, chunk_size=4096):
+    """
+    Bins points into cubic cells of side cell_size and yields every pair of
+    points lying in the same or in neighbouring cells. Only occupied cells
+    are stored, so the cost is linear in the number of points and does not
+    depend on the extent of the system.
+
+    **parameters:**
+        positions (np.ndarray): Cartesian coordinates, shape (N, 3).
+        cell_size (float): Side of the cells, at least the largest cutoff.
+        chunk_size (int): Number of points whose candidates are generated at a time.
+
+    **yields:**
+        tuple: Arrays of first and second indices of candidate pairs, each
+        unordered pair appearing once.
+    """
+    if len(positions) < 2:
+        return
+    cells = np.floor((positions - positions.min(axis=0)) / cell_size).astype(np.int64) + 1
+    # One empty layer on each side keeps the ids of neighbouring cells from aliasing
+    dims = cells.max(axis=0) + 2
+    ids = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    order = np.argsort(ids, kind='stable')
+    sorted_ids = ids[order]
+    cell_ids, starts, counts = np.unique(sorted_ids, return_index=True, return_counts=True)
+
+    for offset in HALF_OFFSETS:
+        delta = (offset[0] * dims[1] + offset[1]) * dims[2] + offset[2]
+        for chunk_start in range(0, len(positions), chunk_size):
+            targets = sorted_ids[chunk_start:chunk_start + chunk_size] + delta
+            location = np.minimum(np.searchsorted(cell_ids, targets), len(cell_ids) - 1)
+            found = cell_ids[location] == targets
+            first = np.arange(chunk_start, chunk_start + len(targets))[found]
+            first = np.repeat(first, counts[location[found]])
+            second = _expand(starts[location[found]], counts[location[found]])
+            if delta == 0:
+                keep = second > first
+                first, second = first[keep], second[keep]
+            if len(first):
+                yield order[first], order[second]
+
+
+def periodic_images(positions, cell, pbc, cutoff):
+    """
+    Wraps points into the unit cell and adds the periodic images lying
+    within cutoff of it, so that a non periodic neighbour search over the
+    result finds every pair across the cell boundaries.
+
+    **parameters:**
+        positions (np.ndarray): Cartesian coordinates, shape (N, 3).
+        cell (np.ndarray): Lattice vectors as rows, shape (3, 3).
+        pbc (np.ndarray): Periodicity along each lattice vector.
+        cutoff (float): Largest distance searched.
+
+    **returns:**
+        tuple: Coordinates of the points followed by their images, the
+        index of the original point of each and its lattice translation.
+    """
+    cell = np.asarray(cell, dtype=float)
+    pbc = np.broadcast_to(np.asarray(pbc, dtype=bool), 3)
+    volume = abs(np.linalg.det(cell))
+    if volume < 1e-8:
+        raise ValueError("Periodic neighbour search needs a cell with non zero volume.")
+    fractional = np.linalg.solve(cell.T, np.asarray(positions, dtype=float).T).T
+    fractional[:, pbc] -= np.floor(fractional[:, pbc])
+    # Distance between opposite faces of the cell along every lattice vector
+    heights = volume / np.linalg.norm(np.cross(cell[[1, 2, 0]], cell[[2, 0, 1]]), axis=1)
+    margin = np.where(pbc, cutoff / heights, np.inf)
+    n_images = np.where(pbc, np.ceil(margin), 0).astype(int)
+
+    indices, translations = [np.arange(len(positions))], [np.zeros((len(positions), 3), dtype=int)]
+    for shift in itertools.product(*(range(-n, n + 1) for n in n_images)):
+        if not any(shift):
+            continue
+        shifted = fractional + shift
+        inside = np.all((shifted >= -margin) & (shifted < 1 + margin) | ~pbc, axis=1)
+        indices.append(np.nonzero(inside)[0])
+        translations.append(np.tile(shift, (len(indices[-1]), 1)))
+    indices, translations = np.concatenate(indices), np.concatenate(translations)
+    return (fractional[indices] + translations) @ cell, indices, translations
+
+
+def neighbour_pairs(positions, radii=None, tolerance=0.0, cell=None, pbc=False, chunk_size=4096):
+    """
+    Finds all pairs of atoms closer than the sum of their radii plus a
+    tolerance with a cell list, in time and memory linear in the number of
+    atoms. Pairs are yielded in chunks, so a caller can stop early.
+
+    **parameters:**
+        positions (np.ndarray): Cartesian coordinates, shape (N, 3).
+        radii (np.ndarray): Radius of every atom, zero if None so that the
+            cutoff is tolerance for every pair.
+        tolerance (float): Added to the sum of radii.
+        cell (np.ndarray): Lattice vectors as rows, needed when pbc is set.
+        pbc (bool or list): Periodicity, overall or along each lattice vector.
+        chunk_size (int): Number of atoms whose pairs are searched at a time.
+
+    **yields:**
+        tuple: Arrays of first indices, second indices and distances. Every
+        pair appears once; with periodicity an atom may pair with its own
+        image, and a pair may appear once per lattice translation.
+    """
+    positions = np.asarray(positions, dtype=float)
+    n_atoms = len(positions)
+    radii = np.zeros(n_atoms) if radii is None else np.asarray(radii, dtype=float)
+    cutoff = 2 * radii.max(initial=0.0) + tolerance
+    if n_atoms == 0 or cutoff <= 0:
+        return
+
+    if np.any(pbc):
+        points, originals, translations = periodic_images(positions, cell, pbc, cutoff)
+    else:
+        points, originals, translations = positions, np.arange(n_atoms), None
+
+    for first, second in cell_list_candidates(points, cutoff, chunk_size):
+        if translations is not None:
+            # Keep pairs with at least one atom in the cell, oriented so the
+            # first one is, and of the two mirror copies of a pair across the
+            # boundary keep the one with i < j or a positive translation.
+            swap = (first >= n_atoms) | (second < n_atoms) & (first > second)
+            first, second = np.where(swap, second, first), np.where(swap, first, second)
+            keep = first < n_atoms
+            first, second = first[keep], second[keep]
+            j = originals[second]
+            shift = translations[second]
+            positive = (shift[:, 0] > 0) | (shift[:, 0] == 0) & ((shift[:, 1] > 0) | (shift[:, 1] == 0) & (shift[:, 2] > 0))
+            keep = (first < j) | (first == j) & positive
+            first, second = first[keep], second[keep]
+        distances = np.linalg.norm(points[first] - points[second], axis=1)
+        i, j = originals[first], originals[second]
+        close = distances < radii[i] + radii[j] + tolerance
+        if np.any(close):
+            yield i[close], j[close], distances[close]
+
+
+def find_bonds(atoms, tolerance=0.3, pbc=False):
+    """
+    Finds the bonds of a structure: pairs of atoms closer than the sum of
+    their covalent radii plus a tolerance.
+
+    **parameters:**
+        atoms (ase.Atoms): The structure.
+        tolerance (float): Added to the sum of covalent radii, in Å.
+        pbc (bool): Search across the periodic boundaries of the cell.
+
+    **returns:**
+        np.ndarray: Atom index pairs of the bonds, shape (n_bonds, 2).
+    """
+    radii = covalent_radii[atoms.get_atomic_numbers()]
+    chunks = [np.column_stack(pair[:2]) for pair in neighbour_pairs(
+        atoms.get_positions(), radii, tolerance, atoms.get_cell()[:], atoms.get_pbc() if pbc else False)]
+    return np.concatenate(chunks) if chunks else np.empty((0, 2), dtype=np.int64)
@@ -10,12 +10,12 @@ __status__ = "production"
 # Dr Dinga Wonanke as part of hos MSCA post doctoral fellowship at TU Dresden.#
 #                                                                             #
 ###############################################################################
-import os
-import shutil
-import gzip
+import numpy as np
 import networkx as nx
 import plotly.graph_objects as go
 import pandas as pd
+from fairmofapp.analyzer.similarity_store import SimilarityStore
+from fairmofapp.loader.gzip_reader import extract_cifs
 
 
 def create_graph_from_adjacency_matrix(adj_matrix: dict):
@@ -39,42 +39,128 @@ def create_graph_from_adjacency_matrix(adj_matrix: dict):
     return nx_graph
 
 
-def visualize_interactive_graph(nx_graph: nx.Graph, title):
+def select_edges(nx_graph: nx.Graph, edge_threshold=None, top_k_per_node=None, max_edges=None):
+    """
+    Selects the edges of a graph worth drawing. Edges below the threshold
+    are dropped, an edge is kept only if it is among the top k heaviest
+    edges of at least one of its nodes, and at most max_edges of the
+    heaviest remaining edges are returned.
+
+    **parameters:**
+        nx_graph (nx.Graph): The NetworkX graph object.
+        edge_threshold (float): Minimum weight of a drawn edge.
+        top_k_per_node (int): Number of heaviest edges kept per node.
+        max_edges (int): Maximum number of edges returned.
+
+    **returns:**
+        tuple: List of nodes, and arrays of head indices, tail indices and weights,
+        sorted by descending weight.
+    """
+    nodes = list(nx_graph.nodes())
+    node_ids = {node: i for i, node in enumerate(nodes)}
+    edges = [(node_ids[u], node_ids[v], weight) for u, v, weight in nx_graph.edges(data='weight', default=1.0)
+             if u != v]
+    if not edges:
+        empty = np.empty(0, dtype=np.int64)
+        return nodes, empty, empty, np.empty(0)
+    heads, tails, weights = (np.array(column) for column in zip(*edges))
+    heads, tails, weights = heads.astype(np.int64), tails.astype(np.int64), weights.astype(np.float64)
+
+    order = np.argsort(-weights, kind='stable')
+    heads, tails, weights = heads[order], tails[order], weights[order]
+
+    if edge_threshold is not None:
+        keep = weights >= edge_threshold
+        heads, tails, weights = heads[keep], tails[keep], weights[keep]
+
+    if top_k_per_node is not None and len(weights):
+        def rank_within_node(endpoints, edge_ids):
+            # Edges are sorted by weight, so ordering by node then edge ranks them by weight
+            by_node = np.lexsort((edge_ids, endpoints))
+            sorted_nodes = endpoints[by_node]
+            group_start = np.searchsorted(sorted_nodes, sorted_nodes)
+            ranks = np.empty(len(endpoints), dtype=np.int64)
+            ranks[by_node] = np.arange(len(endpoints)) - group_start
+            return ranks
+
+        endpoints = np.concatenate([heads, tails])
+        ranks = rank_within_node(endpoints, np.tile(np.arange(len(heads)), 2))
+        keep = (ranks[:len(heads)] < top_k_per_node) | (ranks[len(heads):] < top_k_per_node)
+        heads, tails, weights = heads[keep], tails[keep], weights[keep]
+
+    if max_edges is not None:
+        heads, tails, weights = heads[:max_edges], tails[:max_edges], weights[:max_edges]
+    return nodes, heads, tails, weights
+
+
+def _line_coordinates(start, end):
+    """
+    Interleaves segment end points with NaN separators so that many
+    segments can be drawn by a single line trace.
+    """
+    coordinates = np.full(3 * len(start), np.nan)
+    coordinates[0::3] = start
+    coordinates[1::3] = end
+    return coordinates
+
+
+def visualize_interactive_graph(nx_graph: nx.Graph, title, pos=None, edge_threshold=None,
+                                top_k_per_node=None, max_edges=20000, weight_buckets=4,
+                                highlight=None, node_sizes=None):
     """
     A plotly function to create an interactive graph to visualize
-    the graph.
+    the graph. Edges are drawn as a handful of WebGL line traces, one
+    per weight bucket, instead of one trace per edge, so the figure
+    stays small and fast to render on dense similarity graphs.
 
     **parameters:**
         nx_graph (nx.Graph): The NetworkX graph object to be visualized.
         title (str): The title of the graph visualization (default is 'Interactive Graph').
+        pos (dict): Precomputed node coordinates, see graph_layout.require_layout.
+        A spring layout is computed if None.
+        edge_threshold (float): Minimum weight of a drawn edge.
+        top_k_per_node (int): Number of heaviest edges drawn per node.
+        max_edges (int): Maximum number of edges drawn, the heaviest are kept.
+        weight_buckets (int): Number of edge traces, each drawn with the mean width of its bucket.
+        highlight (list): Nodes drawn in red, e.g. the queried MOF.
+        node_sizes (dict): Marker size of every node, 20 by default.
 
     **Returns:**
         A display of the interactive graph in the browser.
     """
-    pos = nx.spring_layout(nx_graph)
+    if pos is None:
+        pos = nx.spring_layout(nx_graph)
 
-    node_trace = go.Scatter(
-        x=[pos[node][0] for node in nx_graph.nodes()],
-        y=[pos[node][1] for node in nx_graph.nodes()],
-        text=list(nx_graph.nodes()),
+    nodes, heads, tails, weights = select_edges(nx_graph, edge_threshold, top_k_per_node, max_edges)
+    coordinates = np.array([pos[node] for node in nodes], dtype=np.float64).reshape(-1, 2)
+
+    node_trace = go.Scattergl(
+        x=coordinates[:, 0],
+        y=coordinates[:, 1],
+        text=nodes,
         mode='markers',
-        textposition='bottom center',
         hoverinfo='text',
-        marker=dict(size=20, color='blue')
+        marker=dict(
+            size=[node_sizes.get(node, 20) for node in nodes] if node_sizes else 20,
+            color=['red' if node in highlight else 'blue' for node in nodes] if highlight else 'blue')
     )
 
     edge_trace = []
-    for edge in nx_graph.edges(data=True):
-        x0, y0 = pos[edge[0]]
-        x1, y1 = pos[edge[1]]
-        weight = edge[2]['weight']
-        edge_trace.append(go.Scatter(
-            x=[x0, x1, None],
-            y=[y0, y1, None],
-            line=dict(width=weight * 2, color='gray'),
-            hoverinfo='none',
-            mode='lines'
-        ))
+    if len(weights):
+        edges = np.linspace(weights.min(), weights.max(), weight_buckets + 1)
+        buckets = np.clip(np.searchsorted(edges, weights, side='right') - 1, 0, weight_buckets - 1)
+        for bucket in range(weight_buckets):
+            in_bucket = buckets == bucket
+            if not in_bucket.any():
+                continue
+            start, end = coordinates[heads[in_bucket]], coordinates[tails[in_bucket]]
+            edge_trace.append(go.Scattergl(
+                x=_line_coordinates(start[:, 0], end[:, 0]),
+                y=_line_coordinates(start[:, 1], end[:, 1]),
+                line=dict(width=float(weights[in_bucket].mean()) * 2, color='gray'),
+                hoverinfo='none',
+                mode='lines'
+            ))
 
     fig = go.Figure(data=edge_trace + [node_trace])
 
@@ -94,10 +180,14 @@ def get_similar_mofs(mof_name, adj_matrix, top_n=5):
     A function that returns the top n similar MOFs to a given MOF.
     **parameters:**
         mof_name (str): The name of the MOF for which similarities are to be found.
-        adj_matrix (dict): A dictionary where keys are MOF names,
+        adj_matrix (dict or SimilarityStore): A dictionary where keys are MOF names,
         and values are dictionaries of neighboring MOFs and their similarity scores.
+        A compiled SimilarityStore is answered with a slice of its pre-sorted neighbours.
         top_n (int): The number of similar MOFs to return (default is 5).
     '''
+    if isinstance(adj_matrix, SimilarityStore):
+        return adj_matrix.get_similar_mofs(mof_name, top_n)
+
     if mof_name not in adj_matrix:
         return pd.DataFrame(columns=["MOF", "Similarity"])
 
@@ -108,22 +198,19 @@ def get_similar_mofs(mof_name, adj_matrix, top_n=5):
 
 
 def search_and_extract_from_gzip(mof_names, gzip_path, output_dir="mof_folders"):
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    with gzip.open(gzip_path, 'rb') as gz_file:
-        file_content = gz_file.read()
-
-        for mof_name in mof_names:
-            mof_filename = f"{mof_name}_fair_op.cif"
-
-            if mof_filename in file_content.decode('utf-8'):
-                mof_output_path = os.path.join(output_dir, mof_filename)
+    """
+    Extracts the CIF files of the given MOFs from a gzip compressed tar
+    archive in a single pass, see gzip_reader.extract_cifs.
 
-                with open(mof_output_path, 'wb') as extracted_file:
-                    extracted_file.write(file_content)
+    **parameters:**
+        mof_names (list): List of MOF names to extract.
+        gzip_path (str): Path to the tar.gz archive.
+        output_dir (str): Path to the directory where extracted files will be saved.
 
-    return output_dir
+    **returns:**
+        str: Path to the directory containing the extracted files.
+    """
+    return extract_cifs(mof_names, gzip_path, output_dir)
 
 
 # from mofstructure import filetyper
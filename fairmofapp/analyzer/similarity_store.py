@@ -0,0 +1,311 @@
+#!/usr/bin/python
+from __future__ import print_function
+__author__ = "Dr. Dinga Wonanke"
+__status__ = "production"
+
+import argparse
+import struct
+from collections.abc import Mapping
+import numpy as np
+import pandas as pd
+from mofstructure import filetyper
+
+BINARY_MAGIC = b"FAIRSIM1"
+# magic, n_rows, nnz, refcode width and the byte offsets of the four sections
+_HEADER = struct.Struct("<8s7Q")
+
+
+class SimilarityStore(Mapping):
+    """
+    A compiled, read-only similarity matrix. Refcodes are interned to
+    integer ids (their position in the sorted refcode table) and the
+    neighbours of every MOF are kept in CSR arrays, pre-sorted by
+    descending similarity. Looking up the top n most similar MOFs is
+    therefore a slice rather than a sort.
+
+    The store behaves like the dictionary of dictionaries it replaces,
+    so it can be passed to any function expecting an adjacency matrix.
+
+    **parameters:**
+        refcodes (np.ndarray): Sorted array of refcodes.
+        indptr (np.ndarray): Row offsets of length len(refcodes) + 1.
+        indices (np.ndarray): Neighbour ids of every row.
+        scores (np.ndarray): Similarity scores aligned with indices.
+    """
+
+    def __init__(self, refcodes, indptr, indices, scores):
+        self.refcodes = refcodes
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+
+    @classmethod
+    def from_adjacency_matrix(cls, adj_matrix, top_k=None):
+        """
+        Compiles a dictionary based adjacency matrix into a store.
+        Self similarities are dropped.
+
+        **parameters:**
+            adj_matrix (dict): A dictionary where keys are MOF names,
+            and values are dictionaries of neighbouring MOFs and their similarity scores.
+            top_k (int): Number of neighbours to keep per MOF. All are kept if None.
+
+        **returns:**
+            SimilarityStore: The compiled store.
+        """
+        names = set(adj_matrix)
+        for neighbours in adj_matrix.values():
+            names.update(neighbours)
+        refcodes = np.array(sorted(names), dtype=str)
+        ids = {name: i for i, name in enumerate(refcodes.tolist())}
+
+        counts = np.zeros(len(refcodes), dtype=np.int64)
+        row_indices = [None] * len(refcodes)
+        row_scores = [None] * len(refcodes)
+        for node, neighbours in adj_matrix.items():
+            row = ids[node]
+            neighbour_ids = np.fromiter(
+                (ids[name] for name in neighbours), dtype=np.int32, count=len(neighbours))
+            neighbour_scores = np.fromiter(
+                neighbours.values(), dtype=np.float32, count=len(neighbours))
+            keep = neighbour_ids != row
+            neighbour_ids, neighbour_scores = neighbour_ids[keep], neighbour_scores[keep]
+            order = np.lexsort((neighbour_ids, -neighbour_scores))[:top_k]
+            row_indices[row] = neighbour_ids[order]
+            row_scores[row] = neighbour_scores[order]
+            counts[row] = len(order)
+
+        indptr = np.zeros(len(refcodes) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        empty_ids = np.empty(0, dtype=np.int32)
+        empty_scores = np.empty(0, dtype=np.float32)
+        indices = np.concatenate(
+            [empty_ids] + [row if row is not None else empty_ids for row in row_indices])
+        scores = np.concatenate(
+            [empty_scores] + [row if row is not None else empty_scores for row in row_scores])
+        return cls(refcodes, indptr, indices, scores)
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Loads a store saved with SimilarityStore.save.
+
+        **parameters:**
+            file_path (str): Path to the .npz file.
+
+        **returns:**
+            SimilarityStore: The loaded store.
+        """
+        with np.load(file_path) as data:
+            return cls(data['refcodes'], data['indptr'], data['indices'], data['scores'])
+
+    def save(self, file_path):
+        """
+        Saves the store as a .npz file.
+
+        **parameters:**
+            file_path (str): Path to the output file.
+        """
+        np.savez(file_path, refcodes=self.refcodes, indptr=self.indptr,
+                 indices=self.indices, scores=self.scores)
+
+    @classmethod
+    def open_binary(cls, file_path):
+        """
+        Memory maps a store written with SimilarityStore.save_binary.
+        Nothing but the header is read up front; the refcode table and
+        the rows of a queried MOF are paged in by the operating system
+        on access and shared between processes through the page cache.
+
+        **parameters:**
+            file_path (str): Path to the binary similarity file.
+
+        **returns:**
+            MappedSimilarityStore: The memory mapped store.
+        """
+        with open(file_path, 'rb') as binary_file:
+            header = _HEADER.unpack(binary_file.read(_HEADER.size))
+        magic, n_rows, nnz, width, refcodes_at, indptr_at, indices_at, scores_at = header
+        if magic != BINARY_MAGIC:
+            raise ValueError(f"{file_path} is not a binary similarity matrix.")
+
+        def section(dtype, offset, length):
+            if length == 0:
+                return np.empty(0, dtype=dtype)
+            return np.memmap(file_path, dtype=dtype, mode='r', offset=offset, shape=(length,))
+
+        return MappedSimilarityStore(
+            section(f"S{width}", refcodes_at, n_rows),
+            section("<i8", indptr_at, n_rows + 1),
+            section("<i4", indices_at, nnz),
+            section("<f4", scores_at, nnz))
+
+    def save_binary(self, file_path):
+        """
+        Writes the store in the binary format read by SimilarityStore.open_binary.
+        The file holds a header, a sorted table of fixed width refcodes, the row
+        offsets, the neighbour ids and the float32 scores, each section 8 byte aligned.
+
+        **parameters:**
+            file_path (str): Path to the output file.
+        """
+        refcodes = np.char.encode(np.asarray(self.refcodes, dtype=str), 'utf-8')
+        sections = [
+            refcodes,
+            np.ascontiguousarray(self.indptr, dtype="<i8"),
+            np.ascontiguousarray(self.indices, dtype="<i4"),
+            np.ascontiguousarray(self.scores, dtype="<f4"),
+        ]
+        offsets = []
+        position = _HEADER.size
+        for array in sections:
+            position += -position % 8
+            offsets.append(position)
+            position += array.nbytes
+
+        with open(file_path, 'wb') as binary_file:
+            binary_file.write(_HEADER.pack(
+                BINARY_MAGIC, len(refcodes), len(sections[2]), max(refcodes.itemsize, 1), *offsets))
+            for offset, array in zip(offsets, sections):
+                binary_file.write(b"\0" * (offset - binary_file.tell()))
+                binary_file.write(array.tobytes())
+
+    def index_of(self, mof_name):
+        """
+        Returns the integer id of a refcode, or -1 if it is not in the store.
+
+        **parameters:**
+            mof_name (str): Refcode of the MOF.
+
+        **returns:**
+            int: The id of the refcode.
+        """
+        position = int(np.searchsorted(self.refcodes, mof_name))
+        if position < len(self.refcodes) and self.refcodes[position] == mof_name:
+            return position
+        return -1
+
+    def neighbours(self, mof_name, top_n=None):
+        """
+        Returns the neighbours of a MOF sorted by descending similarity.
+
+        **parameters:**
+            mof_name (str): Refcode of the MOF.
+            top_n (int): Maximum number of neighbours to return. All are returned if None.
+
+        **returns:**
+            tuple: Array of neighbour refcodes and array of their scores.
+        """
+        row = self.index_of(mof_name)
+        if row < 0:
+            return self._names(self.indices[:0]), np.asarray(self.scores[:0])
+        start, end = int(self.indptr[row]), int(self.indptr[row + 1])
+        if top_n is not None:
+            end = min(end, start + top_n)
+        return self._names(self.indices[start:end]), np.asarray(self.scores[start:end])
+
+    def _names(self, ids):
+        return np.asarray(self.refcodes[ids])
+
+    def get_similar_mofs(self, mof_name, top_n=5):
+        """
+        Returns the top n similar MOFs to a given MOF.
+
+        **parameters:**
+            mof_name (str): The name of the MOF for which similarities are to be found.
+            top_n (int): The number of similar MOFs to return (default is 5).
+
+        **returns:**
+            pd.DataFrame: A dataframe with the columns MOF and Similarity.
+        """
+        names, scores = self.neighbours(mof_name, top_n)
+        return pd.DataFrame({"MOF": names.tolist(), "Similarity": scores.tolist()},
+                            columns=["MOF", "Similarity"])
+
+    def __getitem__(self, mof_name):
+        if self.index_of(mof_name) < 0:
+            raise KeyError(mof_name)
+        names, scores = self.neighbours(mof_name)
+        return dict(zip(names.tolist(), scores.tolist()))
+
+    def __contains__(self, mof_name):
+        return isinstance(mof_name, str) and self.index_of(mof_name) >= 0
+
+    def __iter__(self):
+        return iter(self._names(slice(None)).tolist())
+
+    def __len__(self):
+        return len(self.refcodes)
+
+
+class MappedSimilarityStore(SimilarityStore):
+    """
+    A SimilarityStore whose arrays are memory mapped from the binary
+    format, see SimilarityStore.open_binary. The refcode table holds
+    utf-8 encoded bytes, so names are encoded on lookup and decoded on return.
+    """
+
+    def index_of(self, mof_name):
+        key = mof_name.encode('utf-8')
+        position = int(np.searchsorted(self.refcodes, key))
+        if position < len(self.refcodes) and self.refcodes[position] == key:
+            return position
+        return -1
+
+    def _names(self, ids):
+        return np.char.decode(np.asarray(self.refcodes[ids]), 'utf-8')
+
+
+def is_binary_similarity_matrix(file_path):
+    """
+    Checks whether a file is a binary similarity matrix written by
+    SimilarityStore.save_binary.
+
+    **parameters:**
+        file_path (str): Path to the file.
+
+    **returns:**
+        bool: True if the file starts with the binary magic bytes.
+    """
+    with open(file_path, 'rb') as binary_file:
+        return binary_file.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def convert_adjacency_json(json_path, output_path, top_k=None, binary=False):
+    """
+    One-off converter from a JSON adjacency matrix such as data/A.json
+    to a compiled SimilarityStore.
+
+    **parameters:**
+        json_path (str): Path to the JSON adjacency matrix.
+        output_path (str): Path to the output file.
+        top_k (int): Number of neighbours to keep per MOF. All are kept if None.
+        binary (bool): Write the memory mappable binary format instead of .npz.
+
+    **returns:**
+        SimilarityStore: The compiled store.
+    """
+    store = SimilarityStore.from_adjacency_matrix(filetyper.load_data(json_path), top_k)
+    if binary:
+        store.save_binary(output_path)
+    else:
+        store.save(output_path)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compile a JSON similarity matrix into a sparse top-k similarity store.")
+    parser.add_argument("json_path", help="Path to the JSON adjacency matrix.")
+    parser.add_argument("output_path", help="Path to the output file.")
+    parser.add_argument("--top-k", type=int, default=None,
+                        help="Number of neighbours to keep per MOF.")
+    parser.add_argument("--binary", action="store_true",
+                        help="Write the memory mappable binary format instead of .npz.")
+    args = parser.parse_args()
+    store = convert_adjacency_json(args.json_path, args.output_path, args.top_k, args.binary)
+    print(f"Compiled {len(store)} refcodes and {len(store.indices)} neighbours.")
+
+
+if __name__ == "__main__":
+    main()
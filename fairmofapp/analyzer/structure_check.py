@@ -0,0 +1,109 @@
+#!/usr/bin/python
+from __future__ import print_function
+__author__ = "Dr. Dinga Wonanke"
+__status__ = "production"
+
+import numpy as np
+from fairmofapp.analyzer.neighbour_list import neighbour_pairs
+
+
+class CloseContacts:
+    """
+    Flags pairs of distinct atoms closer than a cutoff, which usually
+    means overlapping atoms or disorder left in a CIF. Pairs of two
+    hydrogen atoms can be skipped, since a disordered hydrogen position
+    alone rarely makes a structure unusable.
+
+    **parameters:**
+        cutoff (float): Shortest allowed distance, in Å.
+        skip_hydrogen_pairs (bool): Ignore contacts between two hydrogens.
+        name (str): Key of the check in the results of validate_structure.
+    """
+
+    def __init__(self, cutoff=0.90, skip_hydrogen_pairs=True, name="close_contacts"):
+        self.cutoff = cutoff
+        self.skip_hydrogen_pairs = skip_hydrogen_pairs
+        self.name = name
+
+    def select(self, numbers, first, second, distances):
+        """
+        Picks the offending pairs among pairs closer than the search cutoff.
+
+        **parameters:**
+            numbers (np.ndarray): Atomic numbers of the structure.
+            first (np.ndarray): First atom index of every pair.
+            second (np.ndarray): Second atom index of every pair.
+            distances (np.ndarray): Distance of every pair, in Å.
+
+        **returns:**
+            np.ndarray: Boolean mask of the offending pairs.
+        """
+        offending = (distances < self.cutoff) & (first != second)
+        if self.skip_hydrogen_pairs:
+            offending &= (numbers[first] != 1) | (numbers[second] != 1)
+        return offending
+
+
+def validate_structure(atoms, checks=None, max_pairs=None):
+    """
+    Runs pair checks on a structure with a single periodic cell list
+    neighbour search, whose cutoff is the largest cutoff of the checks.
+    Every check only filters the pairs found, so adding a check does not
+    add a distance matrix or a second search. A pair found through
+    several lattice translations is reported once, at its shortest
+    distance, as with the minimum image convention.
+
+    **parameters:**
+        atoms (ase.Atoms): The structure.
+        checks (list): Objects with name, cutoff and select attributes,
+            a CloseContacts check if None.
+        max_pairs (int): Stop searching once every check has found this
+            many offending pairs, search the whole structure if None.
+
+    **returns:**
+        dict: For every check name, a tuple of the offending atom index
+        pairs, shape (n, 2), and their distances.
+    """
+    checks = [CloseContacts()] if checks is None else checks
+    found = {check.name: {} for check in checks}
+    pbc = atoms.get_pbc()
+    if np.any(pbc) and atoms.cell.volume < 1e-8:
+        pbc = False
+    numbers = atoms.get_atomic_numbers()
+    cutoff = max(check.cutoff for check in checks)
+
+    for first, second, distances in neighbour_pairs(atoms.get_positions(), tolerance=cutoff,
+                                                    cell=atoms.get_cell()[:], pbc=pbc):
+        for check in checks:
+            pairs = found[check.name]
+            offending = check.select(numbers, first, second, distances)
+            for i, j, distance in zip(first[offending], second[offending], distances[offending]):
+                key = (min(i, j), max(i, j))
+                pairs[key] = min(distance, pairs.get(key, np.inf))
+        if max_pairs is not None and all(len(pairs) >= max_pairs for pairs in found.values()):
+            break
+
+    results = {}
+    for name, pairs in found.items():
+        keys = sorted(pairs)[:max_pairs]
+        results[name] = (np.array(keys, dtype=np.int64).reshape(-1, 2),
+                         np.array([pairs[key] for key in keys], dtype=float))
+    return results
+
+
+def find_close_contacts(atoms, cutoff=0.90, max_pairs=None):
+    """
+    Finds pairs of atoms closer than a cutoff, other than pairs of two
+    hydrogens, across the periodic boundaries of the cell.
+
+    **parameters:**
+        atoms (ase.Atoms): The structure.
+        cutoff (float): Shortest allowed distance, in Å.
+        max_pairs (int): Stop once this many pairs are found, find all if None.
+
+    **returns:**
+        tuple: Atom index pairs, shape (n, 2), and their distances. The
+        structure has no overlapping atoms when there are no pairs.
+    """
+    check = CloseContacts(cutoff)
+    return validate_structure(atoms, [check], max_pairs)[check.name]
@@ -0,0 +1,152 @@
+#!/usr/bin/python
+from __future__ import print_function
+__author__ = "Dr. Dinga Wonanke"
+__status__ = "production"
+
+import io
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from ase.io import read
+from pymatgen.io.ase import AseAtomsAdaptor
+from pymatgen.analysis.diffraction.xrd import XRDCalculator
+from pymatgen.analysis.diffraction.neutron import NDCalculator
+from fairmofapp.loader.job_queue import report_progress
+from fairmofapp.analyzer.structure_check import find_close_contacts
+from fairmofapp.analyzer.mof_analysis import run_analysis, porosity_properties
+
+COMPARISON_ANALYSES = ["porosity", "overlaps", "pxrd"]
+# Overlapping pairs counted per structure before the search stops
+MAX_OVERLAPS = 1000
+PATTERN_COLORS = ["#FF5733", "#1f77b4", "#2ca02c", "#9467bd", "#8c564b",
+                  "#e377c2", "#7f7f7f", "#bcbd22", "#17becf", "#d62728"]
+
+
+def diffraction_pattern(ase_atom, diffraction_type="PXRD", wavelength="CuKa", two_theta_range=(5.0, 50.0)):
+    """
+    Simulates the X-ray or neutron diffraction pattern of a structure.
+
+    **parameters:**
+        ase_atom (ase.Atoms): The structure.
+        diffraction_type (str): 'PXRD' or 'Neutron Diffraction'.
+        wavelength (str): X-ray source, e.g. 'CuKa', used for PXRD.
+        two_theta_range (tuple): Range of 2θ kept, in degrees.
+
+    **returns:**
+        dict: Arrays of the 2θ positions, intensities and hkl labels of the peaks.
+    """
+    structure = AseAtomsAdaptor.get_structure(ase_atom)
+    calculator = XRDCalculator(wavelength=wavelength) if diffraction_type == "PXRD" else NDCalculator()
+    pattern = calculator.get_pattern(structure, two_theta_range=two_theta_range)
+    return {
+        'two_theta': np.array(pattern.x),
+        'intensity': np.array(pattern.y),
+        'hkl': [str(hkl) for hkl in pattern.hkls],
+    }
+
+
+def density(ase_atom):
+    # g/cm³ from amu/Å³
+    return ase_atom.get_masses().sum() / ase_atom.cell.volume * 1.66053907
+
+
+def analyse_upload(name, cif, analyses=COMPARISON_ANALYSES, cache_dir=None, probe_radius=1.86,
+                   number_of_steps=10000, diffraction_type="PXRD", wavelength="CuKa", two_theta_range=(5.0, 50.0)):
+    """
+    Parses an uploaded CIF and runs the selected analyses on it. Every
+    upload is analysed by its own job, so comparing several structures
+    takes about as long as the slowest one.
+
+    **parameters:**
+        name (str): Name of the uploaded file.
+        cif (bytes): Content of the CIF file.
+        analyses (list): Analyses to run, among COMPARISON_ANALYSES.
+        cache_dir (str): Directory of the result cache used for porosity, none if None.
+        probe_radius (float): Radius of the Zeo++ probe, in Å.
+        number_of_steps (int): Number of Zeo++ Monte Carlo samples.
+        diffraction_type (str): 'PXRD' or 'Neutron Diffraction'.
+        wavelength (str): X-ray source, e.g. 'CuKa'.
+        two_theta_range (tuple): Range of 2θ kept, in degrees.
+
+    **returns:**
+        dict: The name, the structure, a summary row for the comparison
+        table and the diffraction pattern or None.
+    """
+    report_progress(0.05, "Reading CIF")
+    ase_atom = read(io.BytesIO(cif), format='cif')
+    summary = {
+        'Structure': name,
+        'Formula': ase_atom.get_chemical_formula(),
+        'Atoms': len(ase_atom),
+        'Cell volume (Å³)': ase_atom.cell.volume,
+        'Density (g/cm³)': density(ase_atom) if ase_atom.cell.volume > 0 else np.nan,
+    }
+    result = {'name': name, 'atoms': ase_atom, 'summary': summary, 'pattern': None}
+
+    if "overlaps" in analyses:
+        report_progress(0.1, "Checking for overlapping atoms")
+        pairs, _ = find_close_contacts(ase_atom, max_pairs=MAX_OVERLAPS)
+        summary['Overlapping atom pairs'] = len(pairs)
+    if "pxrd" in analyses:
+        report_progress(0.2, "Simulating diffraction pattern")
+        result['pattern'] = diffraction_pattern(ase_atom, diffraction_type, wavelength, two_theta_range)
+    if "porosity" in analyses:
+        report_progress(0.4, "Computing porosity")
+        porosity = run_analysis('porosity', ase_atom, cache_dir, probe_radius=probe_radius,
+                                number_of_steps=number_of_steps)
+        summary.update(porosity_properties(porosity))
+    return result
+
+
+def comparison_table(results):
+    """
+    Gathers the summary rows of analysed uploads into one table.
+
+    **parameters:**
+        results (list): Results of analyse_upload, or dicts with a name
+            and an error for uploads that failed.
+
+    **returns:**
+        pd.DataFrame: One row per upload.
+    """
+    rows = []
+    for result in results:
+        if 'summary' in result:
+            rows.append(result['summary'])
+        else:
+            rows.append({'Structure': result['name'], 'Error': result['error']})
+    return pd.DataFrame(rows)
+
+
+def overlay_patterns(results, title="Simulated Patterns", normalise=True):
+    """
+    Plots the diffraction patterns of several structures on the same axes.
+
+    **parameters:**
+        results (list): Results of analyse_upload.
+        title (str): Title of the figure.
+        normalise (bool): Scale every pattern to a highest peak of 100.
+
+    **returns:**
+        go.Figure: The figure.
+    """
+    fig = go.Figure()
+    patterns = [result for result in results if result.get('pattern') is not None]
+    for i, result in enumerate(patterns):
+        pattern = result['pattern']
+        intensity = pattern['intensity']
+        if normalise and len(intensity) and intensity.max() > 0:
+            intensity = 100 * intensity / intensity.max()
+        fig.add_trace(go.Scatter(x=pattern['two_theta'], y=intensity, mode='lines', name=result['name'],
+                                 text=pattern['hkl'], line=dict(color=PATTERN_COLORS[i % len(PATTERN_COLORS)])))
+    fig.update_layout(
+        title=title,
+        xaxis_title="2 Theta (degrees)",
+        yaxis_title="Relative intensity" if normalise else "Intensity",
+        hovermode="x",
+        font=dict(family="Arial", size=12),
+        plot_bgcolor='rgba(0, 0, 0, 0)',
+        xaxis=dict(showgrid=False),
+        yaxis=dict(showgrid=False)
+    )
+    return fig
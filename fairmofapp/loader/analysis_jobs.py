@@ -0,0 +1,138 @@
+import hashlib
+import streamlit as st
+from fairmofapp.loader.result_cache import ResultCache
+from fairmofapp.loader.job_queue import JobQueue, DONE, FINISHED
+from fairmofapp.analyzer.mof_analysis import analysis_key, run_analysis
+from fairmofapp.analyzer.structure_comparison import analyse_upload
+
+RESULT_CACHE_DIR = './data/result_cache'
+# Longest time an analysis job may run, in seconds
+JOB_TIMEOUT = 1800
+JOB_MODULES = ["fairmofapp.analyzer.mof_analysis", "fairmofapp.analyzer.structure_comparison"]
+
+
+@st.cache_resource
+def get_result_cache(cache_dir=RESULT_CACHE_DIR):
+    return ResultCache(cache_dir)
+
+
+@st.cache_resource
+def get_job_queue():
+    """
+    Returns the job queue of the server process. Every page submits its
+    analyses here, so all sessions and pages share at most one worker
+    per CPU. Jobs fork from a server that has already imported the
+    analysis code.
+    """
+    return JobQueue(timeout=JOB_TIMEOUT, start_method="forkserver", preload=JOB_MODULES)
+
+
+@st.fragment(run_every=1)
+def job_progress(job_id, label):
+    status = get_job_queue().status(job_id)
+    if status is None or status['status'] in FINISHED:
+        st.rerun()
+    st.progress(status['progress'], text=f"{label}: {status['message'] or status['status']} ({status['elapsed']:.0f} s)")
+    if st.button("Cancel", key=f"cancel_{job_id}"):
+        get_job_queue().cancel(job_id)
+        st.rerun()
+
+
+def analysis_result(name, ase_atom, label, **parameters):
+    """
+    Returns the result of an analysis from the result cache or, on a
+    miss, submits it to the job queue and shows its progress. The page
+    is rerun when the job finishes.
+
+    **parameters:**
+        name (str): Key of the analysis in mof_analysis.ANALYSES.
+        ase_atom (ase.Atoms): The structure.
+        label (str): Description shown while the job runs.
+        parameters: Keyword arguments of the analysis.
+
+    **returns:**
+        The result, or None while the job has not finished successfully.
+    """
+    cache = get_result_cache()
+    key = analysis_key(cache, name, ase_atom, **parameters)
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    queue = get_job_queue()
+    jobs = st.session_state.setdefault("analysis_jobs", {})
+    status = queue.status(jobs[key]) if key in jobs else None
+    if status is None:
+        jobs[key] = queue.submit(run_analysis, name, ase_atom, cache.directory, name=label, **parameters)
+        status = queue.status(jobs[key])
+    if status['status'] == DONE:
+        return queue.result(jobs[key])
+    if status['status'] in FINISHED:
+        error = (status['error'] or "").splitlines()
+        st.error(f"{label} {status['status']}. {error[0] if error else ''}")
+        if st.button("Retry", key=f"retry_{key}"):
+            del jobs[key]
+            st.rerun()
+        return None
+    job_progress(jobs[key], label)
+    return None
+
+
+@st.fragment(run_every=1)
+def comparison_progress(job_ids):
+    queue = get_job_queue()
+    statuses = [queue.status(job_id) for job_id in job_ids]
+    if all(status is None or status['status'] in FINISHED for status in statuses):
+        st.rerun()
+    for status in filter(None, statuses):
+        st.progress(status['progress'], text=f"{status['name']}: {status['message'] or status['status']}")
+    if st.button("Cancel", key="cancel_comparison"):
+        for job_id in job_ids:
+            queue.cancel(job_id)
+        st.rerun()
+
+
+def comparison_results(uploaded_files, analyses, **options):
+    """
+    Analyses every uploaded CIF in its own job, so the structures are
+    parsed and analysed in parallel, and shows their progress. The page
+    is rerun when all jobs have finished. Jobs are keyed by the content
+    of the upload, the analyses and the options, so a page showing the
+    same comparison reuses the jobs of another one.
+
+    **parameters:**
+        uploaded_files (list): The uploaded CIF files.
+        analyses (list): Analyses to run, among COMPARISON_ANALYSES.
+        options: Keyword arguments of analyse_upload.
+
+    **returns:**
+        list: The result of every upload, or None while jobs are running.
+    """
+    queue = get_job_queue()
+    jobs = st.session_state.setdefault("comparison_jobs", {})
+    keys = []
+    for uploaded_file in uploaded_files:
+        data = uploaded_file.getvalue()
+        key = (uploaded_file.name, hashlib.sha256(data).hexdigest(), tuple(analyses), tuple(sorted(options.items())))
+        if key not in jobs or queue.status(jobs[key]) is None:
+            jobs[key] = queue.submit(analyse_upload, uploaded_file.name, data, analyses, name=uploaded_file.name,
+                                     cache_dir=RESULT_CACHE_DIR, **options)
+        keys.append(key)
+
+    statuses = [queue.status(jobs[key]) for key in keys]
+    if any(status['status'] not in FINISHED for status in statuses):
+        comparison_progress([jobs[key] for key in keys])
+        return None
+    results = []
+    for key, status in zip(keys, statuses):
+        if status['status'] == DONE:
+            results.append(queue.result(jobs[key]))
+        else:
+            error = (status['error'] or "").splitlines()
+            results.append({'name': status['name'], 'error': error[0] if error else status['status']})
+    if any('error' in result for result in results) and st.button("Run failed structures again"):
+        for key, result in zip(keys, results):
+            if 'error' in result:
+                del jobs[key]
+        st.rerun()
+    return results
@@ -0,0 +1,120 @@
+import time
+import zlib
+import itertools
+import struct
+import zipfile
+import tempfile
+from fairmofapp.loader.cif_manifest import _LOCAL_HEADER, group_by_archive, read_member, read_raw_member
+
+_CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+_END_OF_CENTRAL_DIRECTORY = struct.Struct("<4s4H2LH")
+_ZIP32_LIMIT = 0xFFFFFFFF
+
+
+def _dos_date_time(timestamp):
+    local = time.localtime(timestamp)
+    dos_time = local.tm_hour << 11 | local.tm_min << 5 | local.tm_sec // 2
+    dos_date = (local.tm_year - 1980) << 9 | local.tm_mon << 5 | local.tm_mday
+    return dos_time, dos_date
+
+
+class RawZipWriter:
+    """
+    A minimal ZIP writer that adds members from already compressed bytes,
+    so members of the source archives are copied without being
+    decompressed and compressed again.
+
+    **parameters:**
+        output (file): Binary file object the archive is written to.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.entries = []
+        self.dos_time, self.dos_date = _dos_date_time(time.time())
+
+    def write_raw(self, arcname, raw, compress_type, crc, file_size):
+        """
+        Adds a member from its compressed bytes.
+
+        **parameters:**
+            arcname (str): Name of the member in the archive.
+            raw (bytes): The compressed member data.
+            compress_type (int): zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED.
+            crc (int): CRC-32 of the uncompressed data.
+            file_size (int): Size of the uncompressed data.
+        """
+        offset = self.output.tell()
+        if max(offset, len(raw), file_size) >= _ZIP32_LIMIT:
+            raise zipfile.LargeZipFile("Bundles larger than 4 GiB are not supported.")
+        name = arcname.encode('utf-8')
+        flags = 0x800 if not arcname.isascii() else 0
+        self.output.write(_LOCAL_HEADER.pack(
+            b"PK\x03\x04", 20, flags, compress_type, self.dos_time, self.dos_date,
+            crc, len(raw), file_size, len(name), 0))
+        self.output.write(name)
+        self.output.write(raw)
+        self.entries.append((name, flags, compress_type, crc, len(raw), file_size, offset))
+
+    def write_bytes(self, arcname, data):
+        """
+        Adds a member from uncompressed bytes, deflating it.
+
+        **parameters:**
+            arcname (str): Name of the member in the archive.
+            data (bytes): The member content.
+        """
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+        raw = compressor.compress(data) + compressor.flush()
+        self.write_raw(arcname, raw, zipfile.ZIP_DEFLATED, zlib.crc32(data), len(data))
+
+    def close(self):
+        """
+        Writes the central directory. The output file is left open.
+        """
+        start = self.output.tell()
+        for name, flags, compress_type, crc, compress_size, file_size, offset in self.entries:
+            self.output.write(_CENTRAL_HEADER.pack(
+                b"PK\x01\x02", 20, 20, flags, compress_type, self.dos_time, self.dos_date,
+                crc, compress_size, file_size, len(name), 0, 0, 0, 0, 0, offset))
+            self.output.write(name)
+        size = self.output.tell() - start
+        if start >= _ZIP32_LIMIT or len(self.entries) > 0xFFFF:
+            raise zipfile.LargeZipFile("Bundles larger than 4 GiB are not supported.")
+        self.output.write(_END_OF_CENTRAL_DIRECTORY.pack(
+            b"PK\x05\x06", 0, 0, len(self.entries), len(self.entries), size, start, 0))
+
+
+def bundle_cifs(mof_names, zip_directory, max_memory=32 * 1024 * 1024, chunk_size=1000):
+    """
+    Bundles the CIF files of many MOFs into a single ZIP archive without
+    touching the disk. Members are streamed from the source archives, and
+    stored or deflated members are copied as compressed bytes. The bundle
+    is kept in memory up to max_memory bytes and spooled to a temporary
+    file beyond that.
+
+    **parameters:**
+        mof_names (iterable): MOF names to bundle, looked up in the manifest chunk_size at a time.
+        zip_directory (str): Path to the directory containing .zip files.
+        max_memory (int): Size above which the bundle is spooled to disk.
+        chunk_size (int): Number of MOF names looked up at a time.
+
+    **returns:**
+        tempfile.SpooledTemporaryFile: The ZIP archive, positioned at its start.
+    """
+    bundle = tempfile.SpooledTemporaryFile(max_size=max_memory, mode='w+b')
+    writer = RawZipWriter(bundle)
+    names = iter(mof_names)
+    for chunk in iter(lambda: list(itertools.islice(names, chunk_size)), []):
+        for zip_path, members in group_by_archive(chunk, zip_directory).items():
+            with open(zip_path, 'rb') as archive_file:
+                for mof_name, entry in members:
+                    _, _, _, file_size, compress_type, crc = entry
+                    if compress_type in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                        writer.write_raw(f"{mof_name}.cif", read_raw_member(archive_file, entry),
+                                         compress_type, crc, file_size)
+                    else:
+                        writer.write_bytes(f"{mof_name}.cif", read_member(archive_file, entry))
+    writer.close()
+    bundle.seek(0)
+    return bundle
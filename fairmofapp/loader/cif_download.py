@@ -0,0 +1,39 @@
+import streamlit as st
+from fairmofapp.loader.cif_bundle import bundle_cifs
+
+CIF_DIRECTORY = "./data/cifs"
+
+
+def bundle_bytes(mof_names, zip_directory=CIF_DIRECTORY):
+    """
+    Bundles the CIF files of many MOFs and returns the ZIP archive as
+    bytes, the form st.download_button accepts.
+
+    **parameters:**
+        mof_names (iterable): MOF names to bundle.
+        zip_directory (str): Path to the directory containing .zip files.
+
+    **returns:**
+        bytes: The ZIP archive.
+    """
+    with bundle_cifs(mof_names, zip_directory) as bundle:
+        return bundle.read()
+
+
+def cif_download_button(mof_names, output_name, zip_directory=CIF_DIRECTORY, key=None):
+    """
+    Shows a button downloading the CIF files of some MOFs as one ZIP archive.
+
+    **parameters:**
+        mof_names (iterable): MOF names to bundle.
+        output_name (str): Name of the archive, without extension.
+        zip_directory (str): Path to the directory containing .zip files.
+        key (str): Widget key, needed when a page shows several buttons.
+    """
+    st.download_button(
+        label=f"Download {output_name}.zip",
+        data=bundle_bytes(mof_names, zip_directory),
+        file_name=f"{output_name}.zip",
+        mime='application/zip',
+        key=key,
+    )
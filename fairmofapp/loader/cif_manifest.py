@@ -0,0 +1,193 @@
+import os
+import json
+import zlib
+import struct
+import zipfile
+import tempfile
+
+MANIFEST_NAME = "cif_manifest.json"
+# Bumped whenever scan_archive changes, so manifests on disk are scanned again
+MANIFEST_VERSION = 3
+# Folder of the archives holding the CIFs, members elsewhere are not served
+CIF_FOLDER = "Experiment_cif/"
+# signature, version, flags, compression, mod time, mod date, crc, sizes, name and extra lengths
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+_manifests = {}
+
+
+def scan_archive(zip_path):
+    """
+    Lists the CIF members of the Experiment_cif/ folder of a ZIP archive
+    together with everything needed to read them back without parsing the
+    central directory again. Only that folder is scanned, as the CIFs were
+    always read from Experiment_cif/<refcode>.cif.
+
+    **parameters:**
+        zip_path (str): Path to the ZIP file.
+
+    **returns:**
+        dict: Mapping of refcode to [member name, header offset, compressed size,
+        size, compression method, crc].
+    """
+    members = {}
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        for info in zip_ref.infolist():
+            name = info.filename[len(CIF_FOLDER):]
+            if not info.filename.startswith(CIF_FOLDER) or not name.endswith(".cif") or "/" in name:
+                continue
+            members[name[:-len(".cif")]] = [info.filename, info.header_offset, info.compress_size,
+                                            info.file_size, info.compress_type, info.CRC]
+    return members
+
+
+def load_manifest(zip_directory):
+    """
+    Loads the manifest mapping every refcode to the archive member holding
+    its CIF. The manifest is stored as cif_manifest.json in zip_directory
+    and only archives whose size or modification time changed are scanned again.
+
+    **parameters:**
+        zip_directory (str): Path to the directory containing .zip files.
+
+    **returns:**
+        dict: Mapping of refcode to (archive file name, member entry).
+    """
+    manifest_path = os.path.join(zip_directory, MANIFEST_NAME)
+    stats = {filename: os.stat(os.path.join(zip_directory, filename))
+             for filename in sorted(os.listdir(zip_directory)) if filename.endswith(".zip")}
+    signature = {filename: [stat.st_size, stat.st_mtime_ns] for filename, stat in stats.items()}
+
+    cached = _manifests.get(zip_directory)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    archives = {}
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, 'r') as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest.get("version") == MANIFEST_VERSION:
+                archives = manifest.get("archives", {})
+        except (OSError, ValueError):
+            archives = {}
+
+    changed = False
+    for filename in list(archives):
+        if filename not in signature:
+            del archives[filename]
+            changed = True
+    for filename, (size, mtime_ns) in signature.items():
+        archive = archives.get(filename)
+        if archive is None or archive["size"] != size or archive["mtime_ns"] != mtime_ns:
+            try:
+                members = scan_archive(os.path.join(zip_directory, filename))
+            except zipfile.BadZipFile:
+                print(f"Skipping {filename} because it is not a valid zip file.")
+                members = {}
+            archives[filename] = {"size": size, "mtime_ns": mtime_ns, "members": members}
+            changed = True
+
+    if changed:
+        try:
+            with tempfile.NamedTemporaryFile('w', dir=zip_directory, delete=False,
+                                             suffix=".tmp") as manifest_file:
+                json.dump({"version": MANIFEST_VERSION, "archives": archives}, manifest_file)
+            os.replace(manifest_file.name, manifest_path)
+        except OSError:
+            # A read-only data directory still works, the manifest is then kept in memory.
+            pass
+
+    lookup = {}
+    for filename in sorted(archives):
+        for refcode, entry in archives[filename]["members"].items():
+            lookup.setdefault(refcode, (filename, entry))
+    _manifests[zip_directory] = (signature, lookup)
+    return lookup
+
+
+def read_raw_member(archive_file, entry):
+    """
+    Reads the still compressed bytes of an archive member by seeking
+    straight to its local header.
+
+    **parameters:**
+        archive_file (file): ZIP file opened in binary mode.
+        entry (list): Member entry from the manifest.
+
+    **returns:**
+        bytes: The compressed member data.
+    """
+    _, header_offset, compress_size = entry[:3]
+    archive_file.seek(header_offset)
+    header = _LOCAL_HEADER.unpack(archive_file.read(_LOCAL_HEADER.size))
+    if header[0] != _LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile(f"Bad local file header for {entry[0]}")
+    archive_file.seek(header[-2] + header[-1], os.SEEK_CUR)
+    return archive_file.read(compress_size)
+
+
+def read_member(archive_file, entry):
+    """
+    Reads and decompresses an archive member.
+
+    **parameters:**
+        archive_file (file): ZIP file opened in binary mode.
+        entry (list): Member entry from the manifest.
+
+    **returns:**
+        bytes: The member content.
+    """
+    member, _, _, file_size, compress_type, crc = entry
+    raw = read_raw_member(archive_file, entry)
+    if compress_type == zipfile.ZIP_STORED:
+        data = raw
+    elif compress_type == zipfile.ZIP_DEFLATED:
+        data = zlib.decompressobj(-zlib.MAX_WBITS).decompress(raw)
+    else:
+        with zipfile.ZipFile(archive_file) as zip_ref:
+            return zip_ref.read(member)
+    if len(data) != file_size or zlib.crc32(data) != crc:
+        raise zipfile.BadZipFile(f"Bad CRC or size for {member}")
+    return data
+
+
+def group_by_archive(mof_names, zip_directory):
+    """
+    Looks up MOFs in the manifest and groups them by archive, ordered by
+    their position in the archive so that every archive is read sequentially.
+
+    **parameters:**
+        mof_names (list): List of MOF names.
+        zip_directory (str): Path to the directory containing .zip files.
+
+    **returns:**
+        dict: Mapping of archive path to a list of (refcode, member entry).
+    """
+    manifest = load_manifest(zip_directory)
+    groups = {}
+    for mof_name in dict.fromkeys(mof_names):
+        if mof_name in manifest:
+            filename, entry = manifest[mof_name]
+            groups.setdefault(os.path.join(zip_directory, filename), []).append((mof_name, entry))
+    for members in groups.values():
+        members.sort(key=lambda item: item[1][1])
+    return groups
+
+
+def iter_cifs(mof_names, zip_directory):
+    """
+    Yields the CIF content of the requested MOFs, opening every archive
+    once and reading only the needed members.
+
+    **parameters:**
+        mof_names (list): List of MOF names.
+        zip_directory (str): Path to the directory containing .zip files.
+
+    **yields:**
+        tuple: The refcode and the CIF content as bytes.
+    """
+    for zip_path, members in group_by_archive(mof_names, zip_directory).items():
+        with open(zip_path, 'rb') as archive_file:
+            for mof_name, entry in members:
+                yield mof_name, read_member(archive_file, entry)
@@ -1,6 +1,6 @@
 import os
 import zipfile
-import shutil
+from fairmofapp.loader.cif_manifest import iter_cifs
 
 
 def list_files_in_zip(zip_path):
@@ -20,6 +20,8 @@ def list_files_in_zip(zip_path):
 def search_and_copy_from_zip(mof_names, zip_directory, output_dir):
     """
     Copies the relevant files from all .zip files in the specified directory.
+    The archives are looked up through the refcode manifest, so every archive
+    is opened once and only the requested members are read.
 
     **Parameters:**
         - mof_names (list): List of MOF names to search for in the .zip files.
@@ -31,34 +33,8 @@ def search_and_copy_from_zip(mof_names, zip_directory, output_dir):
     """
     os.makedirs(output_dir, exist_ok=True)
 
-    # Iterate over all zip files in the specified directory
-    for filename in os.listdir(zip_directory):
-        if filename.endswith(".zip"):
-            file_path = os.path.join(zip_directory, filename)
-            with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                all_mofs = zip_ref.namelist()
-                for mof_name in mof_names:
-                    expected_filename = f"Experiment_cif/{mof_name}.cif"
-                    if expected_filename in all_mofs:
-                        print(f"Copying {expected_filename} from {filename}")
-
-                        # Extract the specific file to a temporary path
-                        zip_ref.extract(expected_filename, output_dir)
-
-                        # Construct the path to the extracted file
-                        extracted_file_path = os.path.join(
-                            output_dir, expected_filename)
-
-                        # Construct the final path for the copied file
-                        new_file_path = os.path.join(
-                            output_dir, f"{mof_name}.cif")
-
-                        # Copy the extracted file to the new location
-                        shutil.copy(extracted_file_path, new_file_path)
-
-                        # Remove the temporary extracted directory if it exists
-                        shutil.rmtree(os.path.join(
-                            output_dir, "Experiment_cif"), ignore_errors=True)
-                        # If found, no need to check other MOF names
+    for mof_name, content in iter_cifs(mof_names, zip_directory):
+        with open(os.path.join(output_dir, f"{mof_name}.cif"), 'wb') as cif_file:
+            cif_file.write(content)
 
     return output_dir
@@ -0,0 +1,363 @@
+import os
+import io
+import json
+import gzip
+import zlib
+import shutil
+import tarfile
+import tempfile
+
+INDEX_SUFFIX = ".idx.json"
+# Indexes built in this process, keyed by archive path, size and modification
+# time, so a read-only data directory does not mean rebuilding on every call
+_indexes = {}
+
+
+def member_refcode(member_name):
+    """
+    Returns the refcode of a CIF member, e.g. cifs/ABAFUH_fair_op.cif -> ABAFUH.
+
+    **parameters:**
+        member_name (str): Name of the member in the archive.
+
+    **returns:**
+        str: The refcode.
+    """
+    refcode = os.path.splitext(os.path.basename(member_name))[0]
+    return refcode[:-len("_fair_op")] if refcode.endswith("_fair_op") else refcode
+
+
+def _padded_size(size):
+    return -(-size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+
+
+def _tar_header(block):
+    # None for a block that is not a valid tar header, e.g. of a short
+    # gzip member or of a gzip file that does not hold a tar archive
+    try:
+        return tarfile.TarInfo.frombuf(block, tarfile.ENCODING, "surrogateescape")
+    except tarfile.TarError:
+        return None
+
+
+def _pax_headers(data):
+    # Records of the form "<length> <keyword>=<value>\n"
+    headers = {}
+    position = 0
+    while position < len(data) and data[position:position + 1] != b"\0":
+        space = data.index(b" ", position)
+        length = int(data[position:space])
+        keyword, _, value = data[space + 1:position + length - 1].partition(b"=")
+        headers[keyword.decode('utf-8')] = value.decode('utf-8', 'surrogateescape')
+        position += length
+    return headers
+
+
+class _MemberReader(io.RawIOBase):
+    """
+    A file object over the content of one tar member in a stream, which
+    never reads past the end of the member.
+    """
+
+    def __init__(self, stream, size):
+        self.stream = stream
+        self.remaining = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(min(len(buffer), self.remaining))
+        self.remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def iter_tar_stream(stream):
+    """
+    Walks the members of an uncompressed tar stream one header at a time.
+    Unlike iterating over a tarfile.TarFile, nothing is kept of the
+    members already read, so memory use does not grow with the archive.
+    GNU long names and pax path and size records are applied to the
+    member they describe.
+
+    **parameters:**
+        stream (file): Binary file object positioned at the start of the archive.
+
+    **yields:**
+        tuple: The tarfile.TarInfo of a member and a file object over its
+        content, which is only valid until the next item is requested.
+    """
+    overrides = {}
+    while True:
+        block = stream.read(tarfile.BLOCKSIZE)
+        if len(block) < tarfile.BLOCKSIZE or not block.strip(b"\0"):
+            return
+        info = _tar_header(block)
+        if info is None:
+            raise tarfile.ReadError("Invalid tar header.")
+        if info.type in (tarfile.GNUTYPE_LONGNAME, tarfile.XHDTYPE, tarfile.XGLTYPE):
+            data = stream.read(_padded_size(info.size))[:info.size]
+            if info.type == tarfile.GNUTYPE_LONGNAME:
+                overrides["path"] = data.rstrip(b"\0").decode(tarfile.ENCODING, 'surrogateescape')
+            elif info.type == tarfile.XHDTYPE:
+                overrides.update(_pax_headers(data))
+            continue
+        if "path" in overrides:
+            info.name = overrides["path"]
+        if "size" in overrides:
+            info.size = int(overrides["size"])
+        overrides = {}
+        size = info.size if info.isfile() else 0
+        content = _MemberReader(stream, size)
+        yield info, content
+        # Skips what the caller did not read and the padding of the member
+        stream.seek(content.remaining + _padded_size(size) - size, io.SEEK_CUR)
+
+
+def iter_tar_gz(gzip_path, mof_names=None):
+    """
+    Streams the CIF members of a tar.gz archive in a single pass. The
+    archive is never held in memory and the pass stops as soon as every
+    requested MOF was found.
+
+    **parameters:**
+        gzip_path (str): Path to the tar.gz archive.
+        mof_names (list): Refcodes to look for. All CIF members are yielded if None.
+
+    **yields:**
+        tuple: The refcode, the tarfile.TarInfo and a file object over the
+        member content, which is only valid until the next item is requested.
+    """
+    wanted = None if mof_names is None else set(mof_names)
+    with gzip.open(gzip_path, 'rb') as gz_file:
+        for member, content in iter_tar_stream(gz_file):
+            if not member.isfile() or not member.name.endswith(".cif"):
+                continue
+            refcode = member_refcode(member.name)
+            if wanted is not None and refcode not in wanted:
+                continue
+            yield refcode, member, content
+            if wanted is not None:
+                wanted.discard(refcode)
+                if not wanted:
+                    return
+
+
+def iter_gzip_members(archive_file, chunk_size=1 << 16, max_size=None):
+    """
+    Walks the gzip members of a file, decompressing in bounded chunks.
+
+    **parameters:**
+        archive_file (file): Gzip file opened in binary mode.
+        chunk_size (int): Number of bytes read and decompressed at a time.
+        max_size (callable): Called with the first tar block of a member,
+            returns the largest decompressed size expected for it. The walk
+            stops as soon as a member grows beyond it, without
+            decompressing the rest of the file.
+
+    **yields:**
+        tuple: Compressed start offset, compressed end offset, the first
+        tar block of the decompressed member and its decompressed size.
+        A member larger than max_size is yielded with an end offset of
+        None and is the last one.
+    """
+    position = 0
+    buffer = archive_file.read(chunk_size)
+    while buffer:
+        start = position
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        head = b""
+        size = 0
+        limit = None
+        while True:
+            if not buffer:
+                buffer = archive_file.read(chunk_size)
+                if not buffer:
+                    raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+            output = decompressor.decompress(buffer, chunk_size)
+            size += len(output)
+            if len(head) < tarfile.BLOCKSIZE:
+                head += output[:tarfile.BLOCKSIZE - len(head)]
+            if max_size is not None and limit is None and len(head) == tarfile.BLOCKSIZE:
+                limit = max_size(head)
+            if limit is not None and size > limit:
+                yield start, None, head, size
+                return
+            rest = decompressor.unused_data if decompressor.eof else decompressor.unconsumed_tail
+            position += len(buffer) - len(rest)
+            buffer = rest
+            if decompressor.eof:
+                break
+        yield start, position, head, size
+        if not buffer:
+            buffer = archive_file.read(chunk_size)
+
+
+def _index_path(gzip_path):
+    return f"{gzip_path}{INDEX_SUFFIX}"
+
+
+def _save_index(gzip_path, entries):
+    stat = os.stat(gzip_path)
+    index = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+             "blocked": entries is not None, "members": entries or {}}
+    _indexes[(os.path.abspath(gzip_path), stat.st_size, stat.st_mtime_ns)] = index
+    try:
+        with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(os.path.abspath(gzip_path)),
+                                         delete=False, suffix=".tmp") as index_file:
+            json.dump(index, index_file)
+        os.replace(index_file.name, _index_path(gzip_path))
+    except OSError:
+        pass
+    return index
+
+
+def write_indexed_tar_gz(members, output_path):
+    """
+    Writes a block compressed tar.gz archive in which every CIF is its own
+    gzip member, in the spirit of BGZF. The file stays a valid tar.gz for
+    standard tools, and a sidecar index of the compressed offset of every
+    member allows reading any CIF without decompressing the others.
+
+    **parameters:**
+        members (iterable): Pairs of member name and content as bytes.
+        output_path (str): Path to the output archive.
+
+    **returns:**
+        dict: The index, see load_gzip_index.
+    """
+    entries = {}
+    with open(output_path, 'wb') as archive_file:
+        for name, content in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            block = info.tobuf(tarfile.USTAR_FORMAT) + content + b"\0" * (_padded_size(len(content)) - len(content))
+            offset = archive_file.tell()
+            archive_file.write(gzip.compress(block, mtime=0))
+            entries[member_refcode(name)] = [offset, archive_file.tell() - offset, name]
+        archive_file.write(gzip.compress(b"\0" * tarfile.RECORDSIZE, mtime=0))
+    return _save_index(output_path, entries)
+
+
+def build_gzip_index(gzip_path):
+    """
+    Indexes a tar.gz archive by walking its gzip members once. Only archives
+    in which every gzip member holds exactly one tar member, such as those
+    written by write_indexed_tar_gz, can be read at random; a plain single
+    stream tar.gz is recorded as not blocked so it is not walked again.
+    Such an archive is recognised as soon as its first gzip member
+    decompresses past the size of one tar member, so telling it apart
+    costs about one CIF of decompression, not a pass over the archive.
+
+    **parameters:**
+        gzip_path (str): Path to the tar.gz archive.
+
+    **returns:**
+        dict: The index.
+    """
+    def member_size(head):
+        # A block of zeros is the end-of-archive marker, which may span a record
+        if not head.strip(b"\0"):
+            return tarfile.RECORDSIZE
+        info = _tar_header(head)
+        return 0 if info is None else tarfile.BLOCKSIZE + _padded_size(info.size)
+
+    entries = {}
+    with open(gzip_path, 'rb') as archive_file:
+        for start, end, head, size in iter_gzip_members(archive_file, max_size=member_size):
+            if end is None:
+                return _save_index(gzip_path, None)
+            if not head.strip(b"\0"):
+                continue
+            # A member without a tar header of its own means the archive
+            # is not blocked, as does one not holding exactly one member
+            info = _tar_header(head)
+            if info is None or size != member_size(head):
+                return _save_index(gzip_path, None)
+            if info.isfile() and info.name.endswith(".cif"):
+                entries[member_refcode(info.name)] = [start, end - start, info.name]
+    return _save_index(gzip_path, entries)
+
+
+def load_gzip_index(gzip_path, build=True):
+    """
+    Loads the index of a tar.gz archive from this process or from its
+    sidecar file, rebuilding it when the archive size or modification
+    time changed.
+
+    **parameters:**
+        gzip_path (str): Path to the tar.gz archive.
+        build (bool): Build the index if it is missing or stale.
+
+    **returns:**
+        dict: The index, or None if it is missing and build is False.
+    """
+    stat = os.stat(gzip_path)
+    key = (os.path.abspath(gzip_path), stat.st_size, stat.st_mtime_ns)
+    if key in _indexes:
+        return _indexes[key]
+    try:
+        with open(_index_path(gzip_path), 'r') as index_file:
+            index = json.load(index_file)
+        if index["size"] == stat.st_size and index["mtime_ns"] == stat.st_mtime_ns:
+            _indexes[key] = index
+            return index
+    except (OSError, ValueError, KeyError):
+        pass
+    return build_gzip_index(gzip_path) if build else None
+
+
+def read_indexed_member(archive_file, entry):
+    """
+    Reads one CIF from a block compressed archive by decompressing only
+    the gzip member that holds it.
+
+    **parameters:**
+        archive_file (file): Archive opened in binary mode.
+        entry (list): Compressed offset, compressed length and member name from the index.
+
+    **returns:**
+        bytes: The CIF content.
+    """
+    offset, length, _ = entry
+    archive_file.seek(offset)
+    block = gzip.decompress(archive_file.read(length))
+    info = _tar_header(block[:tarfile.BLOCKSIZE])
+    if info is None:
+        raise tarfile.ReadError(f"No tar header at offset {offset}.")
+    return block[tarfile.BLOCKSIZE:tarfile.BLOCKSIZE + info.size]
+
+
+def extract_cifs(mof_names, gzip_path, output_dir="mof_folders", chunk_size=1 << 16):
+    """
+    Extracts the CIF files of many MOFs from a gzip compressed tar archive.
+    Block compressed archives are read at random through their index;
+    any other tar.gz is streamed once, copying each requested member in
+    chunks, so memory use does not depend on the archive size.
+
+    **parameters:**
+        mof_names (list): List of MOF names to extract.
+        gzip_path (str): Path to the tar.gz archive.
+        output_dir (str): Path to the directory where extracted files will be saved.
+        chunk_size (int): Number of bytes copied at a time when streaming.
+
+    **returns:**
+        str: Path to the directory containing the extracted files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    index = load_gzip_index(gzip_path)
+    if index["blocked"]:
+        members = sorted((index["members"][name] for name in set(mof_names) if name in index["members"]),
+                         key=lambda entry: entry[0])
+        with open(gzip_path, 'rb') as archive_file:
+            for entry in members:
+                with open(os.path.join(output_dir, os.path.basename(entry[2])), 'wb') as cif_file:
+                    cif_file.write(read_indexed_member(archive_file, entry))
+        return output_dir
+
+    for _, member, content in iter_tar_gz(gzip_path, mof_names):
+        with open(os.path.join(output_dir, os.path.basename(member.name)), 'wb') as cif_file:
+            shutil.copyfileobj(content, cif_file, chunk_size)
+    return output_dir
@@ -0,0 +1,292 @@
+import os
+import time
+import uuid
+import threading
+import traceback
+import multiprocessing
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed out"
+FINISHED = (DONE, FAILED, CANCELLED, TIMED_OUT)
+
+# Connection to the queue, set inside a job's process
+_progress_connection = None
+
+
+def report_progress(fraction, message=""):
+    """
+    Reports the progress of the job running in this process. Outside a
+    job it does nothing, so analysis functions can call it unconditionally.
+
+    **parameters:**
+        fraction (float): Fraction of the work done, between 0 and 1.
+        message (str): Short description of the current step.
+    """
+    if _progress_connection is not None:
+        _progress_connection.send(("progress", (float(fraction), message)))
+
+
+def _run_job(connection, function, args, kwargs):
+    global _progress_connection
+    _progress_connection = connection
+    try:
+        result = function(*args, **kwargs)
+    except BaseException as error:
+        connection.send(("error", f"{type(error).__name__}: {error}\n{traceback.format_exc()}"))
+    else:
+        connection.send(("result", result))
+    finally:
+        connection.close()
+
+
+class Job:
+    def __init__(self, job_id, name, function, args, kwargs, timeout):
+        self.job_id = job_id
+        self.name = name
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.timeout = timeout
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.process = None
+        self.connection = None
+
+    def snapshot(self):
+        now = self.finished or time.time()
+        return {
+            'job_id': self.job_id,
+            'name': self.name,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'error': self.error,
+            'elapsed': now - self.started if self.started else 0.0,
+        }
+
+
+class JobQueue:
+    """
+    Runs long analyses outside the web server process. Every job gets its
+    own worker process, so a job can be cancelled or stopped at its
+    timeout by terminating that process, which a shared pool cannot do
+    without losing its other workers. At most max_workers jobs run at
+    once and the rest wait in submission order. A monitor thread starts
+    queued jobs, collects progress and results and enforces timeouts,
+    so callers only need to poll status.
+
+    Jobs run in spawned processes, or processes forked from a fork
+    server, never forked from the multi-threaded web server itself, so
+    their functions and arguments must be picklable and importable, e.g.
+    functions of fairmofapp.analyzer.mof_analysis.
+
+    **parameters:**
+        max_workers (int): Maximum number of jobs running at once, the
+            number of CPUs if None.
+        timeout (float): Default time limit of a job in seconds, none if None.
+        keep_finished (int): Number of finished jobs whose results are kept.
+        start_method (str): multiprocessing start method of the workers.
+        preload (list): Modules imported once by the fork server when
+            start_method is 'forkserver', so that jobs do not pay for
+            importing them.
+    """
+
+    def __init__(self, max_workers=None, timeout=None, keep_finished=100, start_method="spawn", preload=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.keep_finished = keep_finished
+        self._context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver" and preload:
+            self._context.set_forkserver_preload(list(preload))
+        self._jobs = {}
+        self._queued = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._monitor = threading.Thread(target=self._monitor_loop, name="job-queue-monitor", daemon=True)
+        self._monitor.start()
+
+    def submit(self, function, *args, name=None, timeout=None, **kwargs):
+        """
+        Queues a call of function(*args, **kwargs) in a worker process.
+
+        **parameters:**
+            function (callable): Importable function to run.
+            name (str): Label of the job, the function name if None.
+            timeout (float): Time limit of this job in seconds, the queue
+                default if None.
+
+        **returns:**
+            str: Identifier of the job.
+        """
+        job = Job(uuid.uuid4().hex, name or function.__name__, function, args, kwargs,
+                  self.timeout if timeout is None else timeout)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The job queue is closed.")
+            self._jobs[job.job_id] = job
+            self._queued.append(job)
+        self._wakeup.set()
+        return job.job_id
+
+    def status(self, job_id):
+        """
+        Returns the state of a job.
+
+        **parameters:**
+            job_id (str): Identifier returned by submit.
+
+        **returns:**
+            dict: Status, progress between 0 and 1, progress message, error
+            message and elapsed running time, or None for an unknown job.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.snapshot() if job else None
+
+    def result(self, job_id):
+        """
+        Returns the result of a job that finished successfully.
+
+        **parameters:**
+            job_id (str): Identifier returned by submit.
+
+        **raises:**
+            KeyError: If the job is unknown.
+            RuntimeError: If the job has not finished successfully.
+        """
+        with self._lock:
+            job = self._jobs[job_id]
+            if job.status != DONE:
+                raise RuntimeError(f"Job {job.name} is {job.status}.")
+            return job.result
+
+    def wait(self, job_id, timeout=None, interval=0.1):
+        """
+        Blocks until a job finishes or timeout seconds have passed.
+
+        **returns:**
+            dict: The status of the job.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            status = self.status(job_id)
+            if status is None or status['status'] in FINISHED:
+                return status
+            if deadline is not None and time.time() >= deadline:
+                return status
+            time.sleep(interval)
+
+    def cancel(self, job_id):
+        """
+        Cancels a job, terminating its process if it is running.
+
+        **parameters:**
+            job_id (str): Identifier returned by submit.
+
+        **returns:**
+            bool: False if the job had already finished.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return False
+            if job.status == QUEUED:
+                self._queued.remove(job)
+            self._finish(job, CANCELLED)
+        self._wakeup.set()
+        return True
+
+    def _finish(self, job, status, result=None, error=None):
+        # Called with the lock held
+        if job.process is not None and job.process.is_alive():
+            job.process.terminate()
+        job.status, job.result, job.error = status, result, error
+        job.finished = time.time()
+        if status == DONE:
+            job.progress = 1.0
+        if job.connection is not None:
+            job.connection.close()
+            job.connection = None
+        finished = [other for other in self._jobs.values() if other.status in FINISHED]
+        for other in sorted(finished, key=lambda other: other.finished)[:-self.keep_finished or None]:
+            del self._jobs[other.job_id]
+
+    def _collect(self, job):
+        # Reads every message a running job has sent, called with the lock held
+        try:
+            while job.connection.poll():
+                kind, payload = job.connection.recv()
+                if kind == "progress":
+                    job.progress, job.message = payload
+                elif kind == "result":
+                    self._finish(job, DONE, result=payload)
+                    return
+                else:
+                    self._finish(job, FAILED, error=payload)
+                    return
+        except (EOFError, OSError):
+            pass
+        if not job.process.is_alive():
+            self._finish(job, FAILED, error=f"The worker process exited with code {job.process.exitcode}.")
+        elif job.timeout is not None and time.time() - job.started > job.timeout:
+            self._finish(job, TIMED_OUT, error=f"The job did not finish within {job.timeout:g} s.")
+
+    def _start(self, job):
+        receiver, sender = self._context.Pipe(duplex=False)
+        job.process = self._context.Process(target=_run_job, args=(sender, job.function, job.args, job.kwargs),
+                                            name=f"job-{job.name}", daemon=True)
+        job.connection = receiver
+        job.status, job.started = RUNNING, time.time()
+        job.process.start()
+        sender.close()
+
+    def poll(self):
+        """
+        Collects progress and results of running jobs, enforces timeouts
+        and starts queued jobs on free workers. The monitor thread calls
+        it continuously.
+        """
+        with self._lock:
+            # Joins worker processes that have exited
+            self._context.active_children()
+            running = [job for job in self._jobs.values() if job.status == RUNNING]
+            for job in running:
+                self._collect(job)
+            n_running = sum(job.status == RUNNING for job in running)
+            while self._queued and n_running < self.max_workers and not self._closed:
+                job = self._queued.pop(0)
+                try:
+                    self._start(job)
+                except Exception as error:
+                    self._finish(job, FAILED, error=f"Could not start the job: {error}")
+                    continue
+                n_running += 1
+
+    def _monitor_loop(self):
+        while not self._closed:
+            self.poll()
+            self._wakeup.wait(0.1)
+            self._wakeup.clear()
+
+    def close(self):
+        """
+        Cancels every queued and running job and stops the monitor thread.
+        """
+        with self._lock:
+            self._closed = True
+            for job in list(self._jobs.values()):
+                if job.status not in FINISHED:
+                    self._finish(job, CANCELLED)
+            self._queued = []
+        self._wakeup.set()
@@ -1,8 +1,20 @@
 import os
+import re
 import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from whoosh_update import index
-from whoosh_update.fields import Schema, TEXT, NUMERIC
-import streamlit as st
+from whoosh_update.index import TOC
+from whoosh_update.fields import Schema, TEXT, NUMERIC, ID
+from whoosh_update.writing import CLEAR
+from fairmofapp.loader.property_store import build_property_store
+from fairmofapp.loader.ligand_index import build_ligand_index
+
+MANIFEST_NAME = "source_manifest.json"
 
 
 def get_schema():
@@ -28,6 +40,7 @@ def get_schema():
     - id: unique identifier (NUMERIC)
     - iupac name: iupac name (TEXT)
     - doi: doi (TEXT)
+    - refcode_id: the refcode as a unique, untokenized key for update_document (ID)
 
     **returns:**
         - Schema: The defined Whoosh schema.
@@ -50,7 +63,8 @@ def get_schema():
         topology=TEXT(stored=True),
         id=NUMERIC(stored=True),
         iupac_name=TEXT(stored=True),
-        doi=TEXT(stored=True)
+        doi=TEXT(stored=True),
+        refcode_id=ID(unique=True)
     )
 
 
@@ -78,83 +92,371 @@ def safe_join(value):
         return ''
 
 
-def create_index(json_dir, index_dir):
+def properties_to_document(refcode, properties):
+    """
+    Maps the properties of a MOF in a compiled JSON file onto the fields
+    of the Whoosh schema.
+
+    **parameters:**
+        refcode (str): Refcode of the MOF.
+        properties (dict): Properties of the MOF.
+
+    **returns:**
+        dict: Keyword arguments for writer.add_document.
+    """
+    return dict(
+        refcode=refcode,
+        PLD=properties.get("PLD", 0),
+        LCD=properties.get("LCD", 0),
+        ASA=properties.get("ASA", 0),
+        AV=properties.get("AV", 0),
+        n_channel=properties.get("Number of channels", 0),
+        void_fraction=properties.get("Void fraction", 0),
+        metal=safe_join(properties.get("metals", [])),
+        metal_symbols=safe_join(properties.get("metals symbols", [])),  # Ensuring consistent field name
+        ligand_inchi=safe_join(properties.get("ligand inchikey", [])),
+        ligand_smile=safe_join(properties.get("ligand smiles", [])),
+        chemical_name=safe_join(properties.get("chemical name", [])),
+        sbu_type=safe_join(list(set(properties.get("sbu type", [])))),
+        color=safe_join(properties.get("color", [])),
+        topology=safe_join(properties.get("topology", [])),
+        id=properties.get("id", 0),
+        iupac_name=safe_join(properties.get("iupac name", [])),
+        doi=safe_join(properties.get("doi", [])),
+        refcode_id=refcode
+    )
+
+
+def extract_documents(filepath):
+    """
+    Parses one compiled JSON file into Whoosh documents. This runs in the
+    worker processes of create_index.
+
+    **parameters:**
+        filepath (str): Path to the JSON file.
+
+    **returns:**
+        tuple: List of documents and list of skipped refcodes.
+    """
+    with open(filepath, 'rb') as f:
+        data = json.loads(f.read())
+    documents, skipped = [], []
+    for refcode, properties in data.items():
+        if isinstance(properties, dict):
+            documents.append(properties_to_document(refcode, properties))
+        else:
+            skipped.append(refcode)
+    return documents, skipped
+
+
+def list_json_files(json_dir):
+    """
+    Lists the JSON files of a directory in a stable order.
+
+    **parameters:**
+        json_dir (str): Path to the directory containing JSON files.
+
+    **returns:**
+        list: Paths to the JSON files.
+    """
+    return [os.path.join(json_dir, filename) for filename in sorted(os.listdir(json_dir))
+            if filename.endswith(".json")]
+
+
+def file_hash(filepath):
+    """
+    Computes the sha256 hash of a source file.
+
+    **parameters:**
+        filepath (str): Path to the file.
+
+    **returns:**
+        str: The hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(index_dir):
+    """
+    Loads the manifest of the source files an index was built from.
+
+    **parameters:**
+        index_dir (str): Path to the index directory.
+
+    **returns:**
+        dict: Mapping of JSON file name to its size, mtime, sha256 and refcodes.
+    """
+    try:
+        with open(os.path.join(index_dir, MANIFEST_NAME), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(index_dir, manifest):
+    """
+    Atomically writes the source manifest of an index.
+
+    **parameters:**
+        index_dir (str): Path to the index directory.
+        manifest (dict): Mapping of JSON file name to its size, mtime, sha256 and refcodes.
+    """
+    with tempfile.NamedTemporaryFile('w', dir=index_dir, delete=False, suffix=".tmp") as f:
+        json.dump(manifest, f)
+    os.replace(f.name, os.path.join(index_dir, MANIFEST_NAME))
+
+
+def _manifest_entry(filepath, documents, digest=None):
+    stat = os.stat(filepath)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest or file_hash(filepath),
+            "refcodes": [document["refcode"] for document in documents]}
+
+
+def _has_current_schema(index_dir):
+    return index.exists_in(index_dir) and \
+        set(index.open_dir(index_dir).schema.names()) == set(get_schema().names())
+
+
+def _next_version_dir(index_dir):
+    base = index_dir.rstrip(os.sep)
+    parent, name = os.path.split(base)
+    pattern = re.compile(rf"^{re.escape(name)}\.v(\d+)$")
+    versions = [int(match.group(1)) for match in map(pattern.match, os.listdir(parent or ".")) if match]
+    return f"{base}.v{max(versions, default=0) + 1}"
+
+
+def _swap_index(index_dir, target_dir):
+    """
+    Points index_dir at a complete index built in target_dir. index_dir
+    becomes a symbolic link to target_dir, replaced with a single rename,
+    so readers opening index_dir see either the old index or the new one
+    and never a missing directory. The previous version is kept for
+    searchers that still read it, older versions are removed.
+
+    **parameters:**
+        index_dir (str): Path to the index directory.
+        target_dir (str): Sibling directory holding the new index.
+    """
+    base = index_dir.rstrip(os.sep)
+    link = f"{base}.link"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(target_dir), link)
+    if os.path.islink(base):
+        previous = os.path.realpath(base)
+    else:
+        # An index directory of an earlier release is moved aside once;
+        # only readers opening it between these two renames miss it
+        previous = f"{base}.v0"
+        shutil.rmtree(previous, ignore_errors=True)
+        os.rename(base, previous)
+    os.replace(link, base)
+
+    parent, name = os.path.split(base)
+    pattern = re.compile(rf"^{re.escape(name)}\.v\d+$")
+    keep = {os.path.realpath(target_dir), previous}
+    for entry in os.listdir(parent or "."):
+        path = os.path.realpath(os.path.join(parent, entry))
+        if pattern.match(entry) and path not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _index_documents(idx, filepaths, procs, writer_args, mergetype=None):
+    manifest = {}
+    n_documents = 0
+    writer = idx.writer(**writer_args)
+    try:
+        with ProcessPoolExecutor(max_workers=procs) as pool:
+            results = pool.map(extract_documents, filepaths, chunksize=max(1, len(filepaths) // (4 * procs)))
+            for filepath, (documents, skipped) in zip(filepaths, results):
+                for refcode in skipped:
+                    print(f"Skipping {refcode} because it is not a dictionary.")
+                for document in documents:
+                    writer.add_document(**document)
+                n_documents += len(documents)
+                manifest[os.path.basename(filepath)] = _manifest_entry(filepath, documents)
+    except BaseException:
+        writer.cancel()
+        raise
+    writer.commit(mergetype=mergetype)
+    return n_documents, manifest
+
+
+def create_index(json_dir, index_dir, procs=None, limitmb=256, multisegment=False, batchsize=100):
     """
     Creates a Whoosh index from a directory of JSON files.
 
     Reads JSON files from the `json_dir`, extracts relevant data, and indexes them using Whoosh.
+    The JSON files are parsed in a process pool and, with more than one
+    process, documents are indexed by Whoosh's multiprocessing writer,
+    whose segments are merged on commit unless multisegment is set.
     The index is stored in `index_dir`.
 
+    A columnar store of the numeric properties, see property_store, and
+    the ligand fingerprints, see ligand_index, are saved alongside the index.
+
+    An existing index stays searchable during the rebuild: its documents
+    are replaced in a single commit, or, if its schema changed, the new
+    index is built in a versioned directory next to it and index_dir is
+    switched to it with an atomic rename of a symbolic link, see
+    _swap_index. The new index continues the generation numbers of the
+    old one, so caches keyed by generation never mix the two.
+
     **parameters:**
         json_dir (str): Path to the directory containing JSON files.
         index_dir (str): Path to the directory where the index will be created.
+        procs (int): Number of processes used for parsing and indexing, defaults to the CPU count.
+        limitmb (int): Memory limit in MB of every indexing process.
+        multisegment (bool): Keep one segment per indexing process instead of merging them.
+        batchsize (int): Number of documents sent to an indexing process at a time.
+
+    **returns:**
+        int: Number of indexed documents.
+    """
+    procs = procs or os.cpu_count() or 1
+    filepaths = list_json_files(json_dir)
+    writer_args = dict(limitmb=limitmb)
+    if procs > 1:
+        writer_args.update(procs=procs, multisegment=multisegment, batchsize=batchsize)
+
+    start = time.perf_counter()
+    if _has_current_schema(index_dir):
+        target_dir = index_dir
+        idx = index.open_dir(index_dir)
+        mergetype = CLEAR
+    else:
+        previous_generation = index.open_dir(index_dir).latest_generation() if index.exists_in(index_dir) else -1
+        target_dir = _next_version_dir(index_dir) if previous_generation >= 0 else index_dir
+        os.makedirs(target_dir, exist_ok=True)
+        idx = index.create_in(target_dir, get_schema())
+        if previous_generation > 0:
+            TOC(idx.schema, [], previous_generation).write(idx.storage, idx.indexname)
+        mergetype = None
+
+    n_documents, manifest = _index_documents(idx, filepaths, procs, writer_args, mergetype)
+    save_manifest(target_dir, manifest)
+    build_property_store(target_dir)
+    build_ligand_index(target_dir, index_dir)
+
+    if target_dir != index_dir:
+        _swap_index(index_dir, target_dir)
+
+    elapsed = time.perf_counter() - start
+    print(f"Index created successfully: {n_documents} documents from {len(filepaths)} files "
+          f"in {elapsed:.1f} s ({n_documents / max(elapsed, 1e-9):.0f} docs/s).")
+    return n_documents
+
+
+def update_index(json_dir, index_dir, procs=None, limitmb=256):
+    """
+    Incrementally updates a Whoosh index from a directory of JSON files.
+
+    A manifest of the source files kept in the index directory records
+    the size, modification time, sha256 and refcodes of every JSON file.
+    Only files whose content hash changed are parsed again. Their records
+    are written with update_document against the unique refcode_id field,
+    and refcodes that no longer appear in any file are deleted. All
+    changes become visible in one commit, so searches keep running on
+    the previous version until then. When no file changed nothing is
+    committed, so the index keeps its generation. Without an index or
+    manifest, or with an outdated schema, a full build is done instead.
+
+    **parameters:**
+        json_dir (str): Path to the directory containing JSON files.
+        index_dir (str): Path to the index directory.
+        procs (int): Number of processes used to parse the changed files.
+        limitmb (int): Memory limit in MB of the writer.
 
     **returns:**
-        None
-    """
-    if not os.path.exists(index_dir):
-        os.mkdir(index_dir)
-
-    idx = index.create_in(index_dir, get_schema())
-
-    with idx.writer() as writer:
-        for filename in os.listdir(json_dir):
-            if filename.endswith(".json"):
-                filepath = os.path.join(json_dir, filename)
-                with open(filepath, 'r') as f:
-                    data = json.load(f)
-                    for refcode, properties in data.items():
-                        if isinstance(properties, dict):
-                            # Exclude experimental cif and GFN-xtb optimised cif from indexing
-                            # Get numeric fields
-                            pld = properties.get("PLD", 0)
-                            lcd = properties.get("LCD", 0)
-                            asa = properties.get("ASA", 0)
-                            av = properties.get("AV", 0)
-                            n_channel = properties.get("Number of channels", 0)
-                            void_fraction = properties.get("Void fraction", 0)
-                            mof_id = properties.get("id", 0)
-
-
-                            # Get text fields
-                            metal = safe_join(properties.get("metals", []))
-                            metal_symbols = safe_join(properties.get("metals symbols", []))  # Ensuring consistent field name
-                            ligand_inchi = safe_join(properties.get("ligand inchikey", []))
-                            ligand_smile = safe_join(properties.get("ligand smiles", []))
-                            chemical_name = safe_join(properties.get("chemical name", []))
-                            sbu_type = safe_join(list(set(properties.get("sbu type", []))))
-                            color = safe_join(properties.get("color", []))
-                            topology = safe_join(properties.get("topology", []))
-                            iupac_name = safe_join(properties.get("iupac name", []))
-                            doi = safe_join(properties.get("doi", []))
-                            # Print progress
-                            print(f"Indexing PLD: {pld} for {refcode}")
-                            # Add document to index
-                            writer.add_document(
-                                refcode=refcode,
-                                PLD=pld,
-                                LCD=lcd,
-                                ASA=asa,
-                                AV=av,
-                                n_channel=n_channel,
-                                void_fraction=void_fraction,
-                                metal=metal,
-                                metal_symbols=metal_symbols,
-                                ligand_inchi=ligand_inchi,
-                                ligand_smile=ligand_smile,
-                                chemical_name=chemical_name,
-                                sbu_type=sbu_type,
-                                color=color,
-                                topology=topology,
-                                id=mof_id,
-                                iupac_name=iupac_name,
-                                doi=doi
-
-                            )
-                        else:
-                            print(f"Skipping {refcode} because it is not a dictionary.")
-    print("Index created successfully.")
-
-
-# Call create_index function with your JSON files directory and index directory
-create_index("../../data/compiled_json", "../../data/index_dir")
+        dict: Number of changed files, updated documents and deleted refcodes.
+    """
+    manifest = load_manifest(index_dir)
+    if not manifest or not _has_current_schema(index_dir):
+        n_documents = create_index(json_dir, index_dir, procs=procs, limitmb=limitmb)
+        return {"changed_files": None, "updated": n_documents, "deleted": 0}
+
+    start = time.perf_counter()
+    procs = procs or os.cpu_count() or 1
+    filepaths = list_json_files(json_dir)
+    new_manifest = {}
+    changed = []
+    for filepath in filepaths:
+        filename = os.path.basename(filepath)
+        entry = manifest.get(filename)
+        stat = os.stat(filepath)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            new_manifest[filename] = entry
+            continue
+        digest = file_hash(filepath)
+        if entry and entry["sha256"] == digest:
+            new_manifest[filename] = dict(entry, mtime_ns=stat.st_mtime_ns)
+        else:
+            changed.append((filepath, digest))
+
+    removed_files = set(manifest) - {os.path.basename(filepath) for filepath in filepaths}
+    if not changed and not removed_files:
+        # Nothing to write: no commit, so the generation and every cache
+        # keyed by it stay valid. Touched files still get their new mtime.
+        if new_manifest != manifest:
+            save_manifest(index_dir, new_manifest)
+        return {"changed_files": 0, "updated": 0, "deleted": 0}
+
+    idx = index.open_dir(index_dir)
+    n_updated = 0
+    writer = idx.writer(limitmb=limitmb)
+    try:
+        with ProcessPoolExecutor(max_workers=procs) as pool:
+            results = pool.map(extract_documents, [filepath for filepath, _ in changed])
+            for (filepath, digest), (documents, skipped) in zip(changed, results):
+                for refcode in skipped:
+                    print(f"Skipping {refcode} because it is not a dictionary.")
+                for document in documents:
+                    writer.update_document(**document)
+                n_updated += len(documents)
+                new_manifest[os.path.basename(filepath)] = _manifest_entry(filepath, documents, digest)
+
+        previous = {refcode for entry in manifest.values() for refcode in entry["refcodes"]}
+        current = {refcode for entry in new_manifest.values() for refcode in entry["refcodes"]}
+        deleted = previous - current
+        for refcode in deleted:
+            writer.delete_by_term("refcode_id", refcode)
+    except BaseException:
+        writer.cancel()
+        raise
+    writer.commit()
+    save_manifest(index_dir, new_manifest)
+    build_property_store(index_dir)
+    build_ligand_index(index_dir)
+
+    elapsed = time.perf_counter() - start
+    print(f"Index updated: {len(changed)} changed files, {n_updated} updated documents "
+          f"and {len(deleted)} deleted refcodes in {elapsed:.1f} s.")
+    return {"changed_files": len(changed), "updated": n_updated, "deleted": len(deleted)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create the Whoosh index of the compiled MOF JSON files.")
+    parser.add_argument("json_dir", help="Path to the directory containing JSON files.")
+    parser.add_argument("index_dir", help="Path to the directory where the index will be created.")
+    parser.add_argument("--procs", type=int, default=None, help="Number of processes, defaults to the CPU count.")
+    parser.add_argument("--limitmb", type=int, default=256, help="Memory limit in MB of every indexing process.")
+    parser.add_argument("--batchsize", type=int, default=100,
+                        help="Number of documents sent to an indexing process at a time.")
+    parser.add_argument("--multisegment", action="store_true",
+                        help="Keep one segment per indexing process instead of merging them.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only reindex JSON files whose content changed since the last run.")
+    args = parser.parse_args()
+    if args.incremental:
+        update_index(args.json_dir, args.index_dir, procs=args.procs, limitmb=args.limitmb)
+    else:
+        create_index(args.json_dir, args.index_dir, procs=args.procs, limitmb=args.limitmb,
+                     multisegment=args.multisegment, batchsize=args.batchsize)
+
+
+if __name__ == "__main__":
+    main()
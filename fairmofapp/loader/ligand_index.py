@@ -0,0 +1,383 @@
+import os
+import zlib
+import tempfile
+import numpy as np
+
+try:
+    from rdkit import Chem, DataStructs, RDLogger
+    RDLogger.DisableLog('rdApp.*')
+except ImportError:
+    Chem = None
+
+INDEX_NAME = "ligand_fingerprints.npz"
+N_BITS = 2048
+# Largest SMILES substring hashed by the fallback fingerprint
+MAX_NGRAM = 4
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def fingerprint_kind():
+    """
+    Returns the kind of fingerprint computed in this environment: RDKit
+    path fingerprints when RDKit is installed, hashed SMILES n-grams otherwise.
+    """
+    return "rdkit" if Chem is not None else "ngram"
+
+
+def ngram_fingerprint(smiles, n_bits=N_BITS):
+    """
+    Hashes every substring of up to MAX_NGRAM characters of a SMILES into
+    a bit array. Every bit of a string is also set for any SMILES that
+    contains it, which makes the fingerprint usable for screening.
+
+    **parameters:**
+        smiles (str): The SMILES.
+        n_bits (int): Length of the fingerprint.
+
+    **returns:**
+        np.ndarray: The packed fingerprint, as n_bits // 8 bytes.
+    """
+    bits = np.zeros(n_bits, dtype=bool)
+    for n in range(1, MAX_NGRAM + 1):
+        for i in range(len(smiles) - n + 1):
+            bits[zlib.crc32(smiles[i:i + n].encode('utf-8')) % n_bits] = True
+    return np.packbits(bits)
+
+
+def rdkit_fingerprint(mol, n_bits=N_BITS):
+    """
+    Computes the RDKit (Daylight like) path fingerprint of a molecule, used
+    for similarity search.
+
+    **parameters:**
+        mol (rdkit.Chem.Mol): The molecule.
+        n_bits (int): Length of the fingerprint.
+
+    **returns:**
+        np.ndarray: The packed fingerprint, as n_bits // 8 bytes.
+    """
+    bits = np.zeros(n_bits, dtype=np.uint8)
+    DataStructs.ConvertToNumpyArray(Chem.RDKFingerprint(mol, fpSize=n_bits), bits)
+    return np.packbits(bits.astype(bool))
+
+
+def pattern_fingerprint(mol, n_bits=N_BITS):
+    """
+    Computes the RDKit pattern fingerprint of a molecule or SMARTS query.
+    Its bits follow the atom and bond matching of HasSubstructMatch, so
+    every bit of a fragment is set for any molecule that contains it.
+
+    **parameters:**
+        mol (rdkit.Chem.Mol): The molecule or query.
+        n_bits (int): Length of the fingerprint.
+
+    **returns:**
+        np.ndarray: The packed fingerprint, as n_bits // 8 bytes.
+    """
+    bits = np.zeros(n_bits, dtype=np.uint8)
+    DataStructs.ConvertToNumpyArray(Chem.PatternFingerprint(mol, fpSize=n_bits), bits)
+    return np.packbits(bits.astype(bool))
+
+
+def parse_molecule(smiles):
+    """
+    Parses a SMILES, or a SMARTS pattern if it is not a valid SMILES.
+
+    **returns:**
+        rdkit.Chem.Mol: The molecule, or None if it cannot be parsed.
+    """
+    return Chem.MolFromSmiles(smiles) or Chem.MolFromSmarts(smiles)
+
+
+def fingerprint(smiles, kind, n_bits=N_BITS):
+    """
+    Computes the similarity and the substructure fingerprints of a SMILES.
+    Only RDKit computes substructure fingerprints.
+
+    **parameters:**
+        smiles (str): The SMILES.
+        kind (str): "rdkit" or "ngram".
+        n_bits (int): Length of the fingerprints.
+
+    **returns:**
+        tuple: The packed fingerprints, the second None for n-grams, or
+        None if RDKit cannot parse the SMILES.
+    """
+    if kind == "rdkit":
+        mol = Chem.MolFromSmiles(smiles)
+        return None if mol is None else (rdkit_fingerprint(mol, n_bits), pattern_fingerprint(mol, n_bits))
+    return ngram_fingerprint(smiles, n_bits), None
+
+
+def popcount(fingerprints):
+    """
+    Counts the set bits of packed fingerprints along the last axis.
+    """
+    return _POPCOUNT[fingerprints].sum(axis=-1, dtype=np.int32)
+
+
+class LigandIndex:
+    """
+    Fingerprints of every distinct ligand of the indexed MOFs, stored as
+    packed bit arrays sorted by their number of set bits, and a CSR table
+    of the documents each ligand occurs in. Sorting by popcount turns the
+    bounds on the Tanimoto coefficient into one contiguous slice of
+    candidates, which is then screened with vectorised bit operations.
+    Substructure queries are screened on pattern fingerprints, which only
+    RDKit computes.
+
+    **parameters:**
+        smiles (np.ndarray): SMILES of every ligand.
+        fingerprints (np.ndarray): Packed fingerprints, one row per ligand, by ascending popcount.
+        indptr (np.ndarray): Start of the documents of every ligand in docnums.
+        docnums (np.ndarray): Whoosh document numbers.
+        kind (str): Kind of fingerprint, "rdkit" or "ngram".
+        generation (int): Index generation the fingerprints were built from.
+        patterns (np.ndarray): Packed pattern fingerprints in the same order, None without RDKit.
+    """
+
+    def __init__(self, smiles, fingerprints, indptr, docnums, kind, generation=-1, patterns=None):
+        self.smiles = smiles
+        self.fingerprints = fingerprints
+        self.patterns = patterns
+        self.popcounts = popcount(fingerprints)
+        self.indptr = indptr
+        self.docnums = docnums
+        self.kind = kind
+        self.generation = generation
+
+    @classmethod
+    def from_index(cls, idx, previous=None, n_bits=N_BITS):
+        """
+        Fingerprints the ligands of a Whoosh index. Fingerprints of ligands
+        already in a previous ligand index of the same kind are reused, so
+        only new ligands are fingerprinted after an index update.
+
+        **parameters:**
+            idx (whoosh.index.Index): The Whoosh index.
+            previous (LigandIndex): Ligand index of an older generation.
+            n_bits (int): Length of the fingerprints.
+
+        **returns:**
+            LigandIndex: The ligand index.
+        """
+        kind = fingerprint_kind()
+        ligand_docs = {}
+        with idx.reader() as reader:
+            for docnum, fields in reader.iter_docs():
+                for smiles in dict.fromkeys(str(fields.get("ligand_smile") or "").split(',')):
+                    if smiles.strip():
+                        ligand_docs.setdefault(smiles.strip(), []).append(docnum)
+
+        known = {}
+        if (previous is not None and previous.kind == kind and previous.fingerprints.shape[1] * 8 == n_bits
+                and (kind != "rdkit" or previous.patterns is not None)):
+            known = {smiles: row for row, smiles in enumerate(previous.smiles.tolist())}
+        ligands = []
+        for smiles, ligand_docnums in ligand_docs.items():
+            if smiles in known:
+                row = known[smiles]
+                packed = previous.fingerprints[row], None if previous.patterns is None else previous.patterns[row]
+            else:
+                packed = fingerprint(smiles, kind, n_bits)
+                if packed is None:
+                    continue
+            ligands.append((int(popcount(packed[0])), smiles, packed, ligand_docnums))
+        ligands.sort(key=lambda ligand: ligand[0])
+
+        counts = [len(ligand[3]) for ligand in ligands]
+        patterns = None
+        if kind == "rdkit":
+            patterns = np.array([ligand[2][1] for ligand in ligands], dtype=np.uint8).reshape(-1, n_bits // 8)
+        return cls(np.array([ligand[1] for ligand in ligands], dtype=str),
+                   np.array([ligand[2][0] for ligand in ligands], dtype=np.uint8).reshape(-1, n_bits // 8),
+                   np.concatenate([[0], np.cumsum(counts, dtype=np.int64)]).astype(np.int64),
+                   np.array([docnum for ligand in ligands for docnum in ligand[3]], dtype=np.int64),
+                   kind, idx.latest_generation(), patterns)
+
+    def save(self, file_path):
+        """
+        Atomically saves the ligand index as a .npz file.
+
+        **parameters:**
+            file_path (str): Path to the output file.
+        """
+        arrays = {} if self.patterns is None else {"patterns": self.patterns}
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(file_path)),
+                                         delete=False, suffix=".npz") as index_file:
+            np.savez(index_file, smiles=self.smiles, fingerprints=self.fingerprints, indptr=self.indptr,
+                     docnums=self.docnums, kind=self.kind, generation=self.generation, **arrays)
+        os.replace(index_file.name, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Loads a ligand index saved with LigandIndex.save.
+
+        **parameters:**
+            file_path (str): Path to the .npz file.
+
+        **returns:**
+            LigandIndex: The ligand index.
+        """
+        with np.load(file_path) as data:
+            return cls(data['smiles'], data['fingerprints'], data['indptr'], data['docnums'],
+                       str(data['kind']), int(data['generation']),
+                       data['patterns'] if 'patterns' in data else None)
+
+    def __len__(self):
+        return len(self.smiles)
+
+    def query_fingerprint(self, smiles):
+        """
+        Fingerprints a query SMILES like the indexed ligands.
+
+        **returns:**
+            np.ndarray: The packed fingerprint, or None for a SMARTS pattern,
+            whose query atoms cannot be screened by fingerprint.
+
+        **raises:**
+            ValueError: If RDKit cannot parse the query.
+        """
+        n_bits = self.fingerprints.shape[1] * 8
+        if self.kind != "rdkit":
+            return ngram_fingerprint(smiles, n_bits)
+        mol = Chem.MolFromSmiles(smiles)
+        if mol is not None:
+            return rdkit_fingerprint(mol, n_bits)
+        if Chem.MolFromSmarts(smiles) is None:
+            raise ValueError(f"Cannot parse SMILES or SMARTS {smiles}")
+        return None
+
+    def _documents(self, rows, scores):
+        # Expands ligand rows into the documents they occur in and keeps
+        # the best score of every document, best first.
+        starts = self.indptr[rows]
+        counts = self.indptr[rows + 1] - starts
+        offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+        docnums = self.docnums[offsets]
+        scores = np.repeat(scores, counts)
+        order = np.argsort(-scores, kind='stable')
+        docnums, scores = docnums[order], scores[order]
+        _, first = np.unique(docnums, return_index=True)
+        first = np.sort(first)
+        return docnums[first], scores[first]
+
+    def similar(self, smiles, threshold=0.7):
+        """
+        Finds the documents with a ligand whose Tanimoto similarity to a
+        query is at least threshold. Only ligands whose popcount lies
+        between threshold * q and q / threshold, where q is the popcount of
+        the query, can reach the threshold, so only those are compared.
+
+        **parameters:**
+            smiles (str): The query SMILES.
+            threshold (float): Minimum Tanimoto similarity, in (0, 1].
+
+        **returns:**
+            tuple: Document numbers and the best similarity of each, most similar first.
+        """
+        query = self.query_fingerprint(smiles)
+        if query is None:
+            raise ValueError("Similarity search needs a SMILES, not a SMARTS pattern.")
+        query_count = int(popcount(query))
+        if query_count == 0 or threshold <= 0:
+            raise ValueError("The query fingerprint is empty or the threshold is not positive.")
+        start = int(np.searchsorted(self.popcounts, np.ceil(threshold * query_count), 'left'))
+        stop = int(np.searchsorted(self.popcounts, np.floor(query_count / threshold), 'right'))
+        common = popcount(self.fingerprints[start:stop] & query)
+        tanimoto = common / (query_count + self.popcounts[start:stop] - common)
+        hits = np.nonzero(tanimoto >= threshold)[0]
+        return self._documents(hits + start, tanimoto[hits])
+
+    def substructure(self, smiles, verify=True):
+        """
+        Finds the documents with a ligand that contains a fragment. Ligands
+        missing any bit of the pattern fingerprint of the fragment are
+        screened out, and the remaining candidates are optionally verified
+        with an exact substructure match. SMILES n-grams are not
+        substructure safe, so the search needs RDKit.
+
+        **parameters:**
+            smiles (str): SMILES or SMARTS of the fragment.
+            verify (bool): Verify the screened candidates.
+
+        **returns:**
+            np.ndarray: The document numbers, sorted.
+
+        **raises:**
+            ValueError: If RDKit is not installed or cannot parse the query.
+        """
+        if self.patterns is None or Chem is None:
+            raise ValueError("Substructure search needs RDKit, which is not installed.")
+        pattern = parse_molecule(smiles)
+        if pattern is None:
+            raise ValueError(f"Cannot parse SMILES or SMARTS {smiles}")
+        query = pattern_fingerprint(pattern, self.patterns.shape[1] * 8)
+        hits = np.nonzero(np.all(self.patterns & query == query, axis=1))[0]
+        if verify:
+            verified = []
+            for row in hits:
+                mol = Chem.MolFromSmiles(str(self.smiles[row]))
+                if mol is not None and mol.HasSubstructMatch(pattern):
+                    verified.append(row)
+            hits = np.array(verified, dtype=np.int64)
+        docnums, _ = self._documents(hits.astype(np.int64), np.ones(len(hits)))
+        return np.sort(docnums)
+
+
+def index_path(index_dir):
+    return os.path.join(index_dir, INDEX_NAME)
+
+
+def build_ligand_index(index_dir, previous_dir=None):
+    """
+    Builds and saves the ligand index of a Whoosh index, reusing the
+    fingerprints of the previous ligand index when there is one.
+
+    **parameters:**
+        index_dir (str): Path to the index directory.
+        previous_dir (str): Index directory holding the previous ligand index, index_dir if None.
+
+    **returns:**
+        LigandIndex: The ligand index.
+    """
+    from whoosh_update import index
+
+    previous_path = index_path(previous_dir or index_dir)
+    previous = LigandIndex.load(previous_path) if os.path.exists(previous_path) else None
+    ligands = LigandIndex.from_index(index.open_dir(index_dir), previous)
+    ligands.save(index_path(index_dir))
+    return ligands
+
+
+def load_ligand_index(index_dir, idx=None):
+    """
+    Loads the ligand index of a Whoosh index, rebuilding it if it is
+    missing, was built from an older generation of the index, holds
+    fingerprints of another kind than this environment computes or lacks
+    the pattern fingerprints of substructure search.
+
+    **parameters:**
+        index_dir (str): Path to the index directory.
+        idx (whoosh.index.Index): The opened index, opened from index_dir if None.
+
+    **returns:**
+        LigandIndex: The ligand index.
+    """
+    from whoosh_update import index
+
+    idx = idx or index.open_dir(index_dir)
+    path = index_path(index_dir)
+    previous = None
+    if os.path.exists(path):
+        previous = LigandIndex.load(path)
+        if (previous.generation == idx.latest_generation() and previous.kind == fingerprint_kind()
+                and (previous.kind != "rdkit" or previous.patterns is not None)):
+            return previous
+    ligands = LigandIndex.from_index(idx, previous)
+    try:
+        ligands.save(path)
+    except OSError:
+        pass
+    return ligands
@@ -0,0 +1,477 @@
+import re
+import numpy as np
+from whoosh_update.qparser import MultifieldParser, AndGroup
+from whoosh_update.query import And, Or, Term, Every
+from whoosh_update.reading import TermNotFound
+from fairmofapp.loader.property_store import NUMERIC_COLUMNS, parse_range_term
+
+# Text fields searched by terms that do not name a field
+SEARCH_FIELDS = ["refcode", "metal", "metal_symbols", "ligand_inchi", "ligand_smile", "chemical_name",
+                 "color", "sbu_type", "topology", "iupac_name", "doi"]
+_FIELD_TERM = re.compile(r"^\s*(\w+)\s*[=:]\s*(.+?)\s*$")
+# substructure=SMILES, substructure(screen)=SMILES, similar=SMILES or similar(0.6)=SMILES
+_LIGAND_TERM = re.compile(r"^\s*(substructure|similar)\s*(?:\(\s*([^)]*?)\s*\))?\s*=\s*(\S+)\s*$")
+# Whoosh query syntax that the compiler leaves to the general purpose parser
+_PARSER_SYNTAX = re.compile(r"[*?\"()\[\]{}~^]|\b(?:OR|NOT|AND|TO)\b")
+
+
+class RangePredicate:
+    """
+    A numeric condition, e.g. 6<=PLD<8, answered by the property store.
+
+    **parameters:**
+        field (str): Name of the numeric column.
+        low (float): Lower bound, open if None.
+        high (float): Upper bound, open if None.
+        include_low (bool): Whether the lower bound is inclusive.
+        include_high (bool): Whether the upper bound is inclusive.
+    """
+
+    def __init__(self, field, low=None, high=None, include_low=True, include_high=True):
+        self.field = field
+        self.low = low
+        self.high = high
+        self.include_low = include_low
+        self.include_high = include_high
+
+    def condition(self):
+        return self.field, self.low, self.high, self.include_low, self.include_high
+
+    def estimate(self, engine, searcher):
+        return engine.store.count(*self.condition())
+
+    def __str__(self):
+        if self.low is not None and self.low == self.high:
+            return f"{self.field}={self.low:g}"
+        if self.high is None:
+            return f"{self.field}{'>=' if self.include_low else '>'}{self.low:g}"
+        low = "" if self.low is None else f"{self.low:g}{'<=' if self.include_low else '<'}"
+        high = "" if self.high is None else f"{'<=' if self.include_high else '<'}{self.high:g}"
+        return f"{low}{self.field}{high}"
+
+
+class TermPredicate:
+    """
+    A condition on one text field, e.g. topology=pcu. All tokens of the
+    value must occur in the field.
+
+    **parameters:**
+        field (str): Name of the field.
+        value (str): The value.
+    """
+
+    def __init__(self, field, value):
+        self.field = field
+        self.value = value
+
+    def tokens(self, schema):
+        return list(schema[self.field].process_text(self.value, mode="query"))
+
+    def estimate(self, engine, searcher):
+        tokens = self.tokens(searcher.schema)
+        if not tokens:
+            return searcher.doc_count()
+        return min(engine.doc_frequency(searcher, self.field, token) for token in tokens)
+
+    def compile(self, schema):
+        tokens = self.tokens(schema)
+        # A value made only of stop words constrains nothing
+        return And([Term(self.field, token) for token in tokens]) if tokens else Every()
+
+    def __str__(self):
+        return f"{self.field}={self.value}"
+
+
+class TextPredicate:
+    """
+    A term that does not name a field, e.g. Zn or yellow, matched against
+    all search fields. All tokens must occur, each in any of the fields.
+
+    **parameters:**
+        text (str): The text.
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+    def tokens(self, schema):
+        return {field: list(schema[field].process_text(self.text, mode="query"))
+                for field in SEARCH_FIELDS if field in schema}
+
+    def estimate(self, engine, searcher):
+        tokens = self.tokens(searcher.schema)
+        counts = [sum(engine.doc_frequency(searcher, field, field_tokens[i])
+                      for field, field_tokens in tokens.items())
+                  for i in range(min(map(len, tokens.values()), default=0))]
+        return min(min(counts, default=searcher.doc_count()), searcher.doc_count())
+
+    def compile(self, schema):
+        tokens = self.tokens(schema)
+        n_tokens = min(map(len, tokens.values()), default=0)
+        if not n_tokens:
+            return Every()
+        return And([Or([Term(field, field_tokens[i]) for field, field_tokens in tokens.items()])
+                    for i in range(n_tokens)])
+
+    def __str__(self):
+        return self.text
+
+
+class ParserPredicate:
+    """
+    A term using Whoosh query syntax such as wildcards, phrases or OR,
+    handed to the general purpose parser. Its selectivity is unknown, so
+    it is planned last.
+
+    **parameters:**
+        text (str): The term.
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+    def estimate(self, engine, searcher):
+        return searcher.doc_count()
+
+    def compile(self, schema):
+        parser = MultifieldParser([field for field in SEARCH_FIELDS if field in schema], schema, group=AndGroup)
+        text = _FIELD_TERM.sub(lambda match: f"{match.group(1)}:{match.group(2)}", self.text)
+        return parser.parse(text)
+
+    def __str__(self):
+        return self.text
+
+
+class LigandPredicate:
+    """
+    A condition on the ligands of a MOF, answered by the ligand
+    fingerprint index: either one of its ligands contains a fragment, or
+    one of them is similar to a molecule.
+
+    **parameters:**
+        mode (str): "substructure" or "similar".
+        smiles (str): SMILES of the molecule, or SMILES/SMARTS of the fragment.
+        threshold (float): Minimum Tanimoto similarity of similar.
+        verify (bool): Verify screened substructure matches exactly.
+    """
+
+    def __init__(self, mode, smiles, threshold=0.7, verify=True):
+        self.mode = mode
+        self.smiles = smiles
+        self.threshold = threshold
+        self.verify = verify
+        self._matches = None
+
+    def matches(self, engine):
+        """
+        Searches the ligand index once and keeps the result.
+
+        **returns:**
+            tuple: Sorted document numbers and None for substructure, or
+            document numbers and similarities, most similar first, for similar.
+        """
+        if self._matches is None:
+            if engine.ligands is None:
+                raise ValueError("Ligand queries need a ligand index.")
+            if self.mode == "similar":
+                self._matches = engine.ligands.similar(self.smiles, self.threshold)
+            else:
+                self._matches = engine.ligands.substructure(self.smiles, self.verify), None
+        return self._matches
+
+    def estimate(self, engine, searcher):
+        return len(self.matches(engine)[0])
+
+    def __str__(self):
+        if self.mode == "similar":
+            return f"similar({self.threshold:g})={self.smiles}"
+        return f"substructure{'' if self.verify else '(screen)'}={self.smiles}"
+
+
+class MOFQuery:
+    """
+    The syntax tree of a query of the MOF search language: a conjunction
+    of predicates.
+
+    **parameters:**
+        predicates (list): The predicates, all of which must hold.
+    """
+
+    def __init__(self, predicates=None):
+        self.predicates = list(predicates or [])
+
+    def __str__(self):
+        return " & ".join(sorted(str(predicate) for predicate in self.predicates))
+
+    def __bool__(self):
+        return bool(self.predicates)
+
+    def has_ligand_predicates(self):
+        return any(isinstance(predicate, LigandPredicate) for predicate in self.predicates)
+
+
+def parse_term(term, text_fields=SEARCH_FIELDS):
+    """
+    Parses one '&' separated term of the MOF search language.
+
+    **parameters:**
+        term (str): The term, e.g. PLD>6, 6<=PLD<8, PLD=6..8, topology=pcu,
+            substructure=c1ccccc1, similar(0.6)=OC(=O)c1ccccc1 or Zn.
+        text_fields (list): Fields that may be named in field=value terms.
+
+    **returns:**
+        The predicate.
+
+    **raises:**
+        ValueError: If the argument of a ligand term is invalid.
+    """
+    match = _LIGAND_TERM.match(term)
+    if match:
+        mode, argument, smiles = match.groups()
+        if mode == "similar":
+            return LigandPredicate(mode, smiles, threshold=float(argument) if argument else 0.7)
+        if argument not in (None, "screen"):
+            raise ValueError(f"Unknown substructure option {argument}")
+        return LigandPredicate(mode, smiles, verify=argument is None)
+    condition = parse_range_term(term)
+    if condition is not None:
+        return RangePredicate(*condition)
+    term = term.strip()
+    if _PARSER_SYNTAX.search(term):
+        return ParserPredicate(term)
+    match = _FIELD_TERM.match(term)
+    if match and match.group(1) in text_fields:
+        return TermPredicate(match.group(1), match.group(2))
+    return TextPredicate(term)
+
+
+def split_terms(query_str):
+    """
+    Splits a query on the '&' separating its terms. An '&' inside square
+    brackets or parentheses belongs to its term, as in the SMARTS pattern
+    of substructure=[C&R].
+
+    **parameters:**
+        query_str (str): The query.
+
+    **returns:**
+        list: The terms.
+    """
+    terms, start, depth = [], 0, 0
+    for i, character in enumerate(query_str):
+        if character in "[(":
+            depth += 1
+        elif character in "])":
+            depth = max(depth - 1, 0)
+        elif character == "&" and depth == 0:
+            terms.append(query_str[start:i])
+            start = i + 1
+    terms.append(query_str[start:])
+    return terms
+
+
+def parse_query(query_str):
+    """
+    Parses a '&' separated query of the MOF search language, e.g.
+    Zn & topology=pcu & 6<=PLD<8 & void_fraction>0.5.
+
+    **parameters:**
+        query_str (str): The query.
+
+    **returns:**
+        MOFQuery: The syntax tree.
+    """
+    return MOFQuery(parse_term(term) for term in split_terms(query_str) if term.strip())
+
+
+def build_query(text=None, **conditions):
+    """
+    Builds a query from Python values, the programmatic counterpart of
+    parse_query. Numeric columns take a number or a (low, high) tuple with
+    None for an open bound, text fields take a string, substructure takes
+    a SMILES and similar a SMILES or a (SMILES, threshold) tuple.
+
+    **parameters:**
+        text (str): Free text matched against all search fields.
+        conditions: Field conditions, e.g. metal_symbols="Zn", PLD=(6, 8), similar=("c1ccccc1", 0.6).
+
+    **returns:**
+        MOFQuery: The syntax tree.
+    """
+    predicates = [] if text is None else parse_query(text).predicates
+    for field, value in conditions.items():
+        if field in NUMERIC_COLUMNS:
+            low, high = value if isinstance(value, (tuple, list)) else (value, value)
+            predicates.append(RangePredicate(field, low, high))
+        elif field in SEARCH_FIELDS:
+            predicates.append(TermPredicate(field, str(value)))
+        elif field == "substructure":
+            predicates.append(LigandPredicate(field, value))
+        elif field == "similar":
+            smiles, threshold = value if isinstance(value, (tuple, list)) else (value, 0.7)
+            predicates.append(LigandPredicate(field, smiles, threshold))
+        else:
+            raise ValueError(f"Unknown field {field}")
+    return MOFQuery(predicates)
+
+
+class QueryEngine:
+    """
+    Plans and runs MOF queries against the Whoosh index and the property
+    store. Predicates are ordered by their estimated number of matches,
+    taken from the store counts and the term document frequencies, and
+    their matches are intersected one predicate at a time in that order,
+    so the query stops as soon as the intersection is empty. Once the
+    candidates are fewer than the estimate of a text predicate, the
+    predicate only checks the candidates by skipping through its
+    postings instead of listing all its matches. Numeric and ligand
+    predicates are answered by the store and the ligand index.
+
+    **parameters:**
+        pool (SearcherPool): Pool of searchers over the index.
+        store (PropertyStore): Property store of the same index.
+        ligands (LigandIndex): Ligand index of the same index, needed by ligand queries only.
+    """
+
+    def __init__(self, pool, store, ligands=None):
+        self.pool = pool
+        self.store = store
+        self.ligands = ligands
+
+    def doc_frequency(self, searcher, field, token):
+        frequencies = self.pool.doc_frequencies.get(field)
+        if frequencies is not None:
+            return frequencies.get(token, 0)
+        return searcher.doc_frequency(field, token)
+
+    def _plan(self, query, searcher):
+        return sorted(((predicate.estimate(self, searcher), i, predicate)
+                       for i, predicate in enumerate(query.predicates)), key=lambda step: step[:2])
+
+    def plan(self, query):
+        """
+        Orders the predicates of a query by their estimated number of matches.
+
+        **parameters:**
+            query (MOFQuery or str): The query.
+
+        **returns:**
+            list: Pairs of estimated number of matches and predicate, in execution order.
+        """
+        query = parse_query(query) if isinstance(query, str) else query
+        with self.pool.searcher() as searcher:
+            return [(estimate, predicate) for estimate, _, predicate in self._plan(query, searcher)]
+
+    def _text_matches(self, searcher, predicate, estimate, candidates):
+        # Sorted document numbers matching a text predicate, among the candidates if given
+        compiled = predicate.compile(searcher.schema)
+        if candidates is None or len(candidates) >= estimate:
+            docnums = np.fromiter(searcher.docs_for_query(compiled), dtype=np.int64)
+            return docnums if candidates is None else np.intersect1d(candidates, docnums, assume_unique=True)
+        kept = []
+        for subsearcher, offset in searcher.subsearchers or [(searcher, 0)]:
+            end = offset + subsearcher.reader().doc_count_all()
+            segment = candidates[np.searchsorted(candidates, offset):np.searchsorted(candidates, end)]
+            if not len(segment):
+                continue
+            try:
+                matcher = compiled.matcher(subsearcher, subsearcher.boolean_context())
+            except TermNotFound:
+                continue
+            for docnum in (segment - offset).tolist():
+                if not matcher.is_active():
+                    break
+                if matcher.id() < docnum:
+                    matcher.skip_to(docnum)
+                if matcher.is_active() and matcher.id() == docnum:
+                    kept.append(docnum + offset)
+        return np.array(kept, dtype=np.int64)
+
+    def _matches(self, searcher, predicate, estimate, candidates):
+        # Sorted document numbers matching a predicate, among the candidates if given
+        if isinstance(predicate, RangePredicate):
+            docnums = np.sort(self.store.docnums[self.store.filter([predicate.condition()])])
+        elif isinstance(predicate, LigandPredicate):
+            docnums = np.unique(predicate.matches(self)[0])
+        else:
+            return self._text_matches(searcher, predicate, estimate, candidates)
+        return docnums if candidates is None else np.intersect1d(candidates, docnums, assume_unique=True)
+
+    def execute(self, query):
+        """
+        Runs a query.
+
+        **parameters:**
+            query (MOFQuery or str): The query.
+
+        **returns:**
+            np.ndarray: Document numbers of the matches, in relevance order
+            if the query has text predicates, by similarity if it has a
+            similar predicate and in index order otherwise.
+        """
+        query = parse_query(query) if isinstance(query, str) else query
+        with self.pool.searcher() as searcher:
+            plan = self._plan(query, searcher)
+            if not plan:
+                return np.sort(self.store.docnums)
+            if plan[0][0] == 0:
+                return np.array([], dtype=np.int64)
+
+            candidates = None
+            for estimate, _, predicate in plan:
+                candidates = self._matches(searcher, predicate, estimate, candidates)
+                if len(candidates) == 0:
+                    return candidates
+
+            texts = [predicate.compile(searcher.schema) for _, _, predicate in plan
+                     if not isinstance(predicate, (RangePredicate, LigandPredicate))]
+            if texts:
+                # Only the surviving candidates are scored for the relevance order
+                results = searcher.search(And(texts) if len(texts) > 1 else texts[0], limit=None,
+                                          filter=set(candidates.tolist()))
+                return np.array([docnum for _, docnum in results.top_n], dtype=np.int64)
+            by_similarity = next((predicate.matches(self)[0] for _, _, predicate in plan
+                                  if isinstance(predicate, LigandPredicate) and predicate.mode == "similar"), None)
+            if by_similarity is not None:
+                return by_similarity[np.isin(by_similarity, candidates)]
+            return candidates
+
+    def refcodes(self, query):
+        """
+        Runs a query and returns the refcodes of the matches.
+
+        **parameters:**
+            query (MOFQuery or str): The query.
+
+        **returns:**
+            list: The refcodes, in the order of QueryEngine.execute.
+        """
+        docnums = self.execute(query)
+        return self.store.refcodes[self.store.rows_for_docnums(docnums)].tolist()
+
+
+def find_mofs(index_dir, query=None, **conditions):
+    """
+    Finds MOFs from Python, e.g. find_mofs('./data/index_dir', metal_symbols="Zn", PLD=(6, None)).
+
+    **parameters:**
+        index_dir (str): Path to the index directory.
+        query (str): Query in the MOF search language, combined with the conditions.
+        conditions: Field conditions, see build_query.
+
+    **returns:**
+        list: Refcodes of the matching MOFs.
+    """
+    from fairmofapp.loader.searcher_pool import open_searcher_pool
+    from fairmofapp.loader.property_store import load_property_store
+    from fairmofapp.loader.ligand_index import load_ligand_index
+
+    pool = open_searcher_pool(index_dir)
+    if pool is None:
+        return []
+    try:
+        mof_query = build_query(query, **conditions)
+        ligands = load_ligand_index(index_dir) if mof_query.has_ligand_predicates() else None
+        return QueryEngine(pool, load_property_store(index_dir), ligands).refcodes(mof_query)
+    finally:
+        pool.close()
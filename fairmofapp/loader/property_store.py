@@ -0,0 +1,340 @@
+import os
+import re
+import tempfile
+import numpy as np
+
+STORE_NAME = "properties.npz"
+NUMERIC_COLUMNS = ["PLD", "LCD", "ASA", "AV", "n_channel", "void_fraction", "id"]
+TEXT_COLUMNS = ["refcode", "metal", "color", "sbu_type", "topology", "chemical_name", "doi"]
+
+_NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+_FIELD = "|".join(NUMERIC_COLUMNS)
+_BETWEEN = re.compile(rf"^\s*({_NUMBER})\s*(<=?|>=?)\s*({_FIELD})\s*(<=?|>=?)\s*({_NUMBER})\s*$")
+_COMPARISON = re.compile(rf"^\s*({_FIELD})\s*(<=|>=|<|>|=)\s*({_NUMBER})\s*$")
+_REVERSED = re.compile(rf"^\s*({_NUMBER})\s*(<=|>=|<|>|=)\s*({_FIELD})\s*$")
+# The operator seen from the other side of a condition, 6<PLD is PLD>6
+_FLIPPED = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "=": "="}
+_RANGE = re.compile(rf"^\s*({_FIELD})\s*=\s*({_NUMBER})\s*\.\.\s*({_NUMBER})\s*$")
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def parse_range_term(term):
+    """
+    Parses a numeric condition of the search language such as PLD>6,
+    void_fraction<=0.5, 6<PLD<8, 8>=PLD>=6, 6<PLD, PLD=6..8 or PLD=10.
+
+    **parameters:**
+        term (str): One '&' separated term of a search query.
+
+    **returns:**
+        tuple: (column, low, high, include_low, include_high), or None if
+        the term is not a numeric condition. Open bounds are None.
+    """
+    match = _RANGE.match(term)
+    if match:
+        return match.group(1), float(match.group(2)), float(match.group(3)), True, True
+    match = _BETWEEN.match(term)
+    if match:
+        low, low_op, column, high_op, high = match.groups()
+        if low_op[0] != high_op[0]:
+            return None
+        if low_op[0] == ">":
+            low, low_op, high, high_op = high, high_op, low, low_op
+        return column, float(low), float(high), low_op.endswith("="), high_op.endswith("=")
+    match = _COMPARISON.match(term)
+    if match:
+        column, operator, value = match.group(1), match.group(2), float(match.group(3))
+    else:
+        match = _REVERSED.match(term)
+        if match:
+            column, operator, value = match.group(3), _FLIPPED[match.group(2)], float(match.group(1))
+    if match:
+        if operator == "=":
+            return column, value, value, True, True
+        if operator.startswith(">"):
+            return column, value, None, operator == ">=", True
+        return column, None, value, True, operator == "<="
+    return None
+
+
+def text_ranks(values):
+    """
+    Ranks strings case insensitively so that text columns can be sorted
+    with the same vectorised argsort as numeric ones.
+
+    **parameters:**
+        values (list): The strings.
+
+    **returns:**
+        np.ndarray: The rank of every string, -1 for empty strings.
+    """
+    keys = np.array([str(value).lower() for value in values], dtype=str)
+    unique, ranks = np.unique(keys, return_inverse=True)
+    ranks = ranks.astype(np.int64)
+    if len(unique) and unique[0] == "":
+        ranks -= 1
+    return ranks
+
+
+def split_query(query_str):
+    """
+    Splits a search query into its text terms and its numeric conditions.
+
+    **parameters:**
+        query_str (str): The '&' separated search query.
+
+    **returns:**
+        tuple: List of text terms and list of numeric conditions.
+    """
+    text_terms, conditions = [], []
+    for term in query_str.split('&'):
+        if not term.strip():
+            continue
+        condition = parse_range_term(term)
+        if condition is None:
+            text_terms.append(term.strip())
+        else:
+            conditions.append(condition)
+    return text_terms, conditions
+
+
+class PropertyStore:
+    """
+    A columnar side store of the numeric MOF properties, built next to
+    the Whoosh index. Every column is kept as a float64 array together
+    with its sorted permutation, so range conditions are answered with
+    two binary searches and compound conditions with vectorised masks.
+    Text columns are kept as ranks so that results can be sorted on any
+    column without fetching stored fields.
+
+    **parameters:**
+        refcodes (np.ndarray): Refcode of every row.
+        docnums (np.ndarray): Whoosh document number of every row.
+        columns (dict): Mapping of column name to values.
+        generation (int): Index generation the store was built from.
+        orders (dict): Mapping of column name to the permutation sorting it.
+        ranks (dict): Mapping of text column name to the rank of every row.
+    """
+
+    def __init__(self, refcodes, docnums, columns, generation=-1, orders=None, ranks=None):
+        self.refcodes = refcodes
+        self.docnums = docnums
+        self.columns = columns
+        self.ranks = ranks or {}
+        self.generation = generation
+        self.orders = orders or {name: np.argsort(values, kind='stable') for name, values in columns.items()}
+        self._sorted = {name: values[self.orders[name]] for name, values in columns.items()}
+        self._finite = {name: int(np.isfinite(values).sum()) for name, values in columns.items()}
+
+    @classmethod
+    def from_index(cls, idx):
+        """
+        Builds the store from the stored fields of a Whoosh index.
+
+        **parameters:**
+            idx (whoosh.index.Index): The Whoosh index.
+
+        **returns:**
+            PropertyStore: The store.
+        """
+        refcodes, docnums, rows = [], [], []
+        texts = {name: [] for name in TEXT_COLUMNS}
+        with idx.reader() as reader:
+            for docnum, fields in reader.iter_docs():
+                refcodes.append(fields.get("refcode", ""))
+                docnums.append(docnum)
+                rows.append([_as_float(fields.get(name)) for name in NUMERIC_COLUMNS])
+                for name in TEXT_COLUMNS:
+                    texts[name].append(fields.get(name) or "")
+        values = np.array(rows, dtype=np.float64).reshape(-1, len(NUMERIC_COLUMNS))
+        columns = {name: values[:, i].copy() for i, name in enumerate(NUMERIC_COLUMNS)}
+        ranks = {name: text_ranks(strings) for name, strings in texts.items()}
+        return cls(np.array(refcodes, dtype=str), np.array(docnums, dtype=np.int64), columns,
+                   idx.latest_generation(), ranks=ranks)
+
+    def save(self, file_path):
+        """
+        Atomically saves the store as a .npz file.
+
+        **parameters:**
+            file_path (str): Path to the output file.
+        """
+        arrays = {f"column_{name}": values for name, values in self.columns.items()}
+        arrays.update({f"order_{name}": order for name, order in self.orders.items()})
+        arrays.update({f"rank_{name}": ranks for name, ranks in self.ranks.items()})
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(file_path)),
+                                         delete=False, suffix=".npz") as store_file:
+            np.savez(store_file, refcodes=self.refcodes, docnums=self.docnums,
+                     generation=self.generation, **arrays)
+        os.replace(store_file.name, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Loads a store saved with PropertyStore.save.
+
+        **parameters:**
+            file_path (str): Path to the .npz file.
+
+        **returns:**
+            PropertyStore: The store.
+        """
+        with np.load(file_path) as data:
+            names = [key[len("column_"):] for key in data.files if key.startswith("column_")]
+            ranks = {key[len("rank_"):]: data[key] for key in data.files if key.startswith("rank_")}
+            return cls(data['refcodes'], data['docnums'], {name: data[f"column_{name}"] for name in names},
+                       int(data['generation']), {name: data[f"order_{name}"] for name in names}, ranks)
+
+    def __len__(self):
+        return len(self.refcodes)
+
+    def _bounds(self, column, low=None, high=None, include_low=True, include_high=True):
+        # NaNs sort last and are left out, so missing values never match
+        values = self._sorted[column][:self._finite[column]]
+        end = len(values)
+        start = 0 if low is None else int(np.searchsorted(values, low, 'left' if include_low else 'right'))
+        stop = end if high is None else int(np.searchsorted(values, high, 'right' if include_high else 'left'))
+        return start, max(start, stop)
+
+    def count(self, column, low=None, high=None, include_low=True, include_high=True):
+        """
+        Counts the rows satisfying a range condition without materialising them.
+
+        **returns:**
+            int: The number of matching rows.
+        """
+        start, stop = self._bounds(column, low, high, include_low, include_high)
+        return stop - start
+
+    def range_rows(self, column, low=None, high=None, include_low=True, include_high=True):
+        """
+        Returns the rows whose value of column lies within a range.
+
+        **parameters:**
+            column (str): Name of the column.
+            low (float): Lower bound, open if None.
+            high (float): Upper bound, open if None.
+            include_low (bool): Whether the lower bound is inclusive.
+            include_high (bool): Whether the upper bound is inclusive.
+
+        **returns:**
+            np.ndarray: The matching rows.
+        """
+        start, stop = self._bounds(column, low, high, include_low, include_high)
+        return self.orders[column][start:stop]
+
+    def filter(self, conditions):
+        """
+        Returns the rows satisfying all conditions. The most selective
+        condition is answered from its sorted permutation and the others
+        are checked with vectorised comparisons on the remaining rows.
+
+        **parameters:**
+            conditions (list): Tuples of (column, low, high, include_low, include_high).
+
+        **returns:**
+            np.ndarray: The matching rows, sorted.
+        """
+        if not conditions:
+            return np.arange(len(self.refcodes))
+        conditions = sorted(conditions, key=lambda condition: self.count(*condition))
+        rows = self.range_rows(*conditions[0])
+        for column, low, high, include_low, include_high in conditions[1:]:
+            values = self.columns[column][rows]
+            mask = np.ones(len(rows), dtype=bool)
+            if low is not None:
+                mask &= values >= low if include_low else values > low
+            if high is not None:
+                mask &= values <= high if include_high else values < high
+            rows = rows[mask]
+        return np.sort(rows)
+
+    def rows_for_docnums(self, docnums):
+        """
+        Maps Whoosh document numbers to rows of the store.
+
+        **parameters:**
+            docnums (np.ndarray): Document numbers, all present in the store.
+
+        **returns:**
+            np.ndarray: The rows.
+        """
+        # iter_docs walks the index in document order, so docnums is sorted
+        return np.searchsorted(self.docnums, docnums)
+
+    def sort_rows(self, rows, column, ascending=True):
+        """
+        Sorts rows on a numeric or text column. The sort is stable, so rows
+        with equal values keep their order, and missing values come last.
+
+        **parameters:**
+            rows (np.ndarray): The rows, e.g. in relevance order.
+            column (str): Name of the column.
+            ascending (bool): Sort in ascending order.
+
+        **returns:**
+            np.ndarray: The sorted rows.
+        """
+        if column in self.columns:
+            keys = self.columns[column][rows]
+        else:
+            keys = self.ranks[column][rows].astype(np.float64)
+            keys[keys < 0] = np.nan
+        if not ascending:
+            keys = -keys
+        return rows[np.argsort(keys, kind='stable')]
+
+
+def store_path(index_dir):
+    return os.path.join(index_dir, STORE_NAME)
+
+
+def build_property_store(index_dir):
+    """
+    Builds and saves the property store of a Whoosh index.
+
+    **parameters:**
+        index_dir (str): Path to the index directory.
+
+    **returns:**
+        PropertyStore: The store.
+    """
+    from whoosh_update import index
+
+    store = PropertyStore.from_index(index.open_dir(index_dir))
+    store.save(store_path(index_dir))
+    return store
+
+
+def load_property_store(index_dir, idx=None):
+    """
+    Loads the property store of a Whoosh index, rebuilding it if it is
+    missing or was built from an older generation of the index.
+
+    **parameters:**
+        index_dir (str): Path to the index directory.
+        idx (whoosh.index.Index): The opened index, opened from index_dir if None.
+
+    **returns:**
+        PropertyStore: The store.
+    """
+    from whoosh_update import index
+
+    idx = idx or index.open_dir(index_dir)
+    path = store_path(index_dir)
+    if os.path.exists(path):
+        store = PropertyStore.load(path)
+        if store.generation == idx.latest_generation() and set(TEXT_COLUMNS) <= set(store.ranks):
+            return store
+    store = PropertyStore.from_index(idx)
+    try:
+        store.save(path)
+    except OSError:
+        pass
+    return store
@@ -0,0 +1,142 @@
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+from fairmofapp.loader.mof_query import split_terms
+
+
+def normalise_query(query_str):
+    """
+    Normalises a '&' separated search query so that equivalent queries
+    share a cache entry: whitespace is collapsed, empty terms are dropped
+    and, since all terms are combined with AND, the terms are sorted.
+
+    **parameters:**
+        query_str (str): The search query.
+
+    **returns:**
+        str: The normalised query.
+    """
+    terms = {" ".join(term.split()) for term in split_terms(query_str)}
+    return " & ".join(sorted(term for term in terms if term))
+
+
+def estimate_size(value):
+    """
+    Roughly estimates the memory held by a cached value made of numpy
+    arrays, lists, tuples, dictionaries, strings and numbers. An array
+    counts the bytes of the array owning its buffer, since a view keeps
+    the whole buffer alive while it is cached.
+
+    **parameters:**
+        value: The value.
+
+    **returns:**
+        int: The estimated size in bytes.
+    """
+    if isinstance(value, np.ndarray):
+        owner = value
+        while isinstance(owner.base, np.ndarray):
+            owner = owner.base
+        # getsizeof only includes the buffer of an array that owns it
+        return sys.getsizeof(value) + (owner.nbytes if value.base is not None else 0)
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class QueryCache:
+    """
+    A thread safe LRU cache of search results bounded by an estimate of
+    the memory it holds. Entries are keyed by the index generation, the
+    normalised query and an optional variant, e.g. the sort order of the
+    rows, so committing to the index invalidates them.
+
+    **parameters:**
+        max_bytes (int): Memory budget of the cache.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, generation, query_str, variant=None):
+        """
+        Looks up the results of a query.
+
+        **parameters:**
+            generation (int): Generation of the index.
+            query_str (str): The search query.
+            variant (tuple): Hashable description of how the results were
+                derived from the hits, e.g. a sort column and order.
+
+        **returns:**
+            The cached results, or None on a miss.
+        """
+        key = (generation, normalise_query(query_str), variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, generation, query_str, results, variant=None):
+        """
+        Stores the results of a query, evicting the least recently used
+        entries beyond the memory budget. Results larger than the whole
+        budget are not cached.
+
+        **parameters:**
+            generation (int): Generation of the index.
+            query_str (str): The search query.
+            results: The results to cache.
+            variant (tuple): Hashable description of how the results were
+                derived from the hits, see get.
+        """
+        key = (generation, normalise_query(query_str), variant)
+        size = estimate_size(results)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (results, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """
+        Returns the hit rate metrics of the cache.
+
+        **returns:**
+            dict: hits, misses, hit_rate, evictions, entries and bytes.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+            }
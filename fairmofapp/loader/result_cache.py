@@ -0,0 +1,275 @@
+import os
+import gzip
+import json
+import hashlib
+import tempfile
+import threading
+import numpy as np
+from ase import Atoms
+
+# Bumped whenever the serialised form changes, so old entries are not read
+CACHE_VERSION = 1
+_MISSING = object()
+
+
+def structure_hash(atoms, decimals=4):
+    """
+    Hashes a structure independently of the order of its atoms and, for
+    periodic structures, of which periodic image of an atom was written.
+    Coordinates and the cell are rounded, so the same CIF parsed twice, or
+    written by a different program, gives the same hash.
+
+    **parameters:**
+        atoms (ase.Atoms): The structure.
+        decimals (int): Decimals kept of the fractional or, without a
+            cell, Cartesian coordinates in Å.
+
+    **returns:**
+        str: Hexadecimal SHA-256 digest.
+    """
+    numbers = atoms.get_atomic_numbers()
+    pbc = atoms.get_pbc()
+    cell = np.round(atoms.get_cell()[:], decimals) + 0.0
+    if pbc.any() and atoms.cell.volume > 1e-8:
+        coordinates = atoms.get_scaled_positions(wrap=False)
+        coordinates[:, pbc] %= 1.0
+        coordinates = np.round(coordinates, decimals)
+        coordinates[:, pbc] %= 1.0
+    else:
+        coordinates = np.round(atoms.get_positions(), decimals)
+    coordinates += 0.0
+    order = np.lexsort((coordinates[:, 2], coordinates[:, 1], coordinates[:, 0], numbers))
+    digest = hashlib.sha256()
+    digest.update(pbc.astype(np.int8).tobytes())
+    digest.update(cell.astype('<f8').tobytes())
+    digest.update(numbers[order].astype('<i8').tobytes())
+    digest.update(coordinates[order].astype('<f8').tobytes())
+    return digest.hexdigest()
+
+
+def _encode(value):
+    # json.dump calls this for every object it cannot serialise itself
+    if isinstance(value, Atoms):
+        return {'__atoms__': {
+            'arrays': dict(value.arrays),
+            'cell': value.get_cell()[:],
+            'pbc': value.get_pbc(),
+            'info': value.info,
+        }}
+    if isinstance(value, np.ndarray):
+        return {'__ndarray__': value.tolist(), 'dtype': value.dtype.str}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f"Cannot cache a value of type {type(value).__name__}")
+
+
+def _decode(value):
+    if '__ndarray__' in value:
+        return np.array(value['__ndarray__'], dtype=value['dtype'])
+    if '__atoms__' in value:
+        data = value['__atoms__']
+        arrays = data['arrays']
+        atoms = Atoms(numbers=arrays.pop('numbers'), positions=arrays.pop('positions'),
+                      cell=data['cell'], pbc=data['pbc'], info=data['info'])
+        for name, array in arrays.items():
+            atoms.set_array(name, array)
+        return atoms
+    return value
+
+
+def dumps(value):
+    """
+    Serialises a result made of ASE atoms, numpy arrays, dictionaries,
+    lists and scalars to gzip compressed JSON.
+
+    **parameters:**
+        value: The result.
+
+    **returns:**
+        bytes: The compressed JSON document.
+    """
+    return gzip.compress(json.dumps(value, default=_encode, separators=(',', ':')).encode('utf-8'))
+
+
+def loads(data):
+    """
+    Reads a result written by dumps.
+
+    **parameters:**
+        data (bytes): The compressed JSON document.
+
+    **returns:**
+        The result, with ASE atoms and numpy arrays restored.
+    """
+    return json.loads(gzip.decompress(data).decode('utf-8'), object_hook=_decode)
+
+
+class ResultCache:
+    """
+    A persistent cache of analysis results on local disk, shared by every
+    session and process using the same directory. Entries are keyed by
+    the name of the computation, a canonical hash of the structure and
+    the parameters, so the same structure uploaded twice, or by two
+    users, is only analysed once. Every entry is one file written
+    atomically; the modification time of a file records its last use,
+    and the least recently used files are removed once the directory
+    grows beyond max_bytes.
+
+    **parameters:**
+        directory (str): Directory holding the cache files.
+        max_bytes (int): Size budget of the directory.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, name, atoms, parameters=None):
+        """
+        Builds the key of a computation on a structure.
+
+        **parameters:**
+            name (str): Name of the computation.
+            atoms (ase.Atoms): The structure.
+            parameters (dict): Parameters changing the result.
+
+        **returns:**
+            str: Hexadecimal SHA-256 digest.
+        """
+        description = json.dumps([CACHE_VERSION, name, structure_hash(atoms), parameters or {}],
+                                 sort_keys=True, default=_encode)
+        return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as cache_file:
+                value = loads(cache_file.read())
+            os.utime(path)
+        except FileNotFoundError:
+            value = _MISSING
+        except (OSError, ValueError, EOFError):
+            # A truncated or unreadable entry is dropped and recomputed
+            self._remove(path)
+            value = _MISSING
+        with self._lock:
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Stores a result. Results that cannot be serialised, or that are
+        larger than the whole budget, are not cached, so the caller still
+        gets the result it computed.
+
+        **parameters:**
+            key (str): Key built with ResultCache.key.
+            value: The result.
+
+        **returns:**
+            bool: Whether the result was stored.
+        """
+        try:
+            data = dumps(value)
+        except (TypeError, ValueError):
+            return False
+        if len(data) > self.max_bytes:
+            return False
+        # Writing to a temporary file and renaming it means other processes
+        # see either the whole entry or none of it
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as cache_file:
+                cache_file.write(data)
+            os.replace(temporary, self._path(key))
+        except BaseException:
+            self._remove(temporary)
+            raise
+        self.evict()
+        return True
+
+    def get_or_compute(self, name, atoms, function, parameters=None):
+        """
+        Returns the cached result of a computation on a structure,
+        computing and storing it on a miss.
+
+        **parameters:**
+            name (str): Name of the computation.
+            atoms (ase.Atoms): The structure.
+            function (callable): Computes the result when called without arguments.
+            parameters (dict): Parameters changing the result.
+
+        **returns:**
+            The result.
+        """
+        key = self.key(name, atoms, parameters)
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = function()
+            self.put(key, value)
+        return value
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json.gz'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits in
+        its size budget.
+
+        **returns:**
+            int: Number of entries removed.
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        for _, _, path in self._entries():
+            self._remove(path)
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(entries),
+                'bytes': sum(size for _, size, _ in entries),
+            }
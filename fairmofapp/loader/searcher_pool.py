@@ -0,0 +1,178 @@
+import threading
+from contextlib import contextmanager
+from whoosh_update import index
+
+WARM_FIELDS = ["metal", "metal_symbols", "topology", "sbu_type", "color"]
+# Fields with more distinct terms than this are not warmed
+MAX_WARM_TERMS = 10000
+
+
+class SearcherPool:
+    """
+    A process wide pool of warm Whoosh searchers shared by all sessions.
+    Searchers are expensive to open because every segment file is opened
+    and its reader state rebuilt, so they are kept open and handed out one
+    caller at a time. When the index gets a new generation the pool swaps
+    to it atomically: new checkouts get searchers on the new generation
+    and searchers on the old one are closed once they are returned.
+
+    The first searcher opened on a generation reads the term dictionary
+    of the warm fields, once per generation and never their postings, so
+    a refresh costs one pass over at most max_terms terms per field.
+
+    **parameters:**
+        index_dir (str): Path to the index directory.
+        size (int): Maximum number of searchers open at once.
+        warm_fields (list): Fields whose term dictionary is preloaded.
+        max_terms (int): Fields with more terms are left cold.
+    """
+
+    def __init__(self, index_dir, size=4, warm_fields=WARM_FIELDS, max_terms=MAX_WARM_TERMS):
+        self.index_dir = index_dir
+        self.size = size
+        self.warm_fields = warm_fields
+        self.max_terms = max_terms
+        self.doc_frequencies = {}
+        self._warmed_generation = None
+        self._condition = threading.Condition()
+        self._idle = []
+        self._open = 0
+        self._index = index.open_dir(index_dir)
+        self.generation = self._index.latest_generation()
+
+    def _warm(self, searcher):
+        # Reading the term dictionary of the commonly filtered fields pulls
+        # it into the page cache before the first query needs it, and
+        # records the document frequencies the query planner estimates with.
+        reader = searcher.reader()
+        doc_frequencies = {}
+        for field in self.warm_fields:
+            if field not in reader.indexed_field_names():
+                continue
+            frequencies = {}
+            for term, term_info in reader.iter_field(field):
+                if len(frequencies) >= self.max_terms:
+                    frequencies = None
+                    break
+                frequencies[term.decode('utf-8')] = term_info.doc_frequency()
+            if frequencies is not None:
+                doc_frequencies[field] = frequencies
+        return doc_frequencies
+
+    def _open_searcher(self, idx, generation):
+        searcher = idx.searcher()
+        with self._condition:
+            warm = generation != self._warmed_generation
+            self._warmed_generation = generation
+        if warm:
+            doc_frequencies = self._warm(searcher)
+            with self._condition:
+                if generation == self.generation:
+                    self.doc_frequencies = doc_frequencies
+        return searcher
+
+    def refresh(self):
+        """
+        Swaps the pool to the latest generation of the index if it changed.
+
+        **returns:**
+            int: The current generation.
+        """
+        # Listing the TOC files is cheap, the index is only reopened on a change
+        if self._index.latest_generation() == self.generation:
+            return self.generation
+        latest = index.open_dir(self.index_dir)
+        generation = latest.latest_generation()
+        with self._condition:
+            if generation != self.generation:
+                stale, self._idle = self._idle, []
+                self._open -= len(stale)
+                self._index, self.generation = latest, generation
+                self.doc_frequencies = {}
+                self._condition.notify_all()
+            else:
+                stale = []
+        for old_searcher, _ in stale:
+            old_searcher.close()
+        return self.generation
+
+    @contextmanager
+    def searcher(self):
+        """
+        Checks out a warm searcher on the latest generation of the index,
+        waiting while all searchers are in use.
+
+        **yields:**
+            whoosh.searching.Searcher: The searcher, valid inside the with block.
+        """
+        self.refresh()
+        with self._condition:
+            while not self._idle and self._open >= self.size:
+                self._condition.wait()
+            if self._idle:
+                searcher, generation = self._idle.pop()
+                idx = None
+            else:
+                self._open += 1
+                idx, generation = self._index, self.generation
+        if idx is not None:
+            try:
+                searcher = self._open_searcher(idx, generation)
+            except Exception:
+                with self._condition:
+                    self._open -= 1
+                    self._condition.notify()
+                raise
+        try:
+            yield searcher
+        finally:
+            with self._condition:
+                current = generation == self.generation
+                if current:
+                    self._idle.append((searcher, generation))
+                else:
+                    self._open -= 1
+                self._condition.notify()
+            if not current:
+                searcher.close()
+
+    def doc_frequency(self, field, term):
+        """
+        Returns the number of documents containing a term, from the
+        frequencies recorded while warming when available.
+
+        **parameters:**
+            field (str): Name of the field.
+            term (str): The term, as indexed.
+
+        **returns:**
+            int: The document frequency.
+        """
+        frequencies = self.doc_frequencies.get(field)
+        if frequencies is not None:
+            return frequencies.get(term, 0)
+        with self.searcher() as searcher:
+            return searcher.doc_frequency(field, term)
+
+    def close(self):
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for searcher, _ in idle:
+            searcher.close()
+
+
+def open_searcher_pool(index_dir, size=4):
+    """
+    Opens a searcher pool over an index directory.
+
+    **parameters:**
+        index_dir (str): Path to the index directory.
+        size (int): Maximum number of searchers open at once.
+
+    **returns:**
+        SearcherPool: The pool, or None if there is no index in index_dir.
+    """
+    if not index.exists_in(index_dir):
+        return None
+    return SearcherPool(index_dir, size)
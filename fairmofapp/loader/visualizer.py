@@ -1,6 +1,8 @@
+from io import BytesIO
 import py3Dmol
+from ase.io import write
 from mofstructure import mofdeconstructor
-from ase.data import chemical_symbols, covalent_radii
+from fairmofapp.analyzer.neighbour_list import find_bonds
 
 # Standard colors for atoms
 # ATOM_COLORS = {
@@ -122,11 +124,184 @@ ATOM_COLORS = {
 }
 
 
-def structure_visualizer(structure, tolerance=0.3):
-    structure = mofdeconstructor.wrap_systems_in_unit_cell(structure, 20)
+# Largest model string embedded in the page before falling back to a lighter representation
+MAX_PAYLOAD = 4 * 1024 * 1024
+# MOL V2000 counts are three digits wide, larger structures are written as V3000
+V2000_LIMIT = 999
+
+
+def mol_block(symbols, xyz, bonds, title="fairmofapp"):
+    """
+    Writes a structure and its bonds as an MDL MOL block, V2000 when atom
+    and bond counts fit in three digits and V3000 otherwise.
+
+    **parameters:**
+        symbols (list): Chemical symbol of every atom.
+        xyz (np.ndarray): Cartesian coordinates, shape (N, 3).
+        bonds (np.ndarray): Atom index pairs, shape (n_bonds, 2).
+        title (str): Title line of the block.
+
+    **returns:**
+        str: The MOL block, terminated as an SDF record.
+    """
+    lines = [title, "  fairmofapp", ""]
+    if len(symbols) <= V2000_LIMIT and len(bonds) <= V2000_LIMIT:
+        lines.append(f"{len(symbols):3d}{len(bonds):3d}  0  0  0  0  0  0  0  0999 V2000")
+        lines.extend(f"{x:10.4f}{y:10.4f}{z:10.4f} {symbol:<3} 0  0  0  0  0  0  0  0  0  0  0  0"
+                     for symbol, (x, y, z) in zip(symbols, xyz))
+        lines.extend(f"{i + 1:3d}{j + 1:3d}  1  0" for i, j in bonds)
+    else:
+        lines.append("  0  0  0     0  0            999 V3000")
+        lines.append("M  V30 BEGIN CTAB")
+        lines.append(f"M  V30 COUNTS {len(symbols)} {len(bonds)} 0 0 0")
+        lines.append("M  V30 BEGIN ATOM")
+        lines.extend(f"M  V30 {n} {symbol} {x:.4f} {y:.4f} {z:.4f} 0"
+                     for n, (symbol, (x, y, z)) in enumerate(zip(symbols, xyz), start=1))
+        lines.append("M  V30 END ATOM")
+        if len(bonds):
+            lines.append("M  V30 BEGIN BOND")
+            lines.extend(f"M  V30 {n} 1 {i + 1} {j + 1}" for n, (i, j) in enumerate(bonds, start=1))
+            lines.append("M  V30 END BOND")
+        lines.append("M  V30 END CTAB")
+    lines.extend(["M  END", "$$$$", ""])
+    return "\n".join(lines)
+
+
+def xyz_block(symbols, xyz, decimals=2):
+    """
+    Writes a structure as an XYZ block with reduced coordinate precision.
+
+    **parameters:**
+        symbols (list): Chemical symbol of every atom.
+        xyz (np.ndarray): Cartesian coordinates, shape (N, 3).
+        decimals (int): Decimals written per coordinate.
+
+    **returns:**
+        str: The XYZ block.
+    """
+    lines = [str(len(symbols)), "fairmofapp"]
+    lines.extend(f"{symbol} {x:.{decimals}f} {y:.{decimals}f} {z:.{decimals}f}" for symbol, (x, y, z) in zip(symbols, xyz))
+    return "\n".join(lines) + "\n"
+
+
+def element_colorscheme():
+    return {'prop': 'elem', 'map': ATOM_COLORS}
+
+
+def build_scene(structure, tolerance=0.3, max_payload=MAX_PAYLOAD):
+    """
+    Builds the model string and style of a 3Dmol scene holding the whole
+    structure as one model. The full representation is a MOL block with
+    the precomputed bonds, drawn as spheres and sticks. If it exceeds
+    max_payload, the structure is sent as a compact XYZ block drawn as
+    spheres only, without bonds, and hydrogens are dropped if that is
+    still too large.
+
+    **parameters:**
+        structure (ase.Atoms): The structure.
+        tolerance (float): Bond tolerance added to the sum of covalent radii.
+        max_payload (int): Largest model string, in bytes, before falling back.
+
+    **returns:**
+        dict: model (str), format (str), style (dict) and representation (str),
+        one of 'bonds', 'atoms' and 'heavy atoms'.
+    """
     xyz = structure.get_positions()
     symbols = structure.get_chemical_symbols()
+    spheres = {'radius': 0.5, 'colorscheme': element_colorscheme()}
+
+    # A MOL block needs about 70 bytes per atom, so hopeless cases skip straight to XYZ
+    if len(symbols) * 70 <= max_payload:
+        model = mol_block(symbols, xyz, find_bonds(structure, tolerance))
+        if len(model) <= max_payload:
+            return {'model': model, 'format': 'sdf', 'representation': 'bonds',
+                    'style': {'sphere': spheres, 'stick': {'radius': 0.1, 'color': 'gray'}}}
+
+    model = xyz_block(symbols, xyz)
+    representation = 'atoms'
+    if len(model) > max_payload:
+        heavy = [i for i, symbol in enumerate(symbols) if symbol != 'H']
+        model = xyz_block([symbols[i] for i in heavy], xyz[heavy])
+        representation = 'heavy atoms'
+    return {'model': model, 'format': 'xyz', 'representation': representation, 'style': {'sphere': spheres}}
+
+
+def cif_block(structure):
+    """
+    Writes the unit cell of a structure as a P1 CIF string.
+    """
+    cif_file = BytesIO()
+    write(cif_file, structure, format='cif')
+    return cif_file.getvalue().decode('utf-8')
+
+
+def has_cell(structure):
+    return bool(structure.pbc.any()) and structure.cell.volume > 1e-8
+
+
+def periodic_visualizer(structure, images=1):
+    """
+    Builds a 3Dmol view that receives the unit cell once, as CIF, and lets
+    the viewer replicate it through lattice translations, so the page
+    payload and the Python work do not grow with the number of images.
+    Bonds are assigned by the viewer.
+
+    **parameters:**
+        structure (ase.Atoms): A periodic structure.
+        images (int or tuple): Number of unit cells drawn along each lattice vector.
+
+    **returns:**
+        py3Dmol.view: The viewer.
+    """
+    images = (images,) * 3 if isinstance(images, int) else tuple(images)
+    unit_cell = structure.copy()
+    unit_cell.wrap()
     viewer = py3Dmol.view(width=800, height=600)
+    viewer.addModel(cif_block(unit_cell), 'cif')
+    viewer.setStyle({}, {'sphere': {'radius': 0.5, 'colorscheme': element_colorscheme()},
+                         'stick': {'radius': 0.1, 'color': 'gray'}})
+    viewer.addUnitCell()
+    if images != (1, 1, 1):
+        viewer.replicateUnitCell(*images, None, True)
+    viewer.representation = 'periodic'
+    viewer.zoomTo()
+    return viewer
+
+
+def structure_visualizer(structure, tolerance=0.3, mode="model", max_payload=MAX_PAYLOAD, images=None):
+    """
+    Builds a 3Dmol view of a structure wrapped into its unit cell.
+
+    **parameters:**
+        structure (ase.Atoms): The structure.
+        tolerance (float): Bond tolerance added to the sum of covalent radii.
+        mode (str): 'model' adds the structure as a single model with one
+            style, see build_scene; 'shapes' adds a sphere per atom and a
+            cylinder per bond, which only suits small structures.
+        max_payload (int): Largest model string in 'model' mode.
+        images (int or tuple): If set and the structure is periodic, the
+            unit cell is drawn with this many periodic images along each
+            lattice vector instead, see periodic_visualizer.
+
+    **returns:**
+        py3Dmol.view: The viewer. Its representation attribute tells which
+        representation was drawn.
+    """
+    if images is not None and has_cell(structure):
+        return periodic_visualizer(structure, images)
+
+    structure = mofdeconstructor.wrap_systems_in_unit_cell(structure, 20)
+    viewer = py3Dmol.view(width=800, height=600)
+    if mode == "model":
+        scene = build_scene(structure, tolerance, max_payload)
+        viewer.addModel(scene['model'], scene['format'], {'keepH': True})
+        viewer.setStyle({}, scene['style'])
+        viewer.representation = scene['representation']
+        viewer.zoomTo()
+        return viewer
+
+    xyz = structure.get_positions()
+    symbols = structure.get_chemical_symbols()
 
     # Add atoms as spheres to the viewer
     for i, atom in enumerate(symbols):
@@ -136,24 +311,16 @@ def structure_visualizer(structure, tolerance=0.3):
             'color': ATOM_COLORS.get(atom, 'white')
         })
 
-    # Add bonds based on interatomic distances
-    distance = structure.get_all_distances()
-    num_atoms = len(symbols)
-    for i in range(num_atoms):
-        for j in range(i + 1, num_atoms):
-            dist = distance[[i], [j]]
-            bond_threshold = covalent_radii[chemical_symbols.index(symbols[i])] + \
-                covalent_radii[chemical_symbols.index(symbols[j])] + tolerance
-
-            if dist < bond_threshold:
-                start = xyz[i]
-                end = xyz[j]
-                viewer.addCylinder({
-                    'start': {'x': start[0], 'y': start[1], 'z': start[2]},
-                    'end': {'x': end[0], 'y': end[1], 'z': end[2]},
-                    'radius': 0.1,
-                    'color': 'gray'
-                })
+    # Add bonds found by the cell list neighbour search
+    for i, j in find_bonds(structure, tolerance):
+        start = xyz[i]
+        end = xyz[j]
+        viewer.addCylinder({
+            'start': {'x': start[0], 'y': start[1], 'z': start[2]},
+            'end': {'x': end[0], 'y': end[1], 'z': end[2]},
+            'radius': 0.1,
+            'color': 'gray'
+        })
 
     viewer.zoomTo()
     return viewer
@@ -10,27 +10,71 @@ from pymatgen.analysis.diffraction.neutron import NDCalculator
 from pymatgen.io.ase import AseAtomsAdaptor
 from scipy.signal import savgol_filter
 from fairmofapp.loader import visualizer
+from fairmofapp.loader.analysis_jobs import comparison_results
+from fairmofapp.analyzer.structure_comparison import COMPARISON_ANALYSES, comparison_table, overlay_patterns
+
+WAVELENGTHS = ['CuKa', 'CuKa2', 'CuKa1', 'CuKb1', 'MoKa', 'MoKa2', 'MoKa1',
+               'MoKb1', 'CrKa', 'CrKa2', 'CrKa1', 'CrKb1', 'FeKa', 'FeKa2',
+               'FeKa1', 'FeKb1', 'CoKa', 'CoKa2', 'CoKa1', 'CoKb1', 'AgKa',
+               'AgKa2', 'AgKa1', 'AgKb1']
+ANALYSIS_LABELS = {"porosity": "Porosity", "overlaps": "Overlap check", "pxrd": "Diffraction pattern"}
+
 
 @st.cache_resource
 def load_image(image_path):
     return image_path
 
-def visualize_structure(ase_atom):
+def display_options():
+    display = st.sidebar.radio("Structure display", ["Molecules in the cell", "Periodic unit cell"])
+    if display == "Periodic unit cell":
+        return st.sidebar.slider("Periodic images per axis", 1, 4, 1)
+    return None
+
+
+def visualize_structure(ase_atom, images=None):
     """
     Visualizes the molecular structure from an ASE object.
 
     Args:
         ase_atom: ASE atoms object.
+        images: Number of periodic images along each lattice vector, or
+            None to draw the molecules wrapped into the cell.
 
     Returns:
         viewer: Visualizer object for the molecular structure.
     """
-    return visualizer.structure_visualizer(ase_atom)
+    viewer = visualizer.structure_visualizer(ase_atom, images=images)
+    if viewer.representation in ('atoms', 'heavy atoms'):
+        st.caption(f"This structure is too large to draw with bonds, only its {viewer.representation} are shown.")
+    return viewer
 
 
 st.title("Xray and Neutron Diffraction Calculation")
 
-uploaded_file = st.file_uploader("Upload CIF file", type="cif")
+uploaded_file = None
+if st.toggle("Compare several structures"):
+    uploaded_files = st.file_uploader("Upload CIF files", type="cif", accept_multiple_files=True)
+    analyses = st.multiselect("Analyses", COMPARISON_ANALYSES, default=["pxrd"], format_func=ANALYSIS_LABELS.get)
+    diffraction_type = st.selectbox("Select Diffraction Type", ["PXRD", "Neutron Diffraction"])
+    wavelength = st.selectbox("Select X-ray wavelength (Å)", WAVELENGTHS)
+    min_two_theta = st.number_input("Minimum 2 Theta (degrees)", value=5.0)
+    max_two_theta = st.number_input("Maximum 2 Theta (degrees)", value=50.0)
+    if uploaded_files and analyses:
+        results = comparison_results(uploaded_files, analyses, diffraction_type=diffraction_type,
+                                     wavelength=wavelength, two_theta_range=(min_two_theta, max_two_theta))
+        if results is not None:
+            comparison_df = comparison_table(results)
+            st.dataframe(comparison_df, hide_index=True)
+            st.download_button(
+                label="Download Comparison (CSV)",
+                data=comparison_df.to_csv(index=False),
+                file_name="structure_comparison.csv",
+                mime="text/csv"
+            )
+            if "pxrd" in analyses:
+                st.plotly_chart(overlay_patterns(results, title=f"Simulated {diffraction_type} Patterns"))
+else:
+    uploaded_file = st.file_uploader("Upload CIF file", type="cif")
 
 if uploaded_file is not None:
     # Read and parse the uploaded CIF file
@@ -42,15 +86,11 @@ if uploaded_file is not None:
 
     # Convert to pymatgen structure
     structure = AseAtomsAdaptor.get_structure(ase_atom)
-    viewer = visualize_structure(ase_atom)
+    viewer = visualize_structure(ase_atom, display_options())
     showmol(viewer, height=500, width=800)
 
     # User input for X-ray wavelength
-    wavelengths = ['CuKa', 'CuKa2', 'CuKa1', 'CuKb1', 'MoKa', 'MoKa2', 'MoKa1',
-                   'MoKb1', 'CrKa', 'CrKa2', 'CrKa1', 'CrKb1', 'FeKa', 'FeKa2',
-                   'FeKa1', 'FeKb1', 'CoKa', 'CoKa2', 'CoKa1', 'CoKb1', 'AgKa',
-                   'AgKa2', 'AgKa1', 'AgKb1']
-    wavelength = st.selectbox("Select X-ray wavelength (Å)", wavelengths)
+    wavelength = st.selectbox("Select X-ray wavelength (Å)", WAVELENGTHS)
 
     # Option to compute PXRD or Neutron Diffraction
     diffraction_type = st.selectbox("Select Diffraction Type", [
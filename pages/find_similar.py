@@ -1,11 +1,29 @@
 import streamlit as st
-import os
-import zipfile
-import shutil
-from tempfile import TemporaryDirectory
-from fairmofapp.loader.download_cif import search_and_copy_from_zip
+from fairmofapp.loader.cif_download import cif_download_button
 from fairmofapp.analyzer import similarity_graph
 from fairmofapp.analyzer.adj_matrix_loader import get_adjacency_matrix
+from fairmofapp.analyzer.ann_index import index_generation, load_or_build_ann_index
+from fairmofapp.analyzer.graph_layout import require_layout
+from fairmofapp.analyzer import graph_explorer
+
+
+@st.cache_resource(max_entries=1)
+def load_ann_index(ann_path, index_dir, generation):
+    # Keyed by the index generation, so a reindex brings the ANN index up to date
+    return load_or_build_ann_index(ann_path, index_dir)
+
+
+@st.cache_resource
+def load_graph_layout(matrix_path):
+    return require_layout(matrix_path)
+
+
+@st.cache_resource
+def load_cluster_overview(matrix_path):
+    adj_matrix = get_adjacency_matrix(matrix_path)
+    communities = graph_explorer.require_communities(matrix_path)
+    return graph_explorer.cluster_overview(adj_matrix, communities, load_graph_layout(matrix_path))
+
 
 st.markdown(
     """
@@ -23,10 +41,18 @@ st.markdown("<hr>", unsafe_allow_html=True)
 
 mof_name = st.text_input("Enter MOF name (e.g., ABAFUH):")
 top_n = st.slider("How many similar MOFs to display?", min_value=1, max_value=100, value=5)
+similarity_mode = st.radio(
+    "Similarity search mode",
+    ["Precomputed similarity matrix", "Approximate search on pore properties, metals and topology"],
+    horizontal=True)
 adj_matrix = get_adjacency_matrix('./data/A.json')
 
 if mof_name:
-    similar_mofs = similarity_graph.get_similar_mofs(mof_name, adj_matrix, top_n)
+    if similarity_mode == "Precomputed similarity matrix":
+        similar_mofs = similarity_graph.get_similar_mofs(mof_name, adj_matrix, top_n)
+    else:
+        ann_index = load_ann_index('./data/ann_index.npz', './data/index_dir', index_generation('./data/index_dir'))
+        similar_mofs = ann_index.get_similar_mofs(mof_name, top_n)
 
     if similar_mofs.empty:
         st.warning("Sorry, the record you entered is not currently in our database.")
@@ -37,32 +63,50 @@ if mof_name:
         download_option = st.checkbox("Would you like to download the cif files?")
 
         if download_option:
-            zip_directory = "./data/cifs"  # Directory containing .zip files
-            mof_names = similar_mofs["MOF"].tolist()
-
-            # Use a temporary directory to avoid cluttering the workspace
-            with TemporaryDirectory() as temp_dir:
-                output_dir_name = f'mofs_similar_to_{mof_name}'
-                output_dir = os.path.join(temp_dir, output_dir_name)
-                os.makedirs(output_dir, exist_ok=True)
-
-                # Copy and extract MOF files to the temporary directory
-                output_dir = search_and_copy_from_zip(mof_names, zip_directory, output_dir)
-
-                # Create a ZIP archive of the extracted MOF files in the temporary directory
-                zip_output_path = os.path.join(temp_dir, f"{output_dir_name}.zip")
-                shutil.make_archive(output_dir, 'zip', output_dir)
-
-                # Display download button for the zip file
-                with open(zip_output_path, "rb") as zip_file:
-                    st.download_button(
-                        label=f"Download {output_dir_name}.zip",
-                        data=zip_file,
-                        file_name=f"{output_dir_name}.zip",
-                        mime='application/zip'
-                    )
+            # Stream the MOF files from the archives into an in-memory zip
+            cif_download_button(similar_mofs["MOF"].tolist(), f'mofs_similar_to_{mof_name}')
 
 st.markdown('<h2 class="centered-title">MOF SPACE</h2>', unsafe_allow_html=True)
-nx_graph = similarity_graph.create_graph_from_adjacency_matrix(adj_matrix)
-fig = similarity_graph.visualize_interactive_graph(nx_graph, "")
-st.plotly_chart(fig, use_container_width=True)
+try:
+    graph_pos = load_graph_layout('./data/A.json')
+except FileNotFoundError as error:
+    # Layouts are computed offline, never while serving the page
+    st.error(str(error))
+    st.stop()
+
+if mof_name and mof_name in adj_matrix:
+    # Neighbourhood of the queried MOF, expanded by clicking on nodes
+    if st.session_state.get("ego_query") != mof_name:
+        st.session_state["ego_query"] = mof_name
+        st.session_state["ego_centres"] = [mof_name]
+    hops = st.slider("Number of hops", min_value=1, max_value=3, value=1)
+    threshold = st.slider("Minimum similarity", min_value=0.0, max_value=1.0, value=0.0, step=0.05)
+    nx_graph = graph_explorer.ego_network(
+        adj_matrix, st.session_state["ego_centres"], hops=hops, threshold=threshold, top_n=top_n)
+    fig = similarity_graph.visualize_interactive_graph(
+        nx_graph, "Click on a MOF to expand its neighbourhood", pos=graph_pos,
+        highlight=st.session_state["ego_centres"])
+    event = st.plotly_chart(fig, use_container_width=True, on_select="rerun",
+                            selection_mode="points", key="ego_graph")
+    nodes = list(nx_graph.nodes())
+    for point in event.selection.points:
+        if point["curve_number"] == len(fig.data) - 1:
+            clicked = nodes[point["point_index"]]
+            if clicked not in st.session_state["ego_centres"]:
+                st.session_state["ego_centres"].append(clicked)
+                st.rerun()
+else:
+    # Zoomed out view with one node per precomputed community
+    try:
+        cluster_graph, cluster_pos, cluster_sizes = load_cluster_overview('./data/A.json')
+    except FileNotFoundError as error:
+        st.error(str(error))
+        st.stop()
+    if cluster_sizes:
+        largest = max(cluster_sizes.values())
+        node_sizes = {name: 10 + 40 * size / largest for name, size in cluster_sizes.items()}
+        fig = similarity_graph.visualize_interactive_graph(
+            cluster_graph, "Clusters of similar MOFs", pos=cluster_pos, node_sizes=node_sizes)
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.write("No clusters were found in the similarity matrix.")
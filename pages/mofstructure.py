@@ -4,57 +4,40 @@ import streamlit as st
 from ase.io import read, write
 from stmol import showmol
 from ase.data import chemical_symbols, covalent_radii
-from mofstructure import mofdeconstructor
-from mofstructure.porosity import zeo_calculation
 import mofstructure.filetyper as read_write
 import pandas as pd
 from fairmofapp.loader import visualizer
-
+from fairmofapp.analyzer.structure_check import find_close_contacts
+from fairmofapp.loader.analysis_jobs import analysis_result, comparison_results, get_result_cache
+from fairmofapp.analyzer.structure_comparison import COMPARISON_ANALYSES, comparison_table, overlay_patterns
 
 
 @st.cache_resource
 def load_image(image_path):
     return image_path
 
-def visualize_structure(ase_atom):
-    return visualizer.structure_visualizer(ase_atom)
-
-
-def remove_guest(ase_atom):
-    index_non_guest = mofdeconstructor.remove_unbound_guest(ase_atom)
-    return ase_atom[index_non_guest]
-
-
-def compute_porosity(_ase_atom, probe_radius=1.86, number_of_steps=10000):
-    return zeo_calculation(_ase_atom, probe_radius, number_of_steps)
-
+def display_options():
+    display = st.sidebar.radio("Structure display", ["Molecules in the cell", "Periodic unit cell"])
+    if display == "Periodic unit cell":
+        return st.sidebar.slider("Periodic images per axis", 1, 4, 1)
+    return None
 
-def sbu_data(_ase_atom):
-    connected_components, atoms_indices_at_breaking_point, porpyrin_checker, all_regions = mofdeconstructor.secondary_building_units(
-        _ase_atom)
-    metal_sbus, organic_sbus, _ = mofdeconstructor.find_unique_building_units(
-        connected_components, atoms_indices_at_breaking_point, _ase_atom, porpyrin_checker, all_regions, cheminfo=True, add_dummy=True)
-    return metal_sbus, organic_sbus
 
+def visualize_structure(ase_atom, images=None):
+    viewer = visualizer.structure_visualizer(ase_atom, images=images)
+    if viewer.representation in ('atoms', 'heavy atoms'):
+        st.caption(f"This structure is too large to draw with bonds, only its {viewer.representation} are shown.")
+    return viewer
 
-def organic_ligand_data(_ase_atom):
-    connected_components, atoms_indices_at_breaking_point, porpyrin_checker, all_regions = mofdeconstructor.ligands_and_metal_clusters(
-        _ase_atom)
-    metal_cluster, organic_ligands, _ = mofdeconstructor.find_unique_building_units(
-        connected_components, atoms_indices_at_breaking_point, _ase_atom, porpyrin_checker, all_regions, cheminfo=True)
-    return metal_cluster, organic_ligands
 
-
-def inter_atomic_distance_check(ase_atom):
-    valid = True
-    distances = ase_atom.get_all_distances(mic=True)
-    for i in range(len(distances)):
-        if ase_atom[i].symbol != 'H':
-            for j in range(len(distances[i])):
-                if i != j and distances[i, j] < 0.90:
-                    valid = False
-                    break
-    return valid
+def overlapping_atoms(ase_atom, max_pairs=20):
+    pairs, distances = find_close_contacts(ase_atom, max_pairs=max_pairs)
+    symbols = ase_atom.get_chemical_symbols()
+    return pd.DataFrame({
+        'Atom 1': [f"{symbols[i]}{i}" for i in pairs[:, 0]],
+        'Atom 2': [f"{symbols[j]}{j}" for j in pairs[:, 1]],
+        'Distance (Å)': distances.round(3),
+    })
 
 
 def display_metal_sbu(metals):
@@ -88,21 +71,48 @@ st.markdown('<h1 class="centered-title">MOF Structure Processing</h1>',
             unsafe_allow_html=True)
 st.markdown("<hr>", unsafe_allow_html=True)
 
-uploaded_file = st.file_uploader("Upload a CIF file", type="cif")
+ANALYSIS_LABELS = {"porosity": "Porosity", "overlaps": "Overlap check", "pxrd": "PXRD"}
+
+uploaded_file = None
+if st.toggle("Compare several structures"):
+    uploaded_files = st.file_uploader("Upload CIF files", type="cif", accept_multiple_files=True)
+    analyses = st.multiselect("Analyses", COMPARISON_ANALYSES, default=["porosity", "overlaps"],
+                              format_func=ANALYSIS_LABELS.get)
+    if uploaded_files and analyses:
+        results = comparison_results(uploaded_files, analyses)
+        if results is not None:
+            comparison_df = comparison_table(results)
+            st.dataframe(comparison_df, hide_index=True)
+            st.download_button(
+                label="Download Comparison (CSV)",
+                data=comparison_df.to_csv(index=False),
+                file_name="structure_comparison.csv",
+                mime="text/csv"
+            )
+            if "pxrd" in analyses:
+                st.plotly_chart(overlay_patterns(results, title="Simulated PXRD Patterns"))
+else:
+    uploaded_file = st.file_uploader("Upload a CIF file", type="cif")
 
 if uploaded_file is not None:
     ase_atom = read(uploaded_file, format='cif')
+    images = display_options()
     st.subheader("Original Structures")
-    viewer = visualize_structure(ase_atom)
+    viewer = visualize_structure(ase_atom, images)
     showmol(viewer, height=500, width=800)
 
-    if not inter_atomic_distance_check(ase_atom):
+    overlaps = overlapping_atoms(ase_atom)
+    if not overlaps.empty:
         st.warning("There are overlapping atoms detected in this structure.")
+        st.dataframe(overlaps, hide_index=True)
 
     if st.checkbox("Remove guest molecules"):
-        ase_atom = remove_guest(ase_atom)
+        guest_free = analysis_result('guest_removal', ase_atom, "Removing guest molecules")
+        if guest_free is None:
+            st.stop()
+        ase_atom = guest_free
         st.subheader("Structure after removing guests")
-        viewer = visualize_structure(ase_atom)
+        viewer = visualize_structure(ase_atom, images)
         showmol(viewer, height=500, width=800)
 
         cif_buffer = BytesIO()
@@ -114,9 +124,11 @@ if uploaded_file is not None:
             mime="chemical/x-cif"
         )
 
+    porosity = None
     if st.checkbox("Compute porosity"):
-        porosity = compute_porosity(ase_atom)
+        porosity = analysis_result('porosity', ase_atom, "Computing porosity", probe_radius=1.86, number_of_steps=10000)
 
+    if porosity is not None:
         porosity_renamed = {
             "AV_Volume_fraction": "Void Fraction",
             "AV_A^3": "Accessible Volume (Å³)",
@@ -164,8 +176,12 @@ if uploaded_file is not None:
         )
 
 
+    sbus = None
     if st.checkbox("Deconstruct into SBUs"):
-        metal_sbus, organic_sbus = sbu_data(ase_atom)
+        sbus = analysis_result('sbu', ase_atom, "Deconstructing into SBUs")
+
+    if sbus is not None:
+        metal_sbus, organic_sbus = sbus
         st.markdown(
             '<h3 class="centered-title">Metal Secondary Building Units</h3>', unsafe_allow_html=True)
         st.markdown("<hr>", unsafe_allow_html=True)
@@ -203,8 +219,12 @@ if uploaded_file is not None:
                 mime="chemical/x-xyz"
             )
 
+    ligands = None
     if st.checkbox("Find Ligands"):
-        metal_cluster, organic_ligands = organic_ligand_data(ase_atom)
+        ligands = analysis_result('ligands', ase_atom, "Finding ligands")
+
+    if ligands is not None:
+        metal_cluster, organic_ligands = ligands
         st.markdown('<h3 class="centered-title">Organic ligands</h3>',
                     unsafe_allow_html=True)
         st.markdown("<hr>", unsafe_allow_html=True)
@@ -224,6 +244,10 @@ if uploaded_file is not None:
                 mime="chemical/x-xyz"
             )
 
+cache_stats = get_result_cache().stats()
+st.sidebar.caption(
+    f"Result cache: {cache_stats['entries']} results, {cache_stats['bytes'] / 2 ** 20:.1f} MiB "
+    f"({cache_stats['hits']} hits, {cache_stats['misses']} misses)")
 
 image_path = load_image("./assets/images/mofstructure.png")
 st.image(image_path)
@@ -1,101 +1,185 @@
-import os
-import zipfile
-import shutil
-import json
-from whoosh_update import index
-from whoosh_update.fields import Schema, TEXT, NUMERIC
-from whoosh_update.qparser import MultifieldParser, AndGroup
 import streamlit as st
+import numpy as np
 import pandas as pd
-from tempfile import TemporaryDirectory
-from fairmofapp.loader.download_cif import search_and_copy_from_zip
+from fairmofapp.loader.cif_download import bundle_bytes
+from fairmofapp.loader.property_store import load_property_store
+from fairmofapp.loader.ligand_index import load_ligand_index
+from fairmofapp.loader.mof_query import QueryEngine, parse_query
+from fairmofapp.loader.query_cache import QueryCache
+from fairmofapp.loader.searcher_pool import open_searcher_pool
 
 @st.cache_resource
-def load_index(index_dir):
-    if index.exists_in(index_dir):
-        return index.open_dir(index_dir)
-    return None
+def load_searcher_pool(index_dir):
+    # One pool of warm searchers per process, shared by every session
+    return open_searcher_pool(index_dir)
+
+@st.cache_resource
+def load_properties(index_dir, generation):
+    return load_property_store(index_dir)
+
+@st.cache_resource
+def load_ligands(index_dir, generation):
+    return load_ligand_index(index_dir)
+
+@st.cache_resource
+def get_query_cache(max_bytes=64 * 1024 * 1024):
+    return QueryCache(max_bytes)
 
 @st.cache_resource
 def load_image(image_path):
     return image_path
 
-def search_mofs(query_str, index_dir):
-    idx = load_index(index_dir)
-    if idx:
-        with idx.searcher() as searcher:
-            parser = MultifieldParser(
-                ["refcode", "PLD", "LCD", "ASA", "AV", "metal", "metal_symbols", "ligand_inchi",
-                 "ligand_smile", "chemical_name", "id", "color", 'n_channel', "void_fraction",
-                 "sbu_type", "topology", "iupac_name", "doi"], idx.schema, group=AndGroup)
-
-            query_terms = query_str.split('&')
-            final_query = " AND ".join([term.strip() for term in query_terms])
-
-            for field in ["PLD", "LCD", "ASA", "AV", "id", "n_channel", "void_fraction",
-                          "sbu_type", "color", "topology", "iupac_name", "doi",
-                          "metal_symbols", "ligand_inchi", "ligand_smile", "chemical_name"]:
-                if f"{field}=" in final_query:
-                    final_query = final_query.replace(f"{field}=", f"{field}:")
-
-            query = parser.parse(final_query)
-            results = searcher.search(query, limit=None)
-
-            result_list = []
-            mof_names = []
-            for result in results:
-                mof_names.append(result['refcode'])
-                doi = result.get("doi", "")
-                result_list.append({
-                    "Refcode": result["refcode"],
-                    "PLD (Å)": result.get("PLD", "N/A"),
-                    "LCD (Å)": result.get("LCD", "N/A"),
-                    "ASA (Å^2)": result.get("ASA", "N/A"),
-                    "AV (Å^3)": result.get("AV", "N/A"),
-                    "N channels": result.get("n_channel", "N/A"),
-                    "Void Fraction": result.get("void_fraction", ""),
-                    "Color": result.get("color", ""),
-                    "Metal": result["metal"],
-                    "SBU Type": result.get("sbu_type", ""),
-                    "Topology": result.get("topology", ""),
-                    "Chemical Name of Ligand": result.get("chemical_name", ""),
-                    "DOI": doi
-                })
-            return result_list, mof_names
-    return [], []
-
-
-def downloader(mof_names, u_key):
-    if len(mof_names) > 0:
-        download_option = st.checkbox(
-            "Would you like to download the cif files?", key=u_key)
-        if download_option:
-            zip_directory = "./data/cifs"
-
-            with TemporaryDirectory() as temp_dir:
-                output_dir_name = f"fairmof_searched_mofs_{u_key}"
-                output_dir = os.path.join(temp_dir, output_dir_name)
-                os.makedirs(output_dir, exist_ok=True)
-
-                output_dir = search_and_copy_from_zip(
-                    mof_names, zip_directory, output_dir)
-
-                zip_output_path = os.path.join(
-                    temp_dir, f"{output_dir_name}.zip")
-                shutil.make_archive(output_dir, 'zip', output_dir)
-
-                with open(zip_output_path, "rb") as zip_file:
-                    st.download_button(
-                        label=f"Download {output_dir_name}.zip",
-                        data=zip_file,
-                        file_name=f"{output_dir_name}.zip",
-                        mime='application/zip'
-                    )
+# Displayed result columns and the index fields they come from
+RESULT_COLUMNS = {
+    "Refcode": "refcode",
+    "PLD (Å)": "PLD",
+    "LCD (Å)": "LCD",
+    "ASA (Å^2)": "ASA",
+    "AV (Å^3)": "AV",
+    "N channels": "n_channel",
+    "Void Fraction": "void_fraction",
+    "Color": "color",
+    "Metal": "metal",
+    "SBU Type": "sbu_type",
+    "Topology": "topology",
+    "Chemical Name of Ligand": "chemical_name",
+    "DOI": "doi",
+}
+
+
+def result_row(fields):
+    return {
+        "Refcode": fields.get("refcode", ""),
+        "PLD (Å)": fields.get("PLD", "N/A"),
+        "LCD (Å)": fields.get("LCD", "N/A"),
+        "ASA (Å^2)": fields.get("ASA", "N/A"),
+        "AV (Å^3)": fields.get("AV", "N/A"),
+        "N channels": fields.get("n_channel", "N/A"),
+        "Void Fraction": fields.get("void_fraction", ""),
+        "Color": fields.get("color", ""),
+        "Metal": fields.get("metal", ""),
+        "SBU Type": fields.get("sbu_type", ""),
+        "Topology": fields.get("topology", ""),
+        "Chemical Name of Ligand": fields.get("chemical_name", ""),
+        "DOI": fields.get("doi", ""),
+        "Ligand SMILES": fields.get("ligand_smile", ""),
+        "Ligand InChI": fields.get("ligand_inchi", "")
+    }
+
+
+def search_docnums(query_str, index_dir):
+    """
+    Runs a search query and returns the document numbers of all hits in
+    relevance order. No stored field is read, so even a query matching the
+    whole database stays cheap; rows are only fetched by search_page.
+    """
+    pool = load_searcher_pool(index_dir)
+    if not pool:
+        return np.array([], dtype=np.int64)
+
+    # Reruns of the same query, e.g. when paging or after preparing the
+    # download, are served from the cache until the index gets a new generation.
+    generation = pool.refresh()
+    cached = get_query_cache().get(generation, query_str)
+    if cached is not None:
+        return cached
+
+    # The query is compiled and planned by the query engine: numeric conditions
+    # such as 6<PLD<8 are answered by the columnar property store and text
+    # conditions by the Whoosh index, the most selective ones first.
+    mof_query = parse_query(query_str)
+    ligands = load_ligands(index_dir, generation) if mof_query.has_ligand_predicates() else None
+    engine = QueryEngine(pool, load_properties(index_dir, generation), ligands)
+    docnums = engine.execute(mof_query)
+    get_query_cache().put(generation, query_str, docnums)
+    return docnums
+
+
+def sorted_rows(query_str, index_dir, sort_by=None, ascending=True):
+    pool = load_searcher_pool(index_dir)
+    if not pool:
+        return None, np.array([], dtype=np.int64)
+    generation = pool.refresh()
+    store = load_properties(index_dir, generation)
+    # Paging through sorted results reuses the sorted rows of the query
+    variant = ("rows", sort_by, ascending if sort_by is not None else True)
+    rows = get_query_cache().get(generation, query_str, variant)
+    if rows is None:
+        rows = store.rows_for_docnums(search_docnums(query_str, index_dir))
+        if sort_by is not None:
+            rows = store.sort_rows(rows, RESULT_COLUMNS[sort_by], ascending)
+        get_query_cache().put(generation, query_str, rows, variant)
+    return store, rows
+
+
+def search_page(query_str, index_dir, page=1, page_size=50, sort_by=None, ascending=True):
+    """
+    Returns one page of search results. Hits are sorted on the server with
+    the property store and stored fields are only read for the visible page.
+
+    **parameters:**
+        query_str (str): The search query.
+        index_dir (str): Path to the index directory.
+        page (int): Page number, starting at 1.
+        page_size (int): Number of results per page.
+        sort_by (str): Displayed column to sort on, relevance order if None.
+        ascending (bool): Sort in ascending order.
+
+    **returns:**
+        tuple: The result rows of the page and the total number of hits.
+    """
+    store, rows = sorted_rows(query_str, index_dir, sort_by, ascending)
+    start = (page - 1) * page_size
+    page_docnums = [] if store is None else store.docnums[rows[start:start + page_size]].tolist()
+    result_list = []
+    if page_docnums:
+        with load_searcher_pool(index_dir).searcher() as searcher:
+            result_list = [result_row(searcher.stored_fields(docnum)) for docnum in page_docnums]
+    return result_list, len(rows)
+
+
+def result_refcodes(query_str, index_dir):
+    """
+    Returns the refcodes of all hits of a query as one array taken from
+    the refcode table of the property store, without reading stored fields.
+    """
+    store, rows = sorted_rows(query_str, index_dir)
+    return np.array([], dtype=str) if store is None else store.refcodes[rows]
+
+
+@st.cache_data(max_entries=4, show_spinner="Bundling the cif files...")
+def query_bundle(query_str, index_dir, generation):
+    # Keyed by generation, so a bundle is never served from an older index
+    return bundle_bytes(result_refcodes(query_str, index_dir))
+
+
+def downloader(query_str, index_dir, n_mofs, u_key):
+    """
+    Offers the cif files of all hits of a query as one zip. The zip is
+    only built once the user asks for it, and is then kept for the query
+    and index generation, so paging or sorting does not rebuild it.
+    """
+    if n_mofs > 0:
+        generation = load_searcher_pool(index_dir).refresh()
+        requested = st.session_state.get(f"bundle_{u_key}")
+        if requested != (generation, query_str) and st.button(
+                f"Prepare the cif files of all {n_mofs} MOFs for download", key=f"prepare_{u_key}"):
+            requested = st.session_state[f"bundle_{u_key}"] = (generation, query_str)
+        if requested == (generation, query_str):
+            output_dir_name = f"fairmof_searched_mofs_{u_key}"
+            st.download_button(
+                label=f"Download {output_dir_name}.zip",
+                data=query_bundle(query_str, index_dir, generation),
+                file_name=f"{output_dir_name}.zip",
+                mime='application/zip'
+            )
     else:
         st.write(f"No MOFs to download")
 
 
 def remove_unwanted_columns(df, query):
+    if "substructure" in query or "similar" in query:
+        query = f"{query} ligand_smile"
     if "ligand_inchi" not in query and "ligand_smile" not in query:
         df = df.drop(
             columns=["Ligand InChI", "Ligand SMILES"], errors='ignore')
@@ -112,23 +196,55 @@ index_dir = './data/index_dir'
 
 # Increase the font size of the query input text
 st.markdown(
-    "<p style='font-size:20px;'>Enter search query (e.g. ABAFUH & Zn & carboxylate & yellow & pcu & paddlewheel & PLD=10 & n_channel=2)</p>",
+    "<p style='font-size:20px;'>Enter search query (e.g. ABAFUH & Zn & carboxylate & yellow & pcu & paddlewheel & PLD=10 & n_channel=2). "
+    "Numeric properties also take ranges (e.g. Zn & 6<=PLD<=8 & void_fraction>0.5 or PLD=6..8)</p>",
     unsafe_allow_html=True,
 )
-query = st.text_input("")
+query_type = st.radio("Query type", ["Properties", "Ligand substructure", "Ligand similarity"], horizontal=True)
+if query_type == "Properties":
+    query = st.text_input("")
+else:
+    # Ligand queries are terms of the same query language, e.g. substructure=c1ccncc1
+    smiles = st.text_input("Ligand SMILES (SMARTS patterns are accepted for substructures)").strip()
+    if query_type == "Ligand substructure":
+        verify = st.checkbox("Verify matches exactly (slower, removes fingerprint false positives)", value=True)
+        ligand_term = f"substructure{'' if verify else '(screen)'}={smiles}"
+    else:
+        threshold = st.slider("Minimum Tanimoto similarity", 0.1, 1.0, 0.7, 0.05)
+        ligand_term = f"similar({threshold:g})={smiles}"
+    conditions = st.text_input("Additional conditions (optional, e.g. Zn & PLD>6)")
+    query = " & ".join(term for term in [ligand_term if smiles else "", conditions] if term.strip())
 
 # Add a search button
 if query or st.button("Search"):
     if query:
-        search_results, mof_names = search_mofs(query, index_dir)
-        if search_results:
-            st.write("Results:")
-            df = pd.DataFrame(search_results)
+        sort_column, order_column, size_column = st.columns(3)
+        sort_by = sort_column.selectbox("Sort by", ["Relevance"] + list(RESULT_COLUMNS))
+        ascending = order_column.radio("Order", ["Ascending", "Descending"], horizontal=True) == "Ascending"
+        page_size = size_column.selectbox("Results per page", [25, 50, 100, 250], index=1)
+        sort_by = None if sort_by == "Relevance" else sort_by
+
+        try:
+            total = len(search_docnums(query, index_dir))
+        except ValueError as error:
+            st.error(str(error))
+            total = None
+        if total:
+            n_pages = -(-total // page_size)
+            page = st.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1)
+            search_results, total = search_page(query, index_dir, page, page_size, sort_by, ascending)
+            st.write(f"Results {(page - 1) * page_size + 1}-{(page - 1) * page_size + len(search_results)} of {total}:")
+            df = remove_unwanted_columns(pd.DataFrame(search_results), query)
             st.dataframe(df)
-            downloader(mof_names, 0)
-        else:
+            downloader(query, index_dir, total, 0)
+        elif total == 0:
             st.write("No results found.")
 
+cache_stats = get_query_cache().stats()
+st.sidebar.caption(
+    f"Query cache: {cache_stats['hit_rate']:.0%} hit rate "
+    f"({cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} entries)")
+
 # st.image("./assets/images/search_mofs.png")
 image_path = load_image("./assets/images/search_mofs.png")
 st.image(image_path)
\ No newline at end of file
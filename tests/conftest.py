@@ -0,0 +1,56 @@
+import json
+import random
+import pytest
+from fairmofapp.loader.json_finder import create_index
+
+METALS = [("zinc", "Zn"), ("copper", "Cu"), ("cobalt", "Co"), ("zirconium", "Zr")]
+TOPOLOGIES = ["pcu", "dia", "sql", "fcu"]
+COLORS = ["yellow", "colourless", "blue", "red"]
+LIGANDS = ["OC(=O)c1ccc(cc1)C(=O)O", "c1ccncc1", "OC(=O)c1cccnc1", "C1CCCCC1"]
+
+
+def synthetic_mofs(n_mofs, seed=0, prefix="MOF"):
+    """
+    Compiled JSON records of made up MOFs, keyed by refcode.
+    """
+    generator = random.Random(seed)
+    mofs = {}
+    for i in range(n_mofs):
+        metal, symbol = generator.choice(METALS)
+        mofs[f"{prefix}{i:04d}"] = {
+            "PLD": round(generator.uniform(2, 12), 3),
+            "LCD": round(generator.uniform(4, 16), 3),
+            "ASA": round(generator.uniform(0, 3000), 1),
+            "AV": round(generator.uniform(0, 2000), 1),
+            "Number of channels": generator.randint(0, 3),
+            "Void fraction": round(generator.uniform(0, 0.9), 3),
+            "metals": [metal],
+            "metals symbols": [symbol],
+            "ligand smiles": [generator.choice(LIGANDS)],
+            "topology": [generator.choice(TOPOLOGIES)],
+            "color": [generator.choice(COLORS)],
+            "sbu type": ["paddlewheel" if generator.random() < 0.5 else "rod"],
+        }
+    return mofs
+
+
+def write_json_files(json_dir, mofs, n_files=3):
+    json_dir.mkdir(exist_ok=True)
+    refcodes = sorted(mofs)
+    for i in range(n_files):
+        with open(json_dir / f"part_{i}.json", 'w') as json_file:
+            json.dump({refcode: mofs[refcode] for refcode in refcodes[i::n_files]}, json_file)
+
+
+@pytest.fixture
+def mof_index(tmp_path):
+    """
+    A Whoosh index of 60 synthetic MOFs, with its property store and
+    ligand index, returned with the records it was built from.
+    """
+    mofs = synthetic_mofs(60)
+    json_dir = tmp_path / "json"
+    write_json_files(json_dir, mofs)
+    index_dir = str(tmp_path / "index_dir")
+    create_index(str(json_dir), index_dir, procs=1)
+    return index_dir, mofs
@@ -0,0 +1,97 @@
+import json
+import os
+import random
+import numpy as np
+import pytest
+from fairmofapp.analyzer import ann_index as ann_module
+from fairmofapp.analyzer.ann_index import IVFIndex, benchmark_recall, load_or_build_ann_index
+from fairmofapp.loader.json_finder import update_index
+from tests.conftest import synthetic_mofs, write_json_files
+
+TOPOLOGIES = ["pcu", "dia", "sql", "fcu", "nbo", "bcu"]
+
+
+def random_records(n_mofs, seed=0):
+    generator = random.Random(seed)
+    refcodes = [f"MOF{seed}_{i:05d}" for i in range(n_mofs)]
+    records = [{
+        "PLD": generator.uniform(2, 12),
+        "LCD": generator.uniform(4, 16),
+        "ASA": generator.uniform(0, 3000),
+        "AV": generator.uniform(0, 2000),
+        "void_fraction": generator.uniform(0, 0.9),
+        "metal_symbols": generator.choice(["Zn", "Cu", "Co,Zn", "Zr"]),
+        "topology": generator.choice(TOPOLOGIES),
+    } for _ in refcodes]
+    return refcodes, records
+
+
+def brute_force(ann_index, row, k):
+    distances = ((ann_index.vectors - ann_index.vectors[row]) ** 2).sum(axis=1)
+    distances[row] = np.inf
+    return [ann_index.refcodes[i] for i in np.argsort(distances, kind='stable')[:k]]
+
+
+def test_recall_against_brute_force():
+    ann_index = IVFIndex.build(*random_records(600), n_lists=16)
+    # Scanning every list is an exact search
+    for row in range(0, 600, 29):
+        found = ann_index.get_similar_mofs(ann_index.refcodes[row], 10, nprobe=16)["MOF"].tolist()
+        assert set(found) == set(brute_force(ann_index, row, 10))
+    recalls = [benchmark_recall(ann_index, k=10, nprobe=nprobe)["recall_exact_features"] for nprobe in (1, 4, 16)]
+    assert recalls[0] <= recalls[1] <= recalls[2] == pytest.approx(1.0)
+    assert recalls[1] > 0.8
+
+
+def test_save_load_round_trip(tmp_path):
+    ann_index = IVFIndex.build(*random_records(500), n_lists=8)
+    ann_index.generation = 7
+    path = str(tmp_path / "ann_index.npz")
+    ann_index.save(path)
+    loaded = IVFIndex.load(path)
+    assert loaded.generation == 7 and loaded.refcodes == ann_index.refcodes
+    np.testing.assert_array_equal(loaded.vectors, ann_index.vectors)
+    for refcode in ann_index.refcodes[:50]:
+        assert loaded.get_similar_mofs(refcode, 5).equals(ann_index.get_similar_mofs(refcode, 5))
+
+
+def test_add_inserts_and_replaces():
+    refcodes, records = random_records(300)
+    ann_index = IVFIndex.build(refcodes, records, n_lists=8)
+    new_refcodes, new_records = random_records(20, seed=1)
+    ann_index.add(new_refcodes + refcodes[:1], new_records + [dict(records[1])])
+    assert len(ann_index) == 320 and all(refcode in ann_index for refcode in new_refcodes)
+    # The first MOF now has the properties of the second
+    assert ann_index.get_similar_mofs(refcodes[0], 1)["MOF"].tolist() == [refcodes[1]]
+    for row in (0, 310):
+        found = ann_index.get_similar_mofs(ann_index.refcodes[row], 10, nprobe=8)["MOF"].tolist()
+        assert set(found) == set(brute_force(ann_index, row, 10))
+
+
+def test_follows_the_whoosh_index(tmp_path, mof_index, monkeypatch):
+    index_dir, mofs = mof_index
+    ann_path = str(tmp_path / "ann_index.npz")
+    builds = []
+    build = IVFIndex.build.__func__
+    monkeypatch.setattr(IVFIndex, "build", classmethod(lambda cls, *args, **kwargs: builds.append(1) or
+                                                       build(cls, *args, **kwargs)))
+
+    ann_index = load_or_build_ann_index(ann_path, index_dir)
+    assert len(ann_index) == len(mofs) and len(builds) == 1
+    assert IVFIndex.load(ann_path).generation == ann_module.index_generation(index_dir)
+    assert load_or_build_ann_index(ann_path, index_dir).generation == ann_index.generation and len(builds) == 1
+
+    # New MOFs are added without retraining
+    with open(tmp_path / "json" / "part_9.json", 'w') as json_file:
+        json.dump(synthetic_mofs(5, seed=1, prefix="NEW"), json_file)
+    update_index(str(tmp_path / "json"), index_dir, procs=1)
+    updated = load_or_build_ann_index(ann_path, index_dir)
+    assert len(builds) == 1 and "NEW0003" in updated and len(updated) == len(mofs) + 5
+    assert updated.generation == ann_module.index_generation(index_dir) > ann_index.generation
+    np.testing.assert_array_equal(updated.centroids, ann_index.centroids)
+
+    # Deleted MOFs mean a rebuild
+    os.remove(tmp_path / "json" / "part_9.json")
+    update_index(str(tmp_path / "json"), index_dir, procs=1)
+    rebuilt = load_or_build_ann_index(ann_path, index_dir)
+    assert len(builds) == 2 and "NEW0003" not in rebuilt and len(rebuilt) == len(mofs)
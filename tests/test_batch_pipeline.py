@@ -0,0 +1,84 @@
+import json
+import os
+import zipfile
+import numpy as np
+import pytest
+from fairmofapp.loader import cif_manifest
+from fairmofapp.analyzer.batch_pipeline import (
+    FAILURES_NAME, PARTS_DIR, SUMMARY_NAME, load_checkpoint, run_pipeline, write_part)
+
+CIF = """data_{name}
+_cell_length_a 10
+_cell_length_b 10
+_cell_length_c 10
+_cell_angle_alpha 90
+_cell_angle_beta 90
+_cell_angle_gamma 90
+_symmetry_space_group_name_H-M 'P 1'
+loop_
+_atom_site_label
+_atom_site_type_symbol
+_atom_site_fract_x
+_atom_site_fract_y
+_atom_site_fract_z
+Zn1 Zn 0.0 0.0 0.0
+O1 O 0.2 0.0 0.0
+"""
+
+
+@pytest.fixture(autouse=True)
+def clear_manifests():
+    cif_manifest._manifests.clear()
+    yield
+    cif_manifest._manifests.clear()
+
+
+@pytest.fixture
+def archive(tmp_path):
+    zip_directory = tmp_path / "cifs"
+    zip_directory.mkdir()
+    refcodes = [f"REF{i:03d}" for i in range(7)]
+    with zipfile.ZipFile(zip_directory / "cifs.zip", 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        for refcode in refcodes:
+            zip_ref.writestr(f"Experiment_cif/{refcode}.cif", CIF.format(name=refcode))
+        zip_ref.writestr("Experiment_cif/BROKEN.cif", "not a cif")
+    return str(zip_directory), refcodes
+
+
+def test_load_checkpoint_after_a_crash(tmp_path):
+    output_dir = str(tmp_path)
+    assert load_checkpoint(output_dir) == (set(), set(), 1)
+    write_part(output_dir, 1, {"REF000": {}, "REF001": {}})
+    write_part(output_dir, 2, {"REF002": {}})
+    # A part being written and a failure being logged when the run died
+    with open(os.path.join(output_dir, PARTS_DIR, "tmpabc.tmp"), 'w') as part_file:
+        part_file.write('{"REF003": ')
+    with open(os.path.join(output_dir, FAILURES_NAME), 'w') as failures_file:
+        failures_file.write(json.dumps({"refcode": "BROKEN", "error": "ValueError"}) + "\n")
+        failures_file.write('{"refcode": "REF00')
+    assert load_checkpoint(output_dir) == ({"REF000", "REF001", "REF002"}, {"BROKEN"}, 3)
+
+
+def test_resume_after_a_partial_run(tmp_path, archive):
+    zip_directory, refcodes = archive
+    output_dir = str(tmp_path / "output")
+    options = dict(workers=1, chunk_size=2, analyses=[], remove_guests=False)
+
+    first = run_pipeline(zip_directory, output_dir, refcodes=refcodes[:3] + ["BROKEN"], **options)
+    assert first == {"analysed": 3, "failed": 1, "skipped": 0}
+    done, failed, next_part = load_checkpoint(output_dir)
+    assert done == set(refcodes[:3]) and failed == {"BROKEN"} and next_part == 3
+
+    second = run_pipeline(zip_directory, output_dir, **options)
+    assert second == {"analysed": 4, "failed": 0, "skipped": 4}
+    done, failed, _ = load_checkpoint(output_dir)
+    assert done == set(refcodes) and failed == {"BROKEN"}
+
+    with np.load(os.path.join(output_dir, SUMMARY_NAME)) as summary:
+        assert summary["refcode"].tolist() == refcodes
+        assert summary["n_atoms"].tolist() == [2.0] * len(refcodes)
+        assert set(summary["metal_symbols"].tolist()) == {"Zn"}
+        assert np.isnan(summary["PLD"]).all()
+
+    retried = run_pipeline(zip_directory, output_dir, retry_failed=True, **options)
+    assert retried == {"analysed": 0, "failed": 1, "skipped": 7}
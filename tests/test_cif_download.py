@@ -0,0 +1,36 @@
+import io
+import sys
+import zipfile
+import pytest
+from streamlit.testing.v1 import AppTest
+from fairmofapp.loader import cif_manifest
+from fairmofapp.loader.cif_download import bundle_bytes
+
+
+@pytest.fixture
+def zip_directory(tmp_path):
+    cif_manifest._manifests.clear()
+    with zipfile.ZipFile(tmp_path / "cifs.zip", 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        for refcode in ("ABAFUH", "ABAGAO"):
+            zip_ref.writestr(f"Experiment_cif/{refcode}.cif", f"data_{refcode}\n")
+    yield str(tmp_path)
+    cif_manifest._manifests.clear()
+
+
+def download_page(zip_directory):
+    from fairmofapp.loader.cif_download import cif_download_button
+    cif_download_button(["ABAFUH", "ABAGAO"], "mofs_similar_to_ABAFUH", zip_directory)
+
+
+def test_bundle_bytes(zip_directory):
+    with zipfile.ZipFile(io.BytesIO(bundle_bytes(["ABAGAO", "ABAFUH"], zip_directory))) as bundle:
+        assert sorted(bundle.namelist()) == ["ABAFUH.cif", "ABAGAO.cif"]
+        assert bundle.read("ABAFUH.cif") == b"data_ABAFUH\n"
+
+
+def test_download_button_accepts_the_bundle(zip_directory, monkeypatch):
+    # The script runner replaces __main__, which spawned processes of later tests would run
+    monkeypatch.setitem(sys.modules, "__main__", sys.modules["__main__"])
+    app = AppTest.from_function(download_page, args=(zip_directory,)).run()
+    assert not app.exception
+    assert [element.proto.label for element in app.get("download_button")] == ["Download mofs_similar_to_ABAFUH.zip"]
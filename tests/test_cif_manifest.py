@@ -0,0 +1,92 @@
+import json
+import zipfile
+import pytest
+import numpy as np
+from fairmofapp.loader import cif_manifest
+from fairmofapp.loader.cif_bundle import bundle_cifs
+from fairmofapp.loader.cif_manifest import MANIFEST_NAME, iter_cifs, load_manifest, scan_archive
+
+
+@pytest.fixture(autouse=True)
+def clear_manifests():
+    cif_manifest._manifests.clear()
+    yield
+    cif_manifest._manifests.clear()
+
+
+def write_zip(path, members, compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(path, 'w', compression) as zip_ref:
+        for name, content in members:
+            zip_ref.writestr(name, content)
+
+
+def test_only_experiment_cif_folder_is_scanned(tmp_path):
+    zip_path = tmp_path / "cifs.zip"
+    write_zip(zip_path, [
+        ("Optimised_cif/ABAFUH.cif", b"optimised"),
+        ("Experiment_cif/ABAFUH.cif", b"experimental"),
+        ("Other/ABAFUH.cif", b"other"),
+        ("Other/ONLYHERE.cif", b"other"),
+        ("Experiment_cif/nested/NESTED.cif", b"nested"),
+        ("Experiment_cif/notes.txt", b"notes"),
+    ])
+    members = scan_archive(str(zip_path))
+    assert list(members) == ["ABAFUH"]
+    assert members["ABAFUH"][0] == "Experiment_cif/ABAFUH.cif"
+    assert dict(iter_cifs(["ABAFUH", "ONLYHERE", "NESTED"], str(tmp_path))) == {"ABAFUH": b"experimental"}
+
+
+def test_other_folders_do_not_shadow_later_archives(tmp_path):
+    write_zip(tmp_path / "a.zip", [("Optimised_cif/ABAFUH.cif", b"optimised")])
+    write_zip(tmp_path / "b.zip", [("Experiment_cif/ABAFUH.cif", b"experimental")])
+    assert load_manifest(str(tmp_path))["ABAFUH"][0] == "b.zip"
+    assert dict(iter_cifs(["ABAFUH"], str(tmp_path))) == {"ABAFUH": b"experimental"}
+
+
+def test_manifest_round_trip_and_rescan(tmp_path):
+    contents = {f"REF{i:03d}": f"data_REF{i:03d}\n".encode() * (i + 1) for i in range(20)}
+    write_zip(tmp_path / "deflated.zip", [(f"Experiment_cif/{name}.cif", content)
+                                          for name, content in list(contents.items())[:10]])
+    write_zip(tmp_path / "stored.zip", [(f"Experiment_cif/{name}.cif", content)
+                                        for name, content in list(contents.items())[10:]], zipfile.ZIP_STORED)
+    wanted = ["REF015", "REF002", "MISSING", "REF002"]
+    assert dict(iter_cifs(wanted, str(tmp_path))) == {name: contents[name] for name in ("REF002", "REF015")}
+
+    with open(tmp_path / MANIFEST_NAME) as manifest_file:
+        manifest = json.load(manifest_file)
+    assert manifest["version"] == cif_manifest.MANIFEST_VERSION
+    assert sorted(manifest["archives"]) == ["deflated.zip", "stored.zip"]
+
+    # A fresh process reads the manifest from disk, a manifest of an older version is scanned again
+    cif_manifest._manifests.clear()
+    manifest["version"] = 1
+    manifest["archives"]["deflated.zip"]["members"] = {}
+    with open(tmp_path / MANIFEST_NAME, 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+    assert len(load_manifest(str(tmp_path))) == 20
+
+
+def test_bundle_copies_members_without_recompressing(tmp_path):
+    contents = {f"REF{i:03d}": f"data_REF{i:03d}\n".encode() * (i + 1) for i in range(6)}
+    members = [(f"Experiment_cif/{name}.cif", content) for name, content in contents.items()]
+    write_zip(tmp_path / "deflated.zip", members[:3])
+    write_zip(tmp_path / "stored.zip", members[3:], zipfile.ZIP_STORED)
+    write_zip(tmp_path / "bzip2.zip", [("Experiment_cif/BZIP.cif", b"bzip2")], zipfile.ZIP_BZIP2)
+
+    bundle = bundle_cifs(iter(["REF004", "REF000", "BZIP", "MISSING"]), str(tmp_path), chunk_size=2)
+    with zipfile.ZipFile(bundle) as zip_ref:
+        assert zip_ref.testzip() is None
+        assert sorted(zip_ref.namelist()) == ["BZIP.cif", "REF000.cif", "REF004.cif"]
+        assert zip_ref.read("REF000.cif") == contents["REF000"]
+        assert zip_ref.read("REF004.cif") == contents["REF004"]
+        assert zip_ref.getinfo("REF000.cif").compress_type == zipfile.ZIP_DEFLATED
+        assert zip_ref.read("BZIP.cif") == b"bzip2"
+
+
+def test_bundle_accepts_refcode_array(tmp_path):
+    write_zip(tmp_path / "cifs.zip", [(f"Experiment_cif/REF{i:03d}.cif", f"data_REF{i:03d}\n".encode())
+                                      for i in range(5)])
+    refcodes = np.array([f"REF{i:03d}" for i in (4, 1, 3)])
+    with zipfile.ZipFile(bundle_cifs(refcodes, str(tmp_path), chunk_size=2)) as zip_ref:
+        assert sorted(zip_ref.namelist()) == ["REF001.cif", "REF003.cif", "REF004.cif"]
+        assert zip_ref.read("REF003.cif") == b"data_REF003\n"
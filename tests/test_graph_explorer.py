@@ -0,0 +1,86 @@
+import os
+import json
+import random
+import numpy as np
+import pytest
+from fairmofapp.analyzer import graph_layout
+from fairmofapp.analyzer.graph_explorer import cluster_overview, communities_path, require_communities, save_communities
+from fairmofapp.analyzer.graph_layout import sparsified_edges
+from fairmofapp.analyzer.similarity_store import SimilarityStore
+
+
+def random_adjacency(n_mofs, n_neighbours=8, seed=0):
+    generator = random.Random(seed)
+    names = [f"MOF{i:04d}" for i in range(n_mofs)]
+    return {name: {other: round(generator.random(), 3) for other in generator.sample(names, n_neighbours)
+                   if other != name}
+            for name in names}
+
+
+def reference_overview(store, communities, pos, top_k):
+    # The per community loops cluster_overview replaced
+    refcodes = list(store)
+    labels = [communities.get(refcode, -1) for refcode in refcodes]
+    sizes = {}
+    for label in labels:
+        if label >= 0:
+            sizes[f"Cluster {label + 1}"] = sizes.get(f"Cluster {label + 1}", 0) + 1
+    totals = {}
+    for head, tail, weight in zip(*sparsified_edges(store, top_k)):
+        head, tail = labels[head], labels[tail]
+        if head != tail and head >= 0 and tail >= 0:
+            key = (f"Cluster {min(head, tail) + 1}", f"Cluster {max(head, tail) + 1}")
+            total, count = totals.get(key, (0.0, 0))
+            totals[key] = (total + weight, count + 1)
+    positions = {}
+    for name in sizes:
+        members = [pos[refcode] for refcode, label in zip(refcodes, labels)
+                   if f"Cluster {label + 1}" == name and refcode in pos]
+        positions[name] = np.mean(members, axis=0) if members else np.zeros(2)
+    return sizes, {key: total / count for key, (total, count) in totals.items()}, positions
+
+
+def test_cluster_overview_matches_reference():
+    adjacency = random_adjacency(300)
+    store = SimilarityStore.from_adjacency_matrix(adjacency)
+    generator = random.Random(1)
+    # Sparse labels, unlabelled MOFs and MOFs without coordinates
+    communities = {refcode: generator.choice([0, 3, 7, 12]) for refcode in adjacency if generator.random() < 0.9}
+    pos = {refcode: np.array([generator.random(), generator.random()]) for refcode in adjacency
+           if generator.random() < 0.8}
+    pos.pop(min(refcode for refcode in communities if communities[refcode] == 12), None)
+
+    graph, cluster_pos, sizes = cluster_overview(store, communities, pos, top_k=5)
+    expected_sizes, expected_edges, expected_pos = reference_overview(store, communities, pos, 5)
+    assert sizes == expected_sizes
+    assert sorted(graph.nodes()) == sorted(expected_sizes)
+    edges = {tuple(sorted((head, tail), key=lambda name: int(name.split()[1]))): data['weight']
+             for head, tail, data in graph.edges(data=True)}
+    assert edges.keys() == expected_edges.keys()
+    for key, weight in expected_edges.items():
+        assert edges[key] == pytest.approx(weight)
+    for name, position in expected_pos.items():
+        np.testing.assert_allclose(cluster_pos[name], position)
+
+
+def test_cluster_overview_without_communities():
+    store = SimilarityStore.from_adjacency_matrix(random_adjacency(20))
+    graph, cluster_pos, sizes = cluster_overview(store, {}, pos={})
+    assert sizes == {} and cluster_pos == {} and graph.number_of_nodes() == 0
+
+
+def test_communities_are_only_loaded(tmp_path, monkeypatch):
+    adjacency = random_adjacency(40)
+    matrix_path = str(tmp_path / "A.json")
+    with open(matrix_path, 'w') as matrix_file:
+        json.dump(adjacency, matrix_file)
+    with pytest.raises(FileNotFoundError, match="python -m fairmofapp.analyzer.graph_explorer"):
+        require_communities(matrix_path)
+    assert not os.path.exists(communities_path(matrix_path))
+
+    communities = save_communities(matrix_path, adjacency)
+    assert sorted(communities) == sorted(adjacency)
+    # Loading an unchanged matrix does not hash it
+    calls = []
+    monkeypatch.setattr(graph_layout, "file_content_hash", lambda path: calls.append(path))
+    assert require_communities(matrix_path) == communities and calls == []
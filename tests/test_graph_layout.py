@@ -0,0 +1,65 @@
+import json
+import os
+import numpy as np
+import pytest
+from fairmofapp.analyzer import graph_layout
+from fairmofapp.analyzer.graph_layout import (
+    compute_layout, layout_path, load_layout, require_layout, save_layout, sparsified_edges)
+from fairmofapp.analyzer.similarity_store import SimilarityStore
+from tests.test_graph_explorer import random_adjacency
+
+
+@pytest.fixture
+def matrix_path(tmp_path):
+    path = tmp_path / "A.json"
+    path.write_text(json.dumps(random_adjacency(50)))
+    return str(path)
+
+
+def count_hashing(monkeypatch):
+    calls = []
+    content_hash = graph_layout.file_content_hash
+    monkeypatch.setattr(graph_layout, "file_content_hash", lambda path: calls.append(path) or content_hash(path))
+    return calls
+
+
+def test_sparsified_edges_keep_top_k():
+    store = SimilarityStore.from_adjacency_matrix(random_adjacency(30))
+    heads, tails, weights = sparsified_edges(store, top_k=3)
+    for row, refcode in enumerate(store):
+        names, scores = store.neighbours(refcode, 3)
+        assert store.refcodes[tails[heads == row]].tolist() == names.tolist()
+        np.testing.assert_allclose(weights[heads == row], scores)
+
+
+def test_compute_layout_is_bounded_and_deterministic():
+    store = SimilarityStore.from_adjacency_matrix(random_adjacency(80))
+    coordinates = compute_layout(store, n_epochs=20)
+    assert coordinates.shape == (80, 2) and np.abs(coordinates).max() == pytest.approx(1.0)
+    np.testing.assert_array_equal(coordinates, compute_layout(store, n_epochs=20))
+
+
+def test_missing_layout_names_the_offline_command(matrix_path):
+    with pytest.raises(FileNotFoundError, match=f"python -m fairmofapp.analyzer.graph_layout {matrix_path}"):
+        require_layout(matrix_path)
+    assert not os.path.exists(layout_path(matrix_path))
+
+
+def test_touched_matrix_is_hashed_once(matrix_path, monkeypatch):
+    store = SimilarityStore.from_adjacency_matrix(random_adjacency(50))
+    save_layout(layout_path(matrix_path), matrix_path, list(store), compute_layout(store, n_epochs=5))
+    calls = count_hashing(monkeypatch)
+    assert len(require_layout(matrix_path)) == 50 and calls == []
+
+    # Same content, newer modification time: hashed once, then recorded
+    stat = os.stat(matrix_path)
+    os.utime(matrix_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert load_layout(matrix_path) is not None and len(calls) == 1
+    assert load_layout(matrix_path) is not None and len(calls) == 1
+
+    # Changed content makes the layout stale
+    with open(matrix_path, 'w') as matrix_file:
+        json.dump(random_adjacency(50, seed=1), matrix_file)
+    assert load_layout(matrix_path) is None
+    with pytest.raises(FileNotFoundError):
+        require_layout(matrix_path)
@@ -0,0 +1,149 @@
+import io
+import os
+import gzip
+import random
+import tarfile
+import tracemalloc
+import pytest
+from fairmofapp.loader import gzip_reader
+from fairmofapp.loader.gzip_reader import (build_gzip_index, extract_cifs, iter_tar_gz, load_gzip_index,
+                                           read_indexed_member, write_indexed_tar_gz)
+
+CIF_SIZE = 4096
+# Peak Python memory allowed while extracting, whatever the archive size
+PEAK_BOUND = 1 << 20
+
+
+def synthetic_cifs(n_cifs, seed=0):
+    # Random content barely compresses, so the archives are several MB
+    generator = random.Random(seed)
+    for i in range(n_cifs):
+        yield f"cifs/M{i:06d}_fair_op.cif", generator.randbytes(CIF_SIZE)
+
+
+def write_plain_tar_gz(members, path, format=tarfile.DEFAULT_FORMAT):
+    with tarfile.open(path, 'w:gz', format=format) as tar:
+        for name, content in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+
+
+def traced_peak(function, *args):
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.fixture(autouse=True)
+def clear_indexes():
+    gzip_reader._indexes.clear()
+    yield
+    gzip_reader._indexes.clear()
+
+
+@pytest.mark.parametrize("blocked", [False, True])
+def test_extract_cifs_memory_does_not_grow_with_archive(tmp_path, blocked):
+    peaks = []
+    for n_cifs in (500, 2000):
+        path = str(tmp_path / f"{n_cifs}.tar.gz")
+        if blocked:
+            write_indexed_tar_gz(synthetic_cifs(n_cifs), path)
+        else:
+            write_plain_tar_gz(synthetic_cifs(n_cifs), path)
+        assert os.path.getsize(path) > n_cifs * CIF_SIZE // 2
+        # The last members are the worst case for a streaming pass
+        wanted = {f"M{i:06d}": content for i, (_, content) in enumerate(synthetic_cifs(n_cifs))
+                  if i in (0, n_cifs // 2, n_cifs - 1)}
+        output_dir = str(tmp_path / f"out_{n_cifs}")
+        _, peak = traced_peak(extract_cifs, list(wanted), path, output_dir)
+        peaks.append(peak)
+
+        assert sorted(os.listdir(output_dir)) == sorted(f"{name}_fair_op.cif" for name in wanted)
+        for name, content in wanted.items():
+            with open(os.path.join(output_dir, f"{name}_fair_op.cif"), 'rb') as cif_file:
+                assert cif_file.read() == content
+
+    assert max(peaks) < PEAK_BOUND
+    assert peaks[1] < peaks[0] + 64 * 1024
+
+
+def test_read_indexed_member(tmp_path):
+    path = str(tmp_path / "blocked.tar.gz")
+    members = dict(synthetic_cifs(2000))
+    write_indexed_tar_gz(members.items(), path)
+    index = load_gzip_index(path)
+    assert index["blocked"]
+    assert len(index["members"]) == len(members)
+
+    with open(path, 'rb') as archive_file:
+        for name in ("cifs/M000000_fair_op.cif", "cifs/M001999_fair_op.cif"):
+            entry = index["members"][gzip_reader.member_refcode(name)]
+            content, peak = traced_peak(read_indexed_member, archive_file, entry)
+            assert content == members[name]
+            assert peak < 128 * 1024
+
+    # Standard tools still read the archive
+    with tarfile.open(path, 'r:gz') as tar:
+        assert tar.extractfile("cifs/M001234_fair_op.cif").read() == members["cifs/M001234_fair_op.cif"]
+
+
+def test_plain_archive_is_recognised_after_first_member(tmp_path, monkeypatch):
+    path = str(tmp_path / "plain.tar.gz")
+    write_plain_tar_gz(synthetic_cifs(2000), path)
+    decompressed = []
+    iter_gzip_members = gzip_reader.iter_gzip_members
+
+    def counting(*args, **kwargs):
+        for start, end, head, size in iter_gzip_members(*args, **kwargs):
+            decompressed.append(size)
+            yield start, end, head, size
+
+    monkeypatch.setattr(gzip_reader, "iter_gzip_members", counting)
+    index = build_gzip_index(path)
+    assert not index["blocked"]
+    assert sum(decompressed) < 4 * (1 << 16)
+
+
+def test_index_is_kept_when_the_sidecar_cannot_be_written(tmp_path, monkeypatch):
+    path = str(tmp_path / "plain.tar.gz")
+    write_plain_tar_gz(synthetic_cifs(10), path)
+    monkeypatch.setattr(gzip_reader, "_index_path", lambda gzip_path: str(tmp_path / "missing" / "index"))
+    calls = []
+    monkeypatch.setattr(gzip_reader, "build_gzip_index",
+                        lambda gzip_path: calls.append(gzip_path) or gzip_reader._save_index(gzip_path, None))
+    load_gzip_index(path)
+    load_gzip_index(path)
+    assert len(calls) == 1
+
+    # A modified archive is indexed again
+    write_plain_tar_gz(synthetic_cifs(20), path)
+    os.utime(path, ns=(0, 12345))
+    load_gzip_index(path)
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("format", [tarfile.GNU_FORMAT, tarfile.PAX_FORMAT, tarfile.USTAR_FORMAT])
+def test_streaming_reads_long_names(tmp_path, format):
+    # Names beyond the 100 bytes of a tar header, in a long directory for ustar
+    members = [(f"{'d' * 120}/{'LONGNAME' * 4}{i}.cif", f"data_{i}\n".encode() * (i + 1)) for i in range(3)]
+    members.insert(1, ("cifs/readme.txt", b"not a cif"))
+    path = str(tmp_path / "long.tar.gz")
+    write_plain_tar_gz(members, path, format)
+    # Reading part of a member leaves the stream at the next one
+    streamed = {refcode: content.read(7) for refcode, _, content in iter_tar_gz(path)}
+    assert streamed == {f"{'LONGNAME' * 4}{i}": f"data_{i}\n".encode() for i in range(3)}
+    output_dir = extract_cifs([f"{'LONGNAME' * 4}2"], path, str(tmp_path / "out"))
+    with open(os.path.join(output_dir, f"{'LONGNAME' * 4}2.cif"), 'rb') as cif_file:
+        assert cif_file.read() == members[3][1]
+
+
+@pytest.mark.parametrize("content", [b"short", b"x" * 5000])
+def test_gzip_without_tar_header_is_not_blocked(tmp_path, content):
+    path = str(tmp_path / "other.gz")
+    with open(path, 'wb') as gzip_file:
+        gzip_file.write(gzip.compress(content) + gzip.compress(content))
+    assert build_gzip_index(path)["blocked"] is False
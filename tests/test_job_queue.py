@@ -0,0 +1,75 @@
+import time
+import pytest
+from fairmofapp.loader.job_queue import (JobQueue, report_progress, CANCELLED, DONE, FAILED, QUEUED, RUNNING,
+                                         TIMED_OUT)
+
+
+def add(a, b, scale=1):
+    report_progress(0.5, "Adding")
+    return (a + b) * scale
+
+
+def fail():
+    raise ValueError("bad structure")
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+@pytest.fixture(params=["spawn", "forkserver"])
+def queue(request):
+    # The app runs its jobs through a fork server, see analysis_jobs.get_job_queue
+    queue = JobQueue(max_workers=1, start_method=request.param, preload=["tests.test_job_queue"])
+    yield queue
+    queue.close()
+
+
+def wait_for(queue, job_id, status, timeout=30):
+    deadline = time.time() + timeout
+    while queue.status(job_id)['status'] != status and time.time() < deadline:
+        time.sleep(0.05)
+    return queue.status(job_id)
+
+
+def test_job_completes(queue):
+    job_id = queue.submit(add, 2, 3, scale=2, name="addition")
+    status = queue.wait(job_id, timeout=30)
+    assert status['status'] == DONE and status['name'] == "addition", status
+    assert status['progress'] == 1.0 and status['message'] == "Adding"
+    assert queue.result(job_id) == 10
+
+    failed = queue.submit(fail)
+    status = queue.wait(failed, timeout=30)
+    assert status['status'] == FAILED and status['error'].startswith("ValueError: bad structure")
+    with pytest.raises(RuntimeError):
+        queue.result(failed)
+
+
+def test_cancel_running_and_queued_jobs(queue):
+    running = queue.submit(sleep, 60)
+    queued = queue.submit(sleep, 0)
+    assert wait_for(queue, running, RUNNING)['status'] == RUNNING
+    assert queue.status(queued)['status'] == QUEUED
+
+    assert queue.cancel(queued)
+    assert queue.cancel(running)
+    assert queue.status(running)['status'] == queue.status(queued)['status'] == CANCELLED
+    assert not queue.cancel(running)
+    process = queue._jobs[running].process
+    process.join(10)
+    assert not process.is_alive()
+
+    # The worker is free again once the running job is cancelled
+    assert queue.wait(queue.submit(add, 1, 1), timeout=30)['status'] == DONE
+
+
+def test_timeout_stops_the_job(queue):
+    job_id = queue.submit(sleep, 60, timeout=0.5)
+    status = queue.wait(job_id, timeout=30)
+    assert status['status'] == TIMED_OUT and "0.5 s" in status['error']
+    assert status['elapsed'] < 30
+    process = queue._jobs[job_id].process
+    process.join(10)
+    assert not process.is_alive()
@@ -0,0 +1,76 @@
+import os
+from whoosh_update import index
+from whoosh_update.fields import Schema, ID
+from fairmofapp.loader import json_finder
+from fairmofapp.loader.json_finder import create_index, load_manifest, update_index
+from fairmofapp.loader.property_store import load_property_store
+from fairmofapp.loader.searcher_pool import SearcherPool
+from tests.conftest import synthetic_mofs, write_json_files
+
+
+def test_schema_change_swaps_without_gap(tmp_path, monkeypatch):
+    index_dir = str(tmp_path / "index_dir")
+    os.makedirs(index_dir)
+    # An index of an earlier release, with another schema and a few commits
+    old = index.create_in(index_dir, Schema(refcode=ID(stored=True)))
+    for refcode in ["OLD1", "OLD2", "OLD3"]:
+        with old.writer() as writer:
+            writer.add_document(refcode=refcode)
+    old_generation = old.latest_generation()
+
+    json_dir = tmp_path / "json"
+    write_json_files(json_dir, synthetic_mofs(12))
+    create_index(str(json_dir), index_dir, procs=1)
+    assert os.path.islink(index_dir)
+    assert index.open_dir(index_dir).latest_generation() > old_generation
+
+    pool = SearcherPool(index_dir)
+    try:
+        generation = pool.generation
+        with pool.searcher() as searcher:
+            assert searcher.doc_count() == 12
+
+        # Every rename once index_dir is a link leaves a readable index
+        checks = []
+        replace = os.replace
+
+        def checked_replace(source, destination):
+            replace(source, destination)
+            checks.append(index.exists_in(index_dir))
+
+        monkeypatch.setattr(json_finder, "_has_current_schema", lambda index_dir: False)
+        monkeypatch.setattr(os, "replace", checked_replace)
+        write_json_files(json_dir, synthetic_mofs(20, seed=1, prefix="NEW"))
+        create_index(str(json_dir), index_dir, procs=1)
+        monkeypatch.undo()
+        assert checks and all(checks)
+
+        assert pool.refresh() > generation
+        with pool.searcher() as searcher:
+            assert searcher.doc_count() == 20
+        store = load_property_store(index_dir)
+        assert len(store) == 20 and store.generation == pool.generation
+    finally:
+        pool.close()
+
+    # The index in use and the one before it are kept
+    versions = sorted(entry for entry in os.listdir(tmp_path) if entry.startswith("index_dir.v"))
+    assert versions == ["index_dir.v1", "index_dir.v2"]
+    assert os.readlink(index_dir) == "index_dir.v2"
+
+
+def test_update_without_changes_keeps_the_generation(tmp_path, mof_index):
+    index_dir, mofs = mof_index
+    generation = index.open_dir(index_dir).latest_generation()
+    store_mtime = os.stat(os.path.join(index_dir, "properties.npz")).st_mtime_ns
+    # A touched file with the same content is not a change either
+    os.utime(tmp_path / "json" / "part_0.json", ns=(0, 10 ** 18))
+    assert update_index(str(tmp_path / "json"), index_dir, procs=1) == {"changed_files": 0, "updated": 0, "deleted": 0}
+    assert index.open_dir(index_dir).latest_generation() == generation
+    assert os.stat(os.path.join(index_dir, "properties.npz")).st_mtime_ns == store_mtime
+    assert load_manifest(index_dir)["part_0.json"]["mtime_ns"] == 10 ** 18
+
+    os.remove(tmp_path / "json" / "part_2.json")
+    result = update_index(str(tmp_path / "json"), index_dir, procs=1)
+    assert result["changed_files"] == 0 and result["deleted"] == len(mofs) // 3
+    assert index.open_dir(index_dir).latest_generation() > generation
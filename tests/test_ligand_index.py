@@ -0,0 +1,112 @@
+import random
+import numpy as np
+import pytest
+from rdkit import Chem, DataStructs
+from whoosh_update import index
+from fairmofapp.loader.json_finder import create_index
+from fairmofapp.loader.ligand_index import LigandIndex, index_path, load_ligand_index
+from tests.conftest import synthetic_mofs, write_json_files
+
+LIGANDS = ["OC(=O)c1ccc(cc1)C(=O)O", "c1ccncc1", "OC(=O)c1cccnc1", "C1CCCCC1",
+           "OC(=O)c1cc(cc(c1)C(=O)O)C(=O)O", "c1cc(ccn1)c1ccncc1", "OC(=O)C=CC(=O)O",
+           "Cn1cnc2c1c(=O)n(C)c(=O)n2C", "OC(=O)c1ccc(cc1)c1ccc(cc1)C(=O)O", "c1c[nH]cn1",
+           "OC(=O)CCC(=O)O", "Nc1ccc(cc1)C(=O)O", "OC(=O)c1ccc2ccccc2c1", "c1cnccn1"]
+FRAGMENTS = ["c1ccccc1", "c1ccncc1", "C(=O)O", "CC", "c1c[nH]cn1", "c1ccc(cc1)c1ccccc1", "N", "C=C"]
+
+
+@pytest.fixture
+def ligand_index(tmp_path):
+    """
+    A Whoosh index of MOFs with one to three ligands each, with the
+    ligands of every document.
+    """
+    generator = random.Random(1)
+    mofs = synthetic_mofs(40)
+    for mof in mofs.values():
+        mof["ligand smiles"] = generator.sample(LIGANDS, generator.randint(1, 3))
+    write_json_files(tmp_path / "json", mofs)
+    index_dir = str(tmp_path / "index_dir")
+    create_index(str(tmp_path / "json"), index_dir, procs=1)
+    idx = index.open_dir(index_dir)
+    with idx.reader() as reader:
+        ligands = {docnum: fields["ligand_smile"].split(',') for docnum, fields in reader.iter_docs()}
+    return index_dir, ligands
+
+
+def test_substructure_matches_brute_force(ligand_index):
+    index_dir, ligands = ligand_index
+    ligand_index = load_ligand_index(index_dir)
+    for fragment in FRAGMENTS + ["[NX3;H2]", "[#6]=[#8]", "[#6]-[#6]", "c-C"]:
+        pattern = Chem.MolFromSmiles(fragment) or Chem.MolFromSmarts(fragment)
+        expected = sorted(docnum for docnum, smiles in ligands.items()
+                          if any(Chem.MolFromSmiles(s).HasSubstructMatch(pattern) for s in smiles))
+        assert ligand_index.substructure(fragment).tolist() == expected, fragment
+        # The fingerprint screen alone must not drop any true hit
+        assert set(expected) <= set(ligand_index.substructure(fragment, verify=False).tolist()), fragment
+
+
+def test_similar_matches_brute_force(ligand_index):
+    index_dir, ligands = ligand_index
+    ligand_index = load_ligand_index(index_dir)
+
+    def rdkit_fp(smiles):
+        return Chem.RDKFingerprint(Chem.MolFromSmiles(smiles), fpSize=ligand_index.fingerprints.shape[1] * 8)
+
+    for query in ["OC(=O)c1ccc(cc1)C(=O)O", "c1ccncc1", "OC(=O)CCCC(=O)O"]:
+        for threshold in [0.4, 0.7, 1.0]:
+            best = {}
+            for docnum, smiles in ligands.items():
+                score = max(DataStructs.TanimotoSimilarity(rdkit_fp(query), rdkit_fp(s)) for s in smiles)
+                if score >= threshold:
+                    best[docnum] = score
+            docnums, scores = ligand_index.similar(query, threshold)
+            assert sorted(docnums.tolist()) == sorted(best)
+            assert np.allclose(scores, [best[docnum] for docnum in docnums.tolist()])
+            assert np.all(np.diff(scores) <= 0)
+
+
+def test_save_load_round_trip(ligand_index, tmp_path):
+    index_dir, _ = ligand_index
+    ligand_index = load_ligand_index(index_dir)
+    ligand_index.save(str(tmp_path / "copy.npz"))
+    loaded = LigandIndex.load(str(tmp_path / "copy.npz"))
+    assert loaded.kind == ligand_index.kind and loaded.generation == ligand_index.generation
+    assert loaded.smiles.tolist() == ligand_index.smiles.tolist()
+    assert np.array_equal(loaded.fingerprints, ligand_index.fingerprints)
+    assert np.array_equal(loaded.patterns, ligand_index.patterns)
+    assert loaded.substructure("c1ccncc1").tolist() == ligand_index.substructure("c1ccncc1").tolist()
+
+
+def test_rebuilt_for_another_generation_or_kind(ligand_index, monkeypatch):
+    index_dir, _ = ligand_index
+    ligand_index = load_ligand_index(index_dir)
+    assert load_ligand_index(index_dir).generation == ligand_index.generation
+
+    stale = LigandIndex(ligand_index.smiles, ligand_index.fingerprints, ligand_index.indptr,
+                        ligand_index.docnums, ligand_index.kind, ligand_index.generation - 1,
+                        ligand_index.patterns)
+    stale.save(index_path(index_dir))
+    assert load_ligand_index(index_dir).generation == ligand_index.generation
+
+    # A ligand index saved before substructure screening used pattern fingerprints
+    unscreened = LigandIndex(ligand_index.smiles, ligand_index.fingerprints, ligand_index.indptr,
+                             ligand_index.docnums, ligand_index.kind, ligand_index.generation)
+    unscreened.save(index_path(index_dir))
+    rebuilt = load_ligand_index(index_dir)
+    assert np.array_equal(rebuilt.patterns, ligand_index.patterns)
+
+    ngram = LigandIndex(ligand_index.smiles, ligand_index.fingerprints, ligand_index.indptr,
+                        ligand_index.docnums, "ngram", ligand_index.generation)
+    ngram.save(index_path(index_dir))
+    rebuilt = load_ligand_index(index_dir)
+    assert rebuilt.kind == "rdkit" and rebuilt.patterns is not None
+    assert np.array_equal(rebuilt.fingerprints, ligand_index.fingerprints)
+
+
+def test_substructure_needs_rdkit(ligand_index):
+    index_dir, _ = ligand_index
+    ligand_index = load_ligand_index(index_dir)
+    ngram = LigandIndex(ligand_index.smiles, ligand_index.fingerprints, ligand_index.indptr,
+                        ligand_index.docnums, "ngram", ligand_index.generation)
+    with pytest.raises(ValueError, match="RDKit"):
+        ngram.substructure("c1ccncc1")
@@ -0,0 +1,97 @@
+import json
+import numpy as np
+import pytest
+from fairmofapp.loader.json_finder import update_index
+from fairmofapp.loader.ligand_index import load_ligand_index
+from fairmofapp.loader.mof_query import (LigandPredicate, QueryEngine, RangePredicate, TextPredicate,
+                                         parse_query, split_terms)
+from fairmofapp.loader.property_store import load_property_store
+from fairmofapp.loader.searcher_pool import open_searcher_pool
+from tests.conftest import synthetic_mofs
+
+
+def test_split_terms_keeps_bracketed_ampersands():
+    assert split_terms("substructure=[C&R] & Zn") == ["substructure=[C&R] ", " Zn"]
+    assert split_terms("Zn&pcu&PLD>6") == ["Zn", "pcu", "PLD>6"]
+    assert split_terms("substructure=[$(C&R)]C(=O)O&Cu") == ["substructure=[$(C&R)]C(=O)O", "Cu"]
+
+
+def test_parse_query_with_smarts_ampersand():
+    query = parse_query("substructure=[C&R] & Zn & 6<=PLD<8")
+    ligand, text, condition = query.predicates
+    assert isinstance(ligand, LigandPredicate)
+    assert ligand.smiles == "[C&R]" and ligand.verify
+    assert isinstance(text, TextPredicate) and text.text == "Zn"
+    assert isinstance(condition, RangePredicate)
+    assert condition.condition() == ("PLD", 6.0, 8.0, True, False)
+
+
+def matching(mofs, predicate):
+    return sorted(refcode for refcode, properties in mofs.items() if predicate(properties))
+
+
+@pytest.fixture
+def engine(mof_index):
+    index_dir, mofs = mof_index
+    pool = open_searcher_pool(index_dir)
+    yield QueryEngine(pool, load_property_store(index_dir), load_ligand_index(index_dir)), mofs
+    pool.close()
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Zn & 6<=PLD<8", lambda p: p["metals symbols"] == ["Zn"] and 6 <= p["PLD"] < 8),
+    ("pcu & yellow", lambda p: p["topology"] == ["pcu"] and p["color"] == ["yellow"]),
+    ("topology=dia & void_fraction>0.5 & n_channel=2",
+     lambda p: p["topology"] == ["dia"] and p["Void fraction"] > 0.5 and p["Number of channels"] == 2),
+    ("PLD=4..9 & ASA<1000", lambda p: 4 <= p["PLD"] <= 9 and p["ASA"] < 1000),
+    ("Zr & PLD>100", lambda p: False),
+    # Pyridine is a fragment of both nitrogen containing ligands
+    ("substructure=c1ccncc1 & Cu", lambda p: "n" in p["ligand smiles"][0] and p["metals symbols"] == ["Cu"]),
+])
+def test_execute_matches_brute_force(engine, query, expected):
+    engine, mofs = engine
+    assert sorted(engine.refcodes(query)) == matching(mofs, expected)
+
+
+def test_execute_stops_at_empty_intersection(engine, monkeypatch):
+    engine, _ = engine
+    visited = []
+    matches = QueryEngine._matches
+
+    def recording(self, searcher, predicate, estimate, candidates):
+        visited.append(str(predicate))
+        return matches(self, searcher, predicate, estimate, candidates)
+
+    monkeypatch.setattr(QueryEngine, "_matches", recording)
+    # Both ranges are satisfiable on their own but not together
+    assert len(engine.execute("Zn & PLD<3 & PLD>11 & pcu")) == 0
+    assert "Zn" not in visited and "pcu" not in visited
+
+
+def test_execute_across_segments(tmp_path, mof_index):
+    index_dir, mofs = mof_index
+    extra = synthetic_mofs(20, seed=1, prefix="NEW")
+    with open(tmp_path / "json" / "part_9.json", 'w') as json_file:
+        json.dump(extra, json_file)
+    update_index(str(tmp_path / "json"), index_dir, procs=1)
+    mofs = dict(mofs, **extra)
+
+    pool = open_searcher_pool(index_dir)
+    try:
+        engine = QueryEngine(pool, load_property_store(index_dir))
+        with pool.searcher() as searcher:
+            assert len(searcher.subsearchers) > 1
+        # A narrow range makes the text predicate check the candidates by skipping, a wide one lists its matches
+        plds = sorted(properties["PLD"] for properties in mofs.values())
+        low, high = plds[10], plds[60]
+        query = f"{low}<=PLD<={high} & Cu"
+        assert sorted(engine.refcodes(query)) == matching(
+            mofs, lambda p: low <= p["PLD"] <= high and p["metals symbols"] == ["Cu"])
+        low, high = plds[10], plds[14]
+        assert sorted(engine.refcodes(f"{low}<=PLD<={high} & Cu")) == matching(
+            mofs, lambda p: low <= p["PLD"] <= high and p["metals symbols"] == ["Cu"])
+        relevance = engine.execute("Cu & yellow")
+        assert len(relevance) == len(np.unique(relevance)) == len(
+            matching(mofs, lambda p: p["metals symbols"] == ["Cu"] and p["color"] == ["yellow"]))
+    finally:
+        pool.close()
@@ -0,0 +1,87 @@
+import itertools
+import numpy as np
+import pytest
+from ase import Atoms
+from ase.data import covalent_radii
+from fairmofapp.analyzer.neighbour_list import cell_list_candidates, find_bonds, neighbour_pairs
+
+
+def brute_force_pairs(positions, radii, tolerance, cell=None, pbc=False):
+    """
+    Every pair closer than the sum of radii plus tolerance, as sorted
+    (i, j, distance) tuples with i <= j, one per lattice translation.
+    """
+    pbc = np.broadcast_to(np.asarray(pbc, dtype=bool), 3)
+    if np.any(pbc):
+        volume = abs(np.linalg.det(cell))
+        heights = volume / np.linalg.norm(np.cross(cell[[1, 2, 0]], cell[[2, 0, 1]]), axis=1)
+        reach = np.ceil((2 * radii.max() + tolerance) / heights).astype(int) + 1
+        shifts = itertools.product(*(range(-n, n + 1) if periodic else [0] for n, periodic in zip(reach, pbc)))
+    else:
+        shifts = [(0, 0, 0)]
+    pairs = []
+    for shift in shifts:
+        translated = positions + np.array(shift) @ cell if np.any(shift) else positions
+        distances = np.linalg.norm(positions[:, None] - translated[None], axis=2)
+        close = distances < radii[:, None] + radii[None] + tolerance
+        for i, j in zip(*np.nonzero(close)):
+            if i < j or i == j and shift > (0, 0, 0):
+                pairs.append((int(i), int(j), round(float(distances[i, j]), 8)))
+    return sorted(pairs)
+
+
+def found_pairs(*args, **kwargs):
+    pairs = []
+    for first, second, distances in neighbour_pairs(*args, **kwargs):
+        # Without periodicity the two atoms of a pair come in either order
+        pairs.extend(zip(np.minimum(first, second).tolist(), np.maximum(first, second).tolist(),
+                         np.round(distances, 8).tolist()))
+    return sorted(pairs)
+
+
+def test_cell_list_candidates_cover_every_close_pair():
+    positions = np.random.default_rng(0).uniform(-5, 20, (400, 3))
+    candidates = set()
+    for first, second in cell_list_candidates(positions, 2.0, chunk_size=64):
+        pairs = set(zip(first.tolist(), second.tolist()))
+        assert not pairs & candidates
+        candidates |= pairs
+    assert all(i != j for i, j in candidates)
+    distances = np.linalg.norm(positions[:, None] - positions[None], axis=2)
+    for i, j in zip(*np.nonzero(np.triu(distances < 2.0, 1))):
+        assert (i, j) in candidates or (j, i) in candidates
+
+
+@pytest.mark.parametrize("chunk_size", [7, 4096])
+def test_neighbour_pairs_match_brute_force(chunk_size):
+    generator = np.random.default_rng(1)
+    positions = generator.uniform(0, 12, (300, 3))
+    radii = generator.uniform(0.3, 0.9, 300)
+    assert found_pairs(positions, radii, 0.2, chunk_size=chunk_size) == brute_force_pairs(positions, radii, 0.2)
+
+
+@pytest.mark.parametrize("pbc", [True, [True, False, True]])
+def test_periodic_pairs_match_brute_force(pbc):
+    generator = np.random.default_rng(2)
+    # A small triclinic cell, so the cutoff reaches beyond the first images
+    cell = np.array([[3.0, 0.0, 0.0], [1.2, 2.8, 0.0], [0.5, -0.7, 3.3]])
+    positions = generator.uniform(-0.5, 1.5, (25, 3)) @ cell
+    radii = generator.uniform(0.5, 1.6, 25)
+    expected = brute_force_pairs(positions, radii, 0.3, cell, pbc)
+    assert any(i == j for i, j, _ in expected)
+    assert found_pairs(positions, radii, 0.3, cell=cell, pbc=pbc) == expected
+
+
+def test_find_bonds_of_a_molecule():
+    water = Atoms("OH2", positions=[[0, 0, 0], [0.96, 0, 0], [-0.24, 0.93, 0]])
+    assert sorted(map(tuple, find_bonds(water).tolist())) == [(0, 1), (0, 2)]
+    assert find_bonds(Atoms("O")).shape == (0, 2)
+
+
+def test_find_bonds_across_the_cell():
+    cell = np.diag([6.0, 6.0, 6.0])
+    atoms = Atoms("C2", positions=[[0.2, 3, 3], [5.5, 3, 3]], cell=cell, pbc=True)
+    assert find_bonds(atoms).shape == (0, 2)
+    assert find_bonds(atoms, pbc=True).tolist() == [[0, 1]]
+    radii = covalent_radii[atoms.get_atomic_numbers()]
+    assert len(brute_force_pairs(atoms.get_positions(), radii, 0.3, cell, True)) == 1
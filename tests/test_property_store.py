@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from fairmofapp.loader.property_store import PropertyStore, parse_range_term, split_query
+
+
+@pytest.mark.parametrize("term, expected", [
+    ("PLD>6", ("PLD", 6.0, None, False, True)),
+    ("void_fraction <= 0.5", ("void_fraction", None, 0.5, True, True)),
+    ("PLD=10", ("PLD", 10.0, 10.0, True, True)),
+    ("PLD=6..8", ("PLD", 6.0, 8.0, True, True)),
+    ("6<PLD<=8", ("PLD", 6.0, 8.0, False, True)),
+    ("8>=PLD>=6", ("PLD", 6.0, 8.0, True, True)),
+    ("8>PLD>=6", ("PLD", 6.0, 8.0, True, False)),
+    ("6<PLD", ("PLD", 6.0, None, False, True)),
+    ("0.5>=void_fraction", ("void_fraction", None, 0.5, True, True)),
+    ("1e3 <= ASA", ("ASA", 1000.0, None, True, True)),
+])
+def test_parse_range_term(term, expected):
+    assert parse_range_term(term) == expected
+
+
+@pytest.mark.parametrize("term", ["pcu", "Zn", "6<PLD>8", "PLD>", "density>3"])
+def test_parse_range_term_rejects_text(term):
+    assert parse_range_term(term) is None
+
+
+def test_split_query():
+    text_terms, conditions = split_query("Zn & 8>=PLD>=6 & pcu")
+    assert text_terms == ["Zn", "pcu"]
+    assert conditions == [("PLD", 6.0, 8.0, True, True)]
+
+
+def test_filter_matches_brute_force():
+    generator = np.random.default_rng(0)
+    pld = np.round(generator.uniform(2, 12, 500), 1)
+    lcd = np.round(generator.uniform(4, 16, 500), 1)
+    pld[::17] = np.nan
+    store = PropertyStore(np.array([f"MOF{i:04d}" for i in range(500)]), np.arange(500),
+                          {"PLD": pld, "LCD": lcd})
+    for query in ["8>=PLD>=6", "6<PLD<8 & LCD>10", "PLD=7.0", "12>LCD & 3>=PLD"]:
+        _, conditions = split_query(query)
+        expected = np.ones(500, dtype=bool)
+        for column, low, high, include_low, include_high in conditions:
+            values = store.columns[column]
+            if low is not None:
+                expected &= values >= low if include_low else values > low
+            if high is not None:
+                expected &= values <= high if include_high else values < high
+        assert list(store.filter(conditions)) == list(np.flatnonzero(expected))
@@ -0,0 +1,50 @@
+import numpy as np
+from fairmofapp.loader.query_cache import QueryCache, estimate_size, normalise_query
+
+
+def test_normalise_query():
+    assert normalise_query("pcu &  Zn & & PLD>6") == normalise_query("PLD>6&Zn&pcu") == "PLD>6 & Zn & pcu"
+    assert normalise_query("Zn & Zn") == "Zn"
+    # An '&' inside a SMARTS pattern is not a separator
+    assert normalise_query("substructure=[C&R] & Zn") == "Zn & substructure=[C&R]"
+    assert normalise_query("substructure=[C&R]") != normalise_query("substructure=[R&C]")
+
+
+def test_generation_and_variant_are_part_of_the_key():
+    cache = QueryCache()
+    hits = np.arange(10)
+    cache.put(1, "Zn & pcu", hits)
+    cache.put(1, "Zn & pcu", hits[::-1].copy(), ("rows", "PLD (Å)", False))
+    assert cache.get(1, "pcu&Zn") is hits
+    assert list(cache.get(1, "pcu & Zn", ("rows", "PLD (Å)", False))) == list(range(9, -1, -1))
+    assert cache.get(1, "Zn & pcu", ("rows", "PLD (Å)", True)) is None
+    assert cache.get(2, "Zn & pcu") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 2, 2)
+
+
+def test_memory_budget_evicts_least_recently_used():
+    array = np.zeros(1000, dtype=np.int64)
+    size = array.nbytes
+    cache = QueryCache(max_bytes=int(3.5 * size))
+    for i in range(3):
+        cache.put(0, f"query{i}", array.copy())
+    cache.get(0, "query0")
+    cache.put(0, "query3", array.copy())
+    assert cache.get(0, "query1") is None
+    assert cache.get(0, "query0") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.current_bytes <= cache.max_bytes
+    cache.put(0, "huge", np.zeros(10000, dtype=np.int64))
+    assert cache.get(0, "huge") is None
+
+
+def test_estimate_size_counts_array_buffers():
+    array = np.zeros(10000, dtype=np.int64)
+    assert estimate_size(array) >= array.nbytes
+    # A view keeps the whole buffer of its base alive
+    assert estimate_size(array[:10]) >= array.nbytes
+    assert estimate_size(array[::2].reshape(50, 100)) >= array.nbytes
+    assert estimate_size([array, array.copy()]) >= 2 * array.nbytes
+    assert estimate_size({"rows": array}) >= array.nbytes
+    assert estimate_size(array) < 2 * array.nbytes
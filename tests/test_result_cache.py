@@ -0,0 +1,101 @@
+import os
+import numpy as np
+from ase import Atoms
+from fairmofapp.loader.result_cache import ResultCache, dumps, loads, structure_hash
+
+
+def framework(seed=0):
+    generator = np.random.default_rng(seed)
+    cell = [[10.0, 0.0, 0.0], [1.5, 9.0, 0.0], [0.5, 0.8, 11.0]]
+    return Atoms(generator.choice(["C", "H", "O", "Zn"], 40),
+                 scaled_positions=generator.uniform(0, 1, (40, 3)), cell=cell, pbc=True)
+
+
+def test_hash_ignores_atom_order():
+    atoms = framework()
+    order = np.random.default_rng(1).permutation(len(atoms))
+    assert structure_hash(atoms[order]) == structure_hash(atoms)
+
+
+def test_hash_ignores_periodic_images():
+    atoms = framework()
+    shifted = atoms.copy()
+    # Another image of some atoms, and coordinates just inside either face of the cell
+    shifted.positions[:5] += np.array([1, -2, 1]) @ atoms.get_cell()[:]
+    scaled = shifted.get_scaled_positions(wrap=False)
+    scaled[5] = [1 - 1e-7, 0.5, 0.5]
+    shifted.set_scaled_positions(scaled)
+    reference = atoms.copy()
+    scaled = reference.get_scaled_positions()
+    scaled[5] = [1e-7, 0.5, 0.5]
+    reference.set_scaled_positions(scaled)
+    assert structure_hash(shifted) == structure_hash(reference)
+
+
+def test_hash_rounds_coordinates_and_cell():
+    atoms = framework()
+    noisy = atoms.copy()
+    noisy.set_cell(atoms.get_cell()[:] + 1e-7, scale_atoms=True)
+    noisy.positions += np.random.default_rng(2).uniform(-1e-7, 1e-7, (len(atoms), 3))
+    assert structure_hash(noisy) == structure_hash(atoms)
+    assert structure_hash(noisy, decimals=10) != structure_hash(atoms, decimals=10)
+
+
+def test_hash_distinguishes_structures():
+    atoms = framework()
+    moved = atoms.copy()
+    moved.positions[0] += [0.1, 0.0, 0.0]
+    relabelled = atoms.copy()
+    relabelled.numbers[0] = 6 if relabelled.numbers[0] == 8 else 8
+    hashes = {structure_hash(structure) for structure in (atoms, moved, relabelled, framework(seed=3))}
+    assert len(hashes) == 4
+    # Without periodicity a translation by a lattice vector is a different structure
+    molecule = atoms.copy()
+    molecule.pbc = False
+    translated = molecule.copy()
+    translated.positions[:5] += molecule.get_cell()[0]
+    assert structure_hash(translated) != structure_hash(molecule)
+    assert structure_hash(molecule[::-1]) == structure_hash(molecule)
+
+
+def test_cache_round_trip(tmp_path):
+    atoms = framework()
+    atoms.set_array("labels", np.array([f"X{i}" for i in range(len(atoms))]))
+    value = {"atoms": atoms, "volume": np.float64(1.5), "counts": np.arange(4, dtype=np.int32)}
+    restored = loads(dumps(value))
+    assert restored["counts"].dtype == np.int32 and restored["volume"] == 1.5
+    assert restored["atoms"] == atoms
+    assert list(restored["atoms"].get_array("labels")) == list(atoms.get_array("labels"))
+
+    cache = ResultCache(str(tmp_path))
+    calls = []
+    for structure in (atoms, atoms[::-1]):
+        cache.get_or_compute("porosity", structure, lambda: calls.append(1) or {"PLD": 4.2}, {"probe": 1.2})
+    assert len(calls) == 1 and cache.stats()["hits"] == 1
+    assert cache.key("porosity", atoms, {"probe": 1.2}) != cache.key("porosity", atoms, {"probe": 1.5})
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=10 ** 9)
+    keys = [cache.key("test", framework(seed), None) for seed in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, np.random.default_rng(i).random(200))
+        os.utime(cache._path(key), (i, i))
+    size = os.path.getsize(cache._path(keys[0]))
+    cache.get(keys[0])
+    cache.max_bytes = 2 * size + size // 2
+    assert cache.evict() == 1
+    assert cache.get(keys[1]) is None and cache.get(keys[0]) is not None
+
+
+def test_unserialisable_result_is_returned_but_not_cached(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    atoms = framework()
+    value = {"function": len, "PLD": 4.2}
+    calls = []
+    for _ in range(2):
+        assert cache.get_or_compute("porosity", atoms, lambda: calls.append(1) or value) is value
+    assert len(calls) == 2
+    assert not cache.put(cache.key("porosity", atoms), object())
+    assert cache.put(cache.key("porosity", atoms), {"PLD": 4.2})
+    assert cache.stats()["entries"] == 1 and not list(tmp_path.glob("*.tmp"))
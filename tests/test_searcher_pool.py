@@ -0,0 +1,67 @@
+import json
+from fairmofapp.loader.json_finder import update_index
+from fairmofapp.loader.searcher_pool import SearcherPool
+from tests.conftest import synthetic_mofs
+
+
+def count_warming(monkeypatch):
+    calls = []
+    warm = SearcherPool._warm
+
+    def counting(self, searcher):
+        calls.append(self.generation)
+        return warm(self, searcher)
+
+    monkeypatch.setattr(SearcherPool, "_warm", counting)
+    return calls
+
+
+def test_doc_frequencies_match_reader(mof_index):
+    index_dir, mofs = mof_index
+    pool = SearcherPool(index_dir)
+    try:
+        with pool.searcher() as searcher:
+            for field, frequencies in pool.doc_frequencies.items():
+                assert frequencies
+                for term, frequency in frequencies.items():
+                    assert searcher.doc_frequency(field, term) == frequency
+        assert pool.doc_frequency("metal_symbols", "zn") == sum(
+            properties["metals symbols"] == ["Zn"] for properties in mofs.values())
+    finally:
+        pool.close()
+
+
+def test_warms_once_per_generation(tmp_path, mof_index, monkeypatch):
+    index_dir, _ = mof_index
+    calls = count_warming(monkeypatch)
+    pool = SearcherPool(index_dir, size=3)
+    try:
+        # Three searchers checked out at once are opened, only the first is warmed
+        with pool.searcher(), pool.searcher(), pool.searcher():
+            pass
+        with pool.searcher():
+            pass
+        assert len(calls) == 1
+
+        with open(tmp_path / "json" / "part_9.json", 'w') as json_file:
+            json.dump(synthetic_mofs(5, seed=1, prefix="NEW"), json_file)
+        update_index(str(tmp_path / "json"), index_dir, procs=1)
+        with pool.searcher(), pool.searcher():
+            pass
+        assert len(calls) == 2 and calls[0] != calls[1]
+        assert pool.doc_frequency("refcode", "new0001") == 1
+    finally:
+        pool.close()
+
+
+def test_fields_with_many_terms_stay_cold(mof_index):
+    index_dir, _ = mof_index
+    pool = SearcherPool(index_dir, warm_fields=["topology", "sbu_type"], max_terms=3)
+    try:
+        with pool.searcher():
+            pass
+        # Four topologies exceed the bound, the two SBU types do not
+        assert list(pool.doc_frequencies) == ["sbu_type"]
+        assert pool.doc_frequency("topology", "pcu") > 0
+    finally:
+        pool.close()
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from fairmofapp.analyzer.similarity_graph import create_graph_from_adjacency_matrix, select_edges
+
+MATRIX = {
+    "A": {"A": 1.0, "B": 0.9, "C": 0.5, "D": 0.2},
+    "B": {"B": 1.0, "C": 0.8, "D": 0.3},
+    "C": {"C": 1.0, "D": 0.7, "E": 0.6},
+    "D": {"E": 0.4},
+    "E": {},
+}
+
+
+def named_edges(nodes, heads, tails, weights):
+    return [(frozenset((nodes[head], nodes[tail])), weight) for head, tail, weight in zip(heads, tails, weights)]
+
+
+def test_all_edges_heaviest_first_without_self_loops():
+    nodes, heads, tails, weights = select_edges(create_graph_from_adjacency_matrix(MATRIX))
+    assert nodes == ["A", "B", "C", "D", "E"]
+    assert weights.tolist() == [0.9, 0.8, 0.7, 0.6, 0.5, 0.4, 0.3, 0.2]
+    assert named_edges(nodes, heads, tails, weights)[:2] == [(frozenset("AB"), 0.9), (frozenset("BC"), 0.8)]
+    assert heads.dtype == tails.dtype == np.int64
+
+
+@pytest.mark.parametrize("threshold, max_edges, expected", [
+    (0.5, None, [0.9, 0.8, 0.7, 0.6, 0.5]),
+    (0.75, None, [0.9, 0.8]),
+    (None, 3, [0.9, 0.8, 0.7]),
+    (0.5, 3, [0.9, 0.8, 0.7]),
+    (0.3, 10, [0.9, 0.8, 0.7, 0.6, 0.5, 0.4, 0.3]),
+    (0.95, 3, []),
+])
+def test_threshold_and_max_edges(threshold, max_edges, expected):
+    graph = create_graph_from_adjacency_matrix(MATRIX)
+    nodes, heads, tails, weights = select_edges(graph, edge_threshold=threshold, max_edges=max_edges)
+    assert weights.tolist() == expected
+    assert len(heads) == len(tails) == len(expected)
+    for (pair, weight) in named_edges(nodes, heads, tails, weights):
+        assert graph.edges[tuple(pair)]['weight'] == weight
+
+
+def test_top_k_per_node_keeps_the_heaviest_edge_of_every_node():
+    nodes, heads, tails, weights = select_edges(create_graph_from_adjacency_matrix(MATRIX), top_k_per_node=1)
+    # A-B and B-C are the heaviest edges of A, B and C, C-D of D and C-E of E
+    assert named_edges(nodes, heads, tails, weights) == [
+        (frozenset("AB"), 0.9), (frozenset("BC"), 0.8), (frozenset("CD"), 0.7), (frozenset("CE"), 0.6)]
+
+
+def test_graph_without_edges():
+    graph = create_graph_from_adjacency_matrix({"A": {"A": 1.0}})
+    nodes, heads, tails, weights = select_edges(graph, edge_threshold=0.5, max_edges=2)
+    assert nodes == ["A"] and len(heads) == len(tails) == len(weights) == 0
+
+
+def test_top_k_matches_brute_force():
+    generator = np.random.default_rng(0)
+    matrix = {f"M{i}": {f"M{j}": float(generator.integers(1, 1000)) / 1000 for j in range(i + 1, 30)
+                        if generator.random() < 0.3} for i in range(30)}
+    graph = create_graph_from_adjacency_matrix(matrix)
+    nodes, heads, tails, weights = select_edges(graph, edge_threshold=0.2, top_k_per_node=3)
+    ranked = sorted(((weight, frozenset((u, v))) for u, v, weight in graph.edges(data='weight') if weight >= 0.2),
+                    key=lambda edge: -edge[0])
+    kept = set()
+    for node in graph.nodes():
+        kept.update(pair for _, pair in [edge for edge in ranked if node in edge[1]][:3])
+    assert set(pair for pair, _ in named_edges(nodes, heads, tails, weights)) == kept
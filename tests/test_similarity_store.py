@@ -0,0 +1,89 @@
+import json
+import random
+import numpy as np
+import pytest
+from fairmofapp.analyzer.adj_matrix_loader import AdjacencyMatrixLoader, get_adjacency_matrix
+from fairmofapp.analyzer.similarity_store import (
+    MappedSimilarityStore, SimilarityStore, convert_adjacency_json, is_binary_similarity_matrix)
+
+
+def random_adjacency(n_mofs, n_neighbours=10, seed=0):
+    generator = random.Random(seed)
+    names = [f"MOF{i:04d}" for i in range(n_mofs)]
+    # Some MOFs appear only as neighbours and some scores tie
+    adjacency = {name: {other: round(generator.random(), 2) for other in generator.sample(names, n_neighbours)}
+                 for name in names[:-5]}
+    adjacency[names[0]][names[0]] = 1.0
+    return adjacency
+
+
+def reference_neighbours(adjacency, mof_name, top_n=None):
+    # Descending score, ties broken by refcode, self similarity dropped
+    neighbours = sorted(((name, score) for name, score in adjacency.get(mof_name, {}).items() if name != mof_name),
+                        key=lambda item: (-item[1], item[0]))
+    return neighbours[:top_n]
+
+
+def assert_matches(store, adjacency, top_k=None):
+    names = set(adjacency).union(*adjacency.values())
+    assert len(store) == len(names) and sorted(store) == sorted(names)
+    for name in names:
+        expected = reference_neighbours(adjacency, name, top_k)
+        assert list(store[name]) == [neighbour for neighbour, _ in expected]
+        assert list(store[name].values()) == pytest.approx([score for _, score in expected])
+        frame = store.get_similar_mofs(name, top_n=3)
+        assert frame["MOF"].tolist() == [neighbour for neighbour, _ in expected[:3]]
+    assert "MISSING" not in store
+    with pytest.raises(KeyError):
+        store["MISSING"]
+    assert store.get_similar_mofs("MISSING").empty
+
+
+def test_store_matches_dictionary():
+    adjacency = random_adjacency(200)
+    assert_matches(SimilarityStore.from_adjacency_matrix(adjacency), adjacency)
+    assert_matches(SimilarityStore.from_adjacency_matrix(adjacency, top_k=4), adjacency, top_k=4)
+
+
+def test_npz_round_trip(tmp_path):
+    adjacency = random_adjacency(100)
+    with open(tmp_path / "A.json", 'w') as json_file:
+        json.dump(adjacency, json_file)
+    store = convert_adjacency_json(str(tmp_path / "A.json"), str(tmp_path / "A.npz"))
+    loaded = SimilarityStore.load(str(tmp_path / "A.npz"))
+    for name in ("refcodes", "indptr", "indices", "scores"):
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(store, name))
+    assert_matches(loaded, adjacency)
+
+
+def test_binary_round_trip(tmp_path, monkeypatch):
+    adjacency = random_adjacency(100)
+    # Refcodes of different widths and non ascii characters
+    adjacency["ÅBC"] = {"MOF0001": 0.5, "X": 0.25}
+    store = SimilarityStore.from_adjacency_matrix(adjacency)
+    file_path = str(tmp_path / "A.bin")
+    store.save_binary(file_path)
+    assert is_binary_similarity_matrix(file_path)
+    assert not is_binary_similarity_matrix(__file__)
+
+    mapped = SimilarityStore.open_binary(file_path)
+    assert isinstance(mapped, MappedSimilarityStore)
+    assert isinstance(mapped.indices, np.memmap)
+    assert_matches(mapped, adjacency)
+
+    monkeypatch.setattr(AdjacencyMatrixLoader, "_adj_matrix", None)
+    assert isinstance(get_adjacency_matrix(file_path), MappedSimilarityStore)
+
+
+def test_binary_round_trip_without_neighbours(tmp_path):
+    file_path = str(tmp_path / "A.bin")
+    SimilarityStore.from_adjacency_matrix({"MOF1": {}, "MOF2": {}}).save_binary(file_path)
+    mapped = SimilarityStore.open_binary(file_path)
+    assert sorted(mapped) == ["MOF1", "MOF2"] and mapped["MOF1"] == {}
+
+
+def test_open_binary_rejects_other_files(tmp_path):
+    file_path = tmp_path / "A.bin"
+    file_path.write_bytes(b"\0" * 128)
+    with pytest.raises(ValueError):
+        SimilarityStore.open_binary(str(file_path))
@@ -0,0 +1,58 @@
+import itertools
+import numpy as np
+from ase import Atoms
+from fairmofapp.analyzer.structure_check import CloseContacts, find_close_contacts, validate_structure
+
+
+def brute_force_contacts(atoms, cutoff, skip_hydrogen_pairs=True):
+    # Shortest distance of every pair of distinct atoms over the lattice translations
+    positions, cell = atoms.get_positions(), atoms.get_cell()[:]
+    numbers = atoms.get_atomic_numbers()
+    shortest = np.full((len(atoms), len(atoms)), np.inf)
+    for shift in itertools.product(range(-2, 3), repeat=3):
+        translated = positions + np.array(shift) @ cell
+        shortest = np.minimum(shortest, np.linalg.norm(positions[:, None] - translated[None], axis=2))
+    contacts = {}
+    for i, j in zip(*np.nonzero(np.triu(shortest < cutoff, 1))):
+        if not (skip_hydrogen_pairs and numbers[i] == numbers[j] == 1):
+            contacts[(int(i), int(j))] = shortest[i, j]
+    return contacts
+
+
+def random_structure(n_atoms, seed=0):
+    generator = np.random.default_rng(seed)
+    cell = np.array([[7.0, 0.0, 0.0], [2.0, 6.5, 0.0], [1.0, 1.5, 6.0]])
+    symbols = generator.choice(["H", "C", "O", "Zn"], n_atoms)
+    return Atoms(symbols, scaled_positions=generator.uniform(0, 1, (n_atoms, 3)), cell=cell, pbc=True)
+
+
+def test_close_contacts_match_brute_force():
+    atoms = random_structure(150)
+    for cutoff in (0.9, 1.5):
+        pairs, distances = find_close_contacts(atoms, cutoff)
+        expected = brute_force_contacts(atoms, cutoff)
+        assert expected
+        assert [tuple(pair) for pair in pairs.tolist()] == sorted(expected)
+        np.testing.assert_allclose(distances, [expected[key] for key in sorted(expected)])
+
+
+def test_several_checks_share_one_search():
+    atoms = random_structure(150, seed=1)
+    checks = [CloseContacts(0.9), CloseContacts(1.4, skip_hydrogen_pairs=False, name="all_pairs")]
+    results = validate_structure(atoms, checks)
+    for check in checks:
+        expected = brute_force_contacts(atoms, check.cutoff, check.skip_hydrogen_pairs)
+        assert [tuple(pair) for pair in results[check.name][0].tolist()] == sorted(expected)
+
+
+def test_max_pairs_stops_early():
+    atoms = random_structure(150)
+    pairs, distances = find_close_contacts(atoms, 1.5, max_pairs=3)
+    assert len(pairs) == len(distances) == 3
+    assert set(map(tuple, pairs.tolist())) <= set(brute_force_contacts(atoms, 1.5))
+
+
+def test_contacts_without_a_cell():
+    atoms = Atoms("CCH2", positions=[[0, 0, 0], [0.5, 0, 0], [3, 0, 0], [3.4, 0, 0]], pbc=True)
+    pairs, distances = find_close_contacts(atoms)
+    assert pairs.tolist() == [[0, 1]] and distances.tolist() == [0.5]
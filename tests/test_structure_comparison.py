@@ -0,0 +1,51 @@
+import io
+import numpy as np
+from ase.build import bulk
+from ase.io import write
+from fairmofapp.analyzer.structure_comparison import analyse_upload, comparison_table, overlay_patterns
+
+
+def cif_bytes(atoms):
+    buffer = io.BytesIO()
+    write(buffer, atoms, format='cif')
+    return buffer.getvalue()
+
+
+def copper(overlap=False):
+    atoms = bulk("Cu", "fcc", a=3.615, cubic=True)
+    if overlap:
+        atoms.append("O")
+        atoms.positions[-1] = atoms.positions[0] + [0.3, 0.0, 0.0]
+    return atoms
+
+
+def test_analyse_upload_overlaps_and_pxrd():
+    result = analyse_upload("Cu.cif", cif_bytes(copper()), ["overlaps", "pxrd"])
+    summary = result['summary']
+    assert result['name'] == summary['Structure'] == "Cu.cif"
+    assert summary['Formula'] == "Cu4" and summary['Atoms'] == 4
+    assert np.isclose(summary['Cell volume (Å³)'], 3.615 ** 3)
+    assert np.isclose(summary['Density (g/cm³)'], 8.93, atol=0.02)
+    assert summary['Overlapping atom pairs'] == 0
+    pattern = result['pattern']
+    assert len(pattern['two_theta']) == len(pattern['intensity']) == len(pattern['hkl'])
+    # The (111) reflection of copper with Cu Kα radiation
+    strongest = pattern['two_theta'][np.argmax(pattern['intensity'])]
+    assert abs(strongest - 43.3) < 0.2
+    assert np.all((pattern['two_theta'] >= 5.0) & (pattern['two_theta'] <= 50.0))
+
+    overlapping = analyse_upload("CuO.cif", cif_bytes(copper(overlap=True)), ["overlaps"])
+    assert overlapping['summary']['Overlapping atom pairs'] == 1
+    assert overlapping['pattern'] is None
+
+
+def test_comparison_table_with_an_error_row():
+    results = [analyse_upload("Cu.cif", cif_bytes(copper()), ["overlaps"]),
+               {'name': "broken.cif", 'error': "ValueError: not a CIF"}]
+    table = comparison_table(results)
+    assert table['Structure'].tolist() == ["Cu.cif", "broken.cif"]
+    assert table.loc[1, 'Error'] == "ValueError: not a CIF"
+    assert np.isnan(table.loc[1, 'Atoms']) and table.loc[0, 'Atoms'] == 4
+    assert table.loc[0, 'Overlapping atom pairs'] == 0
+    # Uploads without a pattern are left out of the overlay
+    assert len(overlay_patterns(results).data) == 0
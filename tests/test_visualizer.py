@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from ase import Atoms
+from ase.build import molecule
+from rdkit import Chem
+from fairmofapp.analyzer.neighbour_list import find_bonds
+from fairmofapp.loader.visualizer import (V2000_LIMIT, build_scene, mol_block, periodic_visualizer,
+                                          structure_visualizer)
+
+
+def chain(n_atoms):
+    # A zigzag chain of carbons, one bond fewer than atoms
+    positions = [[1.3 * i, 0.75 * (i % 2), 0.0] for i in range(n_atoms)]
+    return ["C"] * n_atoms, np.array(positions), np.array([[i, i + 1] for i in range(n_atoms - 1)])
+
+
+def read_block(block):
+    mol = Chem.MolFromMolBlock(block, sanitize=False, removeHs=False)
+    assert mol is not None
+    return mol
+
+
+@pytest.mark.parametrize("n_atoms, version", [(5, "V2000"), (V2000_LIMIT, "V2000"), (V2000_LIMIT + 1, "V3000")])
+def test_mol_block_version_and_counts(n_atoms, version):
+    symbols, xyz, bonds = chain(n_atoms)
+    block = mol_block(symbols, xyz, bonds)
+    assert block.splitlines()[3].endswith(version)
+    assert block.endswith("M  END\n$$$$\n")
+    mol = read_block(block)
+    assert mol.GetNumAtoms() == n_atoms and mol.GetNumBonds() == n_atoms - 1
+    assert np.allclose(mol.GetConformer().GetPositions(), xyz, atol=1e-4)
+    bond = mol.GetBondWithIdx(n_atoms - 2)
+    assert (bond.GetBeginAtomIdx(), bond.GetEndAtomIdx()) == (n_atoms - 2, n_atoms - 1)
+
+
+def test_mol_block_without_bonds():
+    block = mol_block(["Zn"] * 1200, np.zeros((1200, 3)), np.empty((0, 2), dtype=int))
+    assert "V3000" in block and "BEGIN BOND" not in block
+    assert read_block(block).GetNumAtoms() == 1200
+
+
+def test_build_scene_draws_bonds_of_small_structures():
+    ethanol = molecule("CH3CH2OH")
+    scene = build_scene(ethanol)
+    assert scene['representation'] == 'bonds' and scene['format'] == 'sdf'
+    assert 'stick' in scene['style'] and 'sphere' in scene['style']
+    mol = read_block(scene['model'])
+    assert mol.GetNumAtoms() == len(ethanol) == 9
+    assert mol.GetNumBonds() == len(find_bonds(ethanol, 0.3)) == 8
+
+
+def test_build_scene_falls_back_for_large_structures():
+    ethanol = molecule("CH3CH2OH")
+    full = build_scene(ethanol)
+    atoms_only = build_scene(ethanol, max_payload=len(full['model']) - 1)
+    assert atoms_only['representation'] == 'atoms' and atoms_only['format'] == 'xyz'
+    assert 'stick' not in atoms_only['style']
+    lines = atoms_only['model'].splitlines()
+    assert lines[0] == "9" and len(lines) == 11
+
+    heavy = build_scene(ethanol, max_payload=len(atoms_only['model']) - 1)
+    assert heavy['representation'] == 'heavy atoms'
+    lines = heavy['model'].splitlines()
+    assert lines[0] == "3" and sorted(line.split()[0] for line in lines[2:]) == ["C", "C", "O"]
+
+    # Structures too large for a MOL block skip it without finding bonds
+    grid = Atoms("C" * 1000, positions=np.indices((10, 10, 10)).reshape(3, -1).T * 3.0)
+    assert build_scene(grid, max_payload=50000)['representation'] == 'atoms'
+
+
+def test_periodic_visualizer_replicates_the_unit_cell():
+    water = molecule("H2O")
+    water.cell = [6.0, 6.0, 6.0]
+    water.pbc = True
+    viewer = periodic_visualizer(water, 2)
+    assert viewer.representation == 'periodic'
+    assert "addUnitCell()" in viewer.startjs and "replicateUnitCell(2,2,2,null,true)" in viewer.startjs
+    assert "_cell_length_a" in viewer.startjs
+    assert "replicateUnitCell" not in periodic_visualizer(water, 1).startjs
+    assert structure_visualizer(water, images=(1, 2, 3)).representation == 'periodic'
+    assert structure_visualizer(water).representation == 'bonds'